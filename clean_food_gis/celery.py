@@ -0,0 +1,21 @@
+"""
+Celery app cho TASK_QUEUE['BACKEND'] = 'celery' (xem clean_food_gis/task_queue.py)
+Chạy worker: celery -A clean_food_gis worker -l info
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clean_food_gis.settings')
+
+app = Celery('clean_food_gis')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@app.task(name='clean_food_gis.run_task')
+def run_task(name, args, kwargs):
+    """Mọi job đi qua task này và được tra theo tên trong registry của task_queue"""
+    from .task_queue import run_task as run_registered_task
+
+    return run_registered_task(name, args, kwargs)
@@ -389,4 +389,60 @@ DEFAULT_FROM_EMAIL = 'Clean Food GIS <noreply@cleanfoodgis.com>'
 # EMAIL_USE_TLS = True
 # EMAIL_HOST_USER = 'your_email@gmail.com'  # Thay bằng email của bạn
 # EMAIL_HOST_PASSWORD = 'your_app_password'  # App Password từ Gmail (xem HUONG_DAN_CAU_HINH_EMAIL.md)
-# DEFAULT_FROM_EMAIL = 'Clean Food GIS <your_email@gmail.com>'
\ No newline at end of file
+# DEFAULT_FROM_EMAIL = 'Clean Food GIS <your_email@gmail.com>'
+# ============================================
+# Routing Configuration
+# ============================================
+
+# Route cache cho OSRM (xem gis_tools/route_cache.py)
+# BACKEND: 'memory' (mặc định, trong process), 'database' (bảng gis_tools_routecacheentry)
+# hoặc 'django' (Django cache framework - cấu hình CACHES dùng Redis cho production)
+ROUTE_CACHE = {
+    'BACKEND': os.environ.get('ROUTE_CACHE_BACKEND', 'memory'),
+    'TTL': 24 * 60 * 60,  # 1 ngày
+    'MAX_ENTRIES': 5000,
+    'PRECISION': 4,  # Làm tròn tọa độ ~11m
+    'CACHE_ALIAS': 'default',
+}
+
+# Routing backend, routing song song, connection pool và circuit breaker
+# (xem gis_tools/routing_backends.py, routing_executor.py, routing_client.py)
+ROUTING = {
+    # Backend tính đường (xem gis_tools/routing_backends.py):
+    # 'osrm_public' (router.project-osrm.org), 'osrm' (OSRM tự host tại OSRM_URL)
+    # hoặc 'offline' (A* trên road graph GRAPH_PATH, tạo bằng lệnh build_road_graph)
+    'BACKEND': os.environ.get('ROUTING_BACKEND', 'osrm_public'),
+    'OSRM_URL': os.environ.get('OSRM_URL', 'http://localhost:5000'),
+    'TABLE_MAX_COORDINATES': 100,  # = --max-table-size của osrm-routed
+    'GRAPH_PATH': os.environ.get('ROUTING_GRAPH_PATH'),
+    'GRAPH_PATHS': {},  # Graph riêng theo profile, vd: {'foot': BASE_DIR / 'data/foot.npz'}
+    'MAX_WORKERS': 8,  # Số route OSRM chạy song song tối đa (= kích thước connection pool)
+    'REQUEST_TIMEOUT': 5,  # Deadline cho mỗi route (giây)
+    'TOTAL_TIMEOUT': 8,  # Tổng thời gian chờ cho một lô route (giây)
+    'FAILURE_THRESHOLD': 5,  # Circuit breaker: số lỗi liên tiếp để ngắt mạch
+    'RECOVERY_TIMEOUT': 30,  # Circuit breaker: thời gian chờ trước khi thử lại (giây)
+}
+
+# ============================================
+# Background Tasks
+# ============================================
+
+# Hàng đợi job nền: email OTP, gán cửa hàng cho đơn, cảnh báo tồn kho
+# (xem clean_food_gis/task_queue.py và food_store/tasks.py)
+# BACKEND: 'thread' (worker trong process - dev), 'immediate' (chạy ngay - test)
+# hoặc 'celery' (production: celery -A clean_food_gis worker)
+TASK_QUEUE = {
+    'BACKEND': os.environ.get('TASK_QUEUE_BACKEND', 'thread'),
+    'WORKERS': 2,  # Số luồng của backend 'thread'
+}
+
+# Xuất báo cáo PDF bằng job nền (xem food_store/export_jobs.py)
+# ROOT: thư mục chứa file đã xuất (mặc định trong thư mục tạm của hệ thống)
+EXPORT_JOBS = {
+    'TTL': 60 * 60,  # Giữ file và trạng thái job 1 giờ
+}
+if os.environ.get('EXPORT_ROOT'):
+    EXPORT_JOBS['ROOT'] = os.environ['EXPORT_ROOT']
+
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
@@ -0,0 +1,158 @@
+"""
+Hàng đợi job nền cho các tác vụ chậm (gửi email, routing, cảnh báo tồn kho)
+Request chỉ đưa job vào hàng đợi rồi trả về ngay, không phải chờ SMTP/OSRM.
+
+Cấu hình trong settings.TASK_QUEUE:
+    'BACKEND': 'thread'     # Worker trong process (mặc định - môi trường dev)
+               'immediate'  # Chạy ngay trong request (test, debug)
+               'celery'     # Celery + broker CELERY_BROKER_URL (production),
+                            # chạy worker: celery -A clean_food_gis worker
+    'WORKERS': 2,           # Số luồng của backend 'thread'
+
+Khai báo job:
+    @task
+    def send_welcome_email(user_id): ...
+
+    send_welcome_email.delay(user.id)   # tham số phải serialize được (JSON)
+"""
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_QUEUE = {
+    'BACKEND': 'thread',
+    'WORKERS': 2,
+}
+
+_registry = {}
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_task_queue_settings():
+    from django.conf import settings
+
+    return {**DEFAULT_TASK_QUEUE, **getattr(settings, 'TASK_QUEUE', {})}
+
+
+class Task:
+    """Hàm được đăng ký làm job nền - gọi trực tiếp vẫn chạy đồng bộ"""
+
+    def __init__(self, func, name):
+        self.func = func
+        self.name = name
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def delay(self, *args, **kwargs):
+        """
+        Đưa job vào hàng đợi sau khi transaction hiện tại commit
+        (ngoài transaction thì đưa vào ngay) để worker thấy dữ liệu đã lưu
+        """
+        transaction.on_commit(lambda: get_task_backend().enqueue(self.name, args, kwargs))
+
+
+def task(func=None, *, name=None):
+    """Decorator đăng ký job nền, tên mặc định là module.tên_hàm"""
+    def decorate(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}')
+        _registry[registered.name] = registered
+        return registered
+
+    return decorate(func) if func is not None else decorate
+
+
+def run_task(name, args=(), kwargs=None):
+    """Chạy job theo tên (dùng trong worker) - lỗi được ghi log, không ném ra"""
+    try:
+        if name not in _registry:
+            # Worker chưa import module khai báo job (vd: Celery worker vừa khởi động)
+            importlib.import_module(name.rsplit('.', 1)[0])
+        func = _registry[name]
+    except (ImportError, KeyError):
+        logger.exception(f"Unknown task {name}")
+        return None
+    try:
+        return func(*args, **(kwargs or {}))
+    except Exception:
+        logger.exception(f"Task {name} failed")
+        return None
+
+
+class ImmediateBackend:
+    """Chạy job ngay trong thread gọi"""
+
+    def enqueue(self, name, args, kwargs):
+        run_task(name, args, kwargs)
+
+
+class ThreadBackend:
+    """Worker trong process: job chạy trên thread pool, request không phải chờ"""
+
+    def __init__(self, workers=DEFAULT_TASK_QUEUE['WORKERS']):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task')
+
+    @staticmethod
+    def _run(name, args, kwargs):
+        try:
+            run_task(name, args, kwargs)
+        finally:
+            # Job mở connection riêng trong thread worker
+            connections.close_all()
+
+    def enqueue(self, name, args, kwargs):
+        self._pool.submit(self._run, name, args, kwargs)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+class CeleryBackend:
+    """Gửi job qua Celery broker (xem clean_food_gis/celery.py)"""
+
+    def __init__(self):
+        from clean_food_gis.celery import app
+
+        self.app = app
+
+    def enqueue(self, name, args, kwargs):
+        self.app.send_task('clean_food_gis.run_task', args=[name, list(args), kwargs])
+
+
+def build_task_backend():
+    options = get_task_queue_settings()
+    backend = options['BACKEND']
+    if backend == 'immediate':
+        return ImmediateBackend()
+    if backend == 'thread':
+        return ThreadBackend(workers=options['WORKERS'])
+    if backend == 'celery':
+        return CeleryBackend()
+    raise ValueError(f"Unknown TASK_QUEUE backend: {backend}")
+
+
+def get_task_backend():
+    """Backend hàng đợi dùng chung trong process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_task_backend()
+    return _backend
+
+
+def reset_task_backend():
+    """Bỏ backend hiện tại (vd: sau khi đổi settings)"""
+    global _backend
+    with _backend_lock:
+        _backend = None
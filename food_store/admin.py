@@ -852,22 +852,40 @@ admin.site.site_title = "Clean Food Admin"
 admin.site.index_title = "Dashboard Quản Trị"
 
 # Custom Admin Actions
+def _update_order_status(queryset, **fields):
+    """
+    queryset.update() không gửi post_save: tự tổng hợp lại doanh số các ngày
+    có đơn bị đổi trạng thái và xóa cache số liệu dashboard
+    """
+    from .dashboard_metrics import invalidate_admin_site_stats, invalidate_farm_metrics
+    from .sales_rollup import rollup_date, schedule_rollup_refresh
+
+    changed = list(queryset.values_list('created_at', 'assigned_farm_id'))
+    updated = queryset.update(**fields)
+
+    dates = {rollup_date(created_at): created_at for created_at, _ in changed}
+    for created_at in dates.values():
+        schedule_rollup_refresh(created_at)
+    invalidate_farm_metrics(*(farm_id for _, farm_id in changed))
+    invalidate_admin_site_stats()
+    return updated
+
 def mark_orders_as_confirmed(modeladmin, request, queryset):
     """Mark selected orders as confirmed"""
-    updated = queryset.update(status='confirmed')
+    updated = _update_order_status(queryset, status='confirmed')
     modeladmin.message_user(request, f'{updated} đơn hàng đã được xác nhận.')
 mark_orders_as_confirmed.short_description = "Xác nhận đơn hàng đã chọn"
 
 def mark_orders_as_shipping(modeladmin, request, queryset):
     """Mark selected orders as shipping"""
-    updated = queryset.update(status='shipping')
+    updated = _update_order_status(queryset, status='shipping')
     modeladmin.message_user(request, f'{updated} đơn hàng đã chuyển sang trạng thái giao hàng.')
 mark_orders_as_shipping.short_description = "Chuyển sang giao hàng"
 
 def mark_orders_as_delivered(modeladmin, request, queryset):
     """Mark selected orders as delivered"""
     from django.utils import timezone
-    updated = queryset.update(status='delivered', delivered_at=timezone.now())
+    updated = _update_order_status(queryset, status='delivered', delivered_at=timezone.now())
     modeladmin.message_user(request, f'{updated} đơn hàng đã được giao thành công.')
 mark_orders_as_delivered.short_description = "Đánh dấu đã giao hàng"
 
@@ -888,92 +906,136 @@ OrderAdmin.actions = [mark_orders_as_confirmed, mark_orders_as_shipping, mark_or
 ProductAdmin.actions = [mark_products_as_available, mark_products_as_unavailable]
 
 # Export CSV Actions
+# Mỗi action chạy một query values() đã join sẵn, đọc theo từng chunk
+# (server-side cursor trên PostgreSQL) và ghi CSV dần qua StreamingHttpResponse
 import csv
-from django.http import HttpResponse
+from decimal import Decimal
+from django.db.models import DecimalField, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+
+CSV_EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File giả cho csv.writer: write() trả lại dòng để stream"""
+
+    def write(self, value):
+        return value
+
+
+def _streaming_csv_response(filename, header, rows):
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _full_name(first_name, last_name):
+    """Giống User.get_full_name()"""
+    return f'{first_name} {last_name}'.strip()
+
 
 def export_orders_csv(modeladmin, request, queryset):
     """Export selected orders to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Mã đơn hàng', 'Khách hàng', 'Email', 'Điện thoại', 
-        'Trạng thái', 'Địa chỉ giao hàng', 'Tổng tiền', 
+    status_labels = dict(Order.STATUS_CHOICES)
+    orders = queryset.order_by('pk').values_list(
+        'id', 'customer__user__first_name', 'customer__user__last_name',
+        'customer__user__username', 'customer__user__email', 'customer__phone',
+        'status', 'delivery_address', 'total_amount', 'delivery_fee',
+        'created_at', 'notes'
+    )
+
+    def rows():
+        for (order_id, first_name, last_name, username, email, phone, status,
+             delivery_address, total_amount, delivery_fee, created_at, notes) in orders.iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE):
+            yield [
+                order_id,
+                _full_name(first_name, last_name) or username,
+                email,
+                phone,
+                status_labels.get(status, status),
+                delivery_address,
+                total_amount,
+                delivery_fee,
+                created_at.strftime('%d/%m/%Y %H:%M'),
+                notes
+            ]
+
+    return _streaming_csv_response('orders.csv', [
+        'Mã đơn hàng', 'Khách hàng', 'Email', 'Điện thoại',
+        'Trạng thái', 'Địa chỉ giao hàng', 'Tổng tiền',
         'Phí giao hàng', 'Ngày đặt', 'Ghi chú'
-    ])
-    
-    for order in queryset:
-        writer.writerow([
-            order.id,
-            order.customer.user.get_full_name() or order.customer.user.username,
-            order.customer.user.email,
-            order.customer.phone,
-            order.get_status_display(),
-            order.delivery_address,
-            order.total_amount,
-            order.delivery_fee,
-            order.created_at.strftime('%d/%m/%Y %H:%M'),
-            order.notes
-        ])
-    
-    return response
+    ], rows())
 export_orders_csv.short_description = "Xuất CSV đơn hàng đã chọn"
 
 def export_products_csv(modeladmin, request, queryset):
     """Export selected products to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="products.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Tên sản phẩm', 'Danh mục', 'Cửa hàng', 'Giá', 
+    products = queryset.order_by('pk').values_list(
+        'name', 'category__name', 'farm__name', 'price', 'unit',
+        'stock_quantity', 'is_available', 'farm__organic_certified', 'created_at'
+    )
+
+    def rows():
+        for (name, category_name, farm_name, price, unit, stock_quantity,
+             is_available, organic_certified, created_at) in products.iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE):
+            yield [
+                name,
+                category_name,
+                farm_name,
+                price,
+                unit,
+                stock_quantity,
+                'Có' if is_available else 'Không',
+                'Có' if organic_certified else 'Không',
+                created_at.strftime('%d/%m/%Y')
+            ]
+
+    return _streaming_csv_response('products.csv', [
+        'Tên sản phẩm', 'Danh mục', 'Cửa hàng', 'Giá',
         'Đơn vị', 'Tồn kho', 'Có sẵn', 'Hữu cơ', 'Ngày tạo'
-    ])
-    
-    for product in queryset:
-        writer.writerow([
-            product.name,
-            product.category.name,
-            product.farm.name,
-            product.price,
-            product.unit,
-            product.stock_quantity,
-            'Có' if product.is_available else 'Không',
-            'Có' if product.farm.organic_certified else 'Không',
-            product.created_at.strftime('%d/%m/%Y')
-        ])
-    
-    return response
+    ], rows())
 export_products_csv.short_description = "Xuất CSV sản phẩm đã chọn"
 
 def export_customers_csv(modeladmin, request, queryset):
     """Export selected customers to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="customers.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Tên đăng nhập', 'Họ tên', 'Email', 'Điện thoại', 
+    # Số đơn và tổng chi tiêu tính bằng GROUP BY trong cùng query
+    customers = queryset.order_by('pk').annotate(
+        total_orders=Count('order'),
+        total_spent=Coalesce(
+            Sum('order__total_amount'),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+    ).values_list(
+        'user__username', 'user__first_name', 'user__last_name', 'user__email',
+        'phone', 'address', 'total_orders', 'total_spent', 'created_at'
+    )
+
+    def rows():
+        for (username, first_name, last_name, email, phone, address,
+             total_orders, total_spent, created_at) in customers.iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE):
+            yield [
+                username,
+                _full_name(first_name, last_name),
+                email,
+                phone,
+                address,
+                total_orders,
+                total_spent,
+                created_at.strftime('%d/%m/%Y')
+            ]
+
+    return _streaming_csv_response('customers.csv', [
+        'Tên đăng nhập', 'Họ tên', 'Email', 'Điện thoại',
         'Địa chỉ', 'Số đơn hàng', 'Tổng chi tiêu', 'Ngày đăng ký'
-    ])
-    
-    for customer in queryset:
-        total_orders = customer.order_set.count()
-        total_spent = sum(order.total_amount for order in customer.order_set.all())
-        
-        writer.writerow([
-            customer.user.username,
-            customer.user.get_full_name() or '',
-            customer.user.email,
-            customer.phone,
-            customer.address,
-            total_orders,
-            total_spent,
-            customer.created_at.strftime('%d/%m/%Y')
-        ])
-    
-    return response
+    ], rows())
 export_customers_csv.short_description = "Xuất CSV khách hàng đã chọn"
 
 # Add export actions
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class FoodStoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'food_store'
-    verbose_name = 'Cửa hàng Thực phẩm Sạch'
\ No newline at end of file
+    verbose_name = 'Cửa hàng Thực phẩm Sạch'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,96 @@
+"""
+Đặt hàng từ giỏ hàng trong một transaction duy nhất
+Khóa giỏ hàng và các sản phẩm (select_for_update, theo thứ tự id để hai
+đơn đồng thời không deadlock), ghi OrderItem bằng bulk_create và xuất kho
+qua sổ kho (food_store.stock_ledger). Lỗi ở bất kỳ bước nào đều rollback
+toàn bộ: không bán quá tồn kho và không để lại đơn hàng dở.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import Cart, OrderItem, Product, StockTransaction
+from .stock_ledger import InsufficientStockError, record_stock_movements
+
+
+class CheckoutError(Exception):
+    """Không thể đặt hàng (giỏ trống, hết hàng...) - message hiển thị cho khách"""
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(
+            f'Sản phẩm "{product.name}" không đủ hàng! '
+            f'Còn {product.stock_quantity} {product.unit}, bạn đặt {requested} {product.unit}'
+        )
+
+
+def place_order(cart, order):
+    """
+    Tạo đơn hàng từ giỏ hàng
+
+    Args:
+        cart: Cart của khách
+        order: Order chưa lưu, đã có thông tin giao hàng và cửa hàng được gán
+            (delivery_fee, khoảng cách... đã tính ở ngoài transaction vì routing
+            gọi dịch vụ bên ngoài, không nên giữ khóa trong lúc chờ)
+
+    Returns:
+        Order đã lưu, total_amount = tiền hàng (giá tại thời điểm khóa) + phí giao
+
+    Raises:
+        CheckoutError: giỏ hàng trống hoặc sản phẩm không đủ hàng
+        StockConflictError: tồn kho bị đơn khác thay đổi trong lúc ghi sổ kho
+            (đã rollback, giỏ hàng còn nguyên - khách có thể đặt lại)
+    """
+    with transaction.atomic():
+        # Khóa giỏ hàng: bấm "Đặt hàng" hai lần chỉ tạo một đơn
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        items = list(cart.items.values_list('product_id', 'quantity'))
+        if not items:
+            raise CheckoutError('Giỏ hàng trống')
+
+        quantities = {}
+        for product_id, quantity in items:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk')
+        }
+
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.stock_quantity < quantity:
+                raise OutOfStockError(product, quantity)
+
+        subtotal = sum((products[pid].price * quantity for pid, quantity in quantities.items()), Decimal('0'))
+        order.total_amount = subtotal + Decimal(str(order.delivery_fee or 0))
+        order.save()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[pid], quantity=quantity, price=products[pid].price)
+            for pid, quantity in quantities.items()
+        ])
+        try:
+            record_stock_movements([
+                StockTransaction(
+                    product=products[pid],
+                    farm_id=order.assigned_farm_id or products[pid].farm_id,
+                    transaction_type='export',
+                    quantity=quantity,
+                    unit_price=products[pid].price,
+                    order=order,
+                    notes=f'Xuất kho cho đơn hàng #{order.id}',
+                    created_by=None,  # System auto
+                )
+                for pid, quantity in quantities.items()
+            ])
+        except InsufficientStockError as e:
+            raise OutOfStockError(e.product, e.requested)
+
+        cart.items.all().delete()
+
+    return order
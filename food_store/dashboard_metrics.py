@@ -0,0 +1,213 @@
+"""
+Số liệu cho các trang dashboard
+Các bộ đếm được gom vào ít query nhất có thể: bộ đếm trên cùng một bảng dùng
+conditional aggregation (Count/Sum với filter=), bộ đếm trên nhiều bảng được
+nối bằng UNION ALL. Số liệu đơn hàng/doanh thu đọc từ các bảng tổng hợp theo
+ngày (DailyFarmSales, DailyProductSales - xem food_store/sales_rollup.py)
+thay vì quét toàn bộ Order/OrderItem.
+
+Số liệu dashboard của từng cửa hàng và thống kê trang Django admin được
+cache ngắn hạn và bị xóa khi dữ liệu liên quan thay đổi (xem
+food_store/signals.py và tasks.update_stock_alerts_task).
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.utils import timezone
+
+REVENUE_SERIES_DAYS = 7
+FARM_METRICS_CACHE_TIMEOUT = 60  # giây
+TOP_PRODUCTS_LIMIT = 5
+
+ADMIN_STATS_CACHE_KEY = 'dashboard_metrics:admin_site'
+ADMIN_TOP_PRODUCTS_CACHE_KEY = 'dashboard_metrics:admin_site:top_products'
+ADMIN_STATS_CACHE_TIMEOUT = 5 * 60  # giây - giỏ hàng không xóa cache nên tối đa trễ 5 phút
+ADMIN_LOW_STOCK_THRESHOLD = 10
+ADMIN_TOP_PRODUCTS_LIMIT = 10
+# Đơn đã xác nhận trở đi được tính vào doanh thu trên trang admin
+REVENUE_STATUSES = ['confirmed', 'preparing', 'shipping', 'delivered']
+
+
+def _table_counts(**querysets):
+    """
+    Đếm nhiều bảng trong một query (UNION ALL các SELECT COUNT)
+
+    Args:
+        querysets: tên bộ đếm -> QuerySet cần đếm
+
+    Returns:
+        dict tên bộ đếm -> số dòng
+    """
+    parts = [
+        queryset.order_by().annotate(metric=Value(name)).values('metric')
+        .annotate(value=Count('pk')).values_list('metric', 'value')
+        for name, queryset in querysets.items()
+    ]
+    counts = dict(parts[0].union(*parts[1:], all=True))
+    return {name: counts.get(name, 0) for name in querysets}
+
+
+def _sales_counters(sales, today):
+    """
+    Tổng số đơn, doanh thu đơn đã giao, số đơn hôm nay và đơn chờ xử lý
+    (sales: QuerySet DailyFarmSales)
+    """
+    return sales.aggregate(
+        total_orders=Sum('order_count', default=0),
+        total_revenue=Sum('revenue', filter=Q(status='delivered'), default=0),
+        orders_today=Sum('order_count', filter=Q(date=today), default=0),
+        pending_orders=Sum('order_count', filter=Q(status='pending'), default=0),
+    )
+
+
+def get_daily_revenue(sales, days=REVENUE_SERIES_DAYS, today=None):
+    """
+    Doanh thu đơn đã giao theo ngày (sales: QuerySet DailyFarmSales)
+
+    Returns:
+        (labels, values): nhãn 'dd/mm' và doanh thu (float) của `days` ngày gần nhất
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    revenue_by_day = dict(
+        sales.filter(status='delivered', date__gte=start, date__lte=today)
+        .order_by()
+        .values('date')
+        .annotate(revenue=Sum('revenue'))
+        .values_list('date', 'revenue')
+    )
+
+    labels = []
+    values = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        labels.append(date.strftime('%d/%m'))
+        values.append(float(revenue_by_day.get(date) or 0))
+    return labels, values
+
+
+def get_admin_dashboard_metrics():
+    """
+    Bộ đếm và doanh thu 7 ngày cho admin_dashboard (3 query)
+
+    Returns:
+        dict với các key dùng trực tiếp trong context của dashboard
+    """
+    from .models import Customer, DailyFarmSales, Farm, Product, StockAlert
+
+    today = timezone.localdate()
+    metrics = _sales_counters(DailyFarmSales.objects.all(), today)
+    metrics.update(_table_counts(
+        total_products=Product.objects.all(),
+        total_customers=Customer.objects.all(),
+        total_farms=Farm.objects.all(),
+        stock_alerts=StockAlert.objects.filter(is_resolved=False),
+    ))
+    metrics['last_7_days'], metrics['revenue_7_days'] = get_daily_revenue(DailyFarmSales.objects.all(), today=today)
+    return metrics
+
+
+def _farm_metrics_key(farm_id):
+    return f'dashboard_metrics:farm:{farm_id}'
+
+
+def get_farm_dashboard_metrics(farm_id):
+    """
+    Bộ đếm, doanh thu 7 ngày và top sản phẩm cho store_admin_dashboard
+    (4 query khi cache trống, cache FARM_METRICS_CACHE_TIMEOUT giây)
+
+    Returns:
+        dict với các key dùng trực tiếp trong context của dashboard
+    """
+    key = _farm_metrics_key(farm_id)
+    metrics = cache.get(key)
+    if metrics is not None:
+        return metrics
+
+    from .models import DailyFarmSales, DailyProductSales, Product, Shipper, StockAlert
+
+    today = timezone.localdate()
+    sales = DailyFarmSales.objects.filter(farm_id=farm_id)
+    metrics = _sales_counters(sales, today)
+    shippers = Shipper.objects.filter(assigned_farm_id=farm_id)
+    metrics.update(_table_counts(
+        total_products=Product.objects.filter(farm_id=farm_id),
+        total_shippers=shippers,
+        active_shippers=shippers.filter(status__in=['available', 'busy']),
+        stock_alerts=StockAlert.objects.filter(farm_id=farm_id, is_resolved=False),
+    ))
+    metrics['last_7_days'], metrics['revenue_7_days'] = get_daily_revenue(sales, today=today)
+    metrics['top_products'] = list(
+        DailyProductSales.objects.filter(farm_id=farm_id)
+        .values('product__name')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_quantity')[:TOP_PRODUCTS_LIMIT]
+    )
+
+    cache.set(key, metrics, FARM_METRICS_CACHE_TIMEOUT)
+    return metrics
+
+
+def invalidate_farm_metrics(*farm_ids):
+    """Xóa cache số liệu dashboard của các cửa hàng sau khi transaction hiện tại commit"""
+    keys = [_farm_metrics_key(farm_id) for farm_id in set(farm_ids) if farm_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_admin_site_stats():
+    """
+    Thống kê tổng quan trên trang chủ Django admin (context processor
+    dashboard_stats) - 2 query khi cache trống
+
+    Returns:
+        dict {'total_products', 'total_orders', 'total_customers', 'total_farms',
+        'revenue_today', 'revenue_this_week', 'low_stock_count', 'active_carts'}
+    """
+    stats = cache.get(ADMIN_STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    from .models import Cart, CartItem, Customer, DailyFarmSales, Farm, Product
+
+    today = timezone.localdate()
+    revenue = Q(status__in=REVENUE_STATUSES)
+    stats = DailyFarmSales.objects.aggregate(
+        total_orders=Sum('order_count', default=0),
+        revenue_today=Sum('revenue', filter=revenue & Q(date=today), default=0),
+        revenue_this_week=Sum('revenue', filter=revenue & Q(date__gte=today - timedelta(days=7)), default=0),
+    )
+    stats.update(_table_counts(
+        total_products=Product.objects.all(),
+        total_customers=Customer.objects.all(),
+        total_farms=Farm.objects.all(),
+        low_stock_count=Product.objects.filter(stock_quantity__lt=ADMIN_LOW_STOCK_THRESHOLD, is_available=True),
+        active_carts=Cart.objects.filter(pk__in=CartItem.objects.values('cart')),
+    ))
+
+    cache.set(ADMIN_STATS_CACHE_KEY, stats, ADMIN_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def get_admin_top_products():
+    """Sản phẩm bán chạy nhất (theo số lượng đã bán) cho trang chủ Django admin"""
+    products = cache.get(ADMIN_TOP_PRODUCTS_CACHE_KEY)
+    if products is not None:
+        return products
+
+    from .models import Product
+
+    products = list(
+        Product.objects.annotate(total_sold=Sum('daily_sales__quantity'))
+        .filter(total_sold__isnull=False)
+        .order_by('-total_sold')[:ADMIN_TOP_PRODUCTS_LIMIT]
+    )
+    cache.set(ADMIN_TOP_PRODUCTS_CACHE_KEY, products, ADMIN_STATS_CACHE_TIMEOUT)
+    return products
+
+
+def invalidate_admin_site_stats():
+    """Xóa cache thống kê trang admin sau khi transaction hiện tại commit"""
+    transaction.on_commit(lambda: cache.delete_many([ADMIN_STATS_CACHE_KEY, ADMIN_TOP_PRODUCTS_CACHE_KEY]))
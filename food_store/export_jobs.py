@@ -0,0 +1,129 @@
+"""
+Xuất báo cáo PDF bằng job nền
+View chỉ tạo job (start_export_job) rồi trả về trang chờ; worker ghi PDF theo
+từng trang vào thư mục EXPORT_JOBS['ROOT'], trạng thái job lưu trong bảng
+ExportJob nên mọi web worker đều thấy. Khi xong, người tạo job tải file bằng
+mã job (download handle).
+
+Khi web và worker chạy trên nhiều máy (TASK_QUEUE 'celery'), ROOT phải nằm
+trên ổ đĩa mà cả web lẫn worker cùng truy cập được.
+"""
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_JOBS = {
+    'ROOT': Path(tempfile.gettempdir()) / 'clean_food_gis_exports',
+    'TTL': 60 * 60,  # File và job được giữ 1 giờ
+}
+
+
+def get_export_settings():
+    from django.conf import settings
+
+    return {**DEFAULT_EXPORT_JOBS, **getattr(settings, 'EXPORT_JOBS', {})}
+
+
+def _expired_before():
+    return timezone.now() - timedelta(seconds=get_export_settings()['TTL'])
+
+
+def get_export_job(job_id):
+    """ExportJob chưa quá TTL hoặc None"""
+    from .models import ExportJob
+
+    return ExportJob.objects.filter(pk=job_id, created_at__gte=_expired_before()).first()
+
+
+def start_export_job(user, kind, filename, farm_id=None, farm_name=""):
+    """
+    Tạo job xuất PDF và đưa vào hàng đợi
+
+    Args:
+        kind: 'transactions' (giao dịch kho) hoặc 'inventory' (tồn kho)
+        farm_id: Chỉ xuất dữ liệu của cửa hàng này (None = tất cả)
+    """
+    from .models import ExportJob
+    from .tasks import export_pdf_task
+
+    if kind not in dict(ExportJob.KIND_CHOICES):
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    cleanup_expired_exports()
+    job = ExportJob.objects.create(user=user, kind=kind, farm_id=farm_id, farm_name=farm_name, filename=filename)
+    export_pdf_task.delay(job.pk)
+    return job
+
+
+def build_export_queryset(kind, farm_id=None):
+    from .models import Product, StockTransaction
+
+    if kind == 'transactions':
+        queryset = StockTransaction.objects.order_by('-created_at')
+    else:
+        queryset = Product.objects.order_by('name' if farm_id else 'farm__name', 'name')
+    if farm_id:
+        queryset = queryset.filter(farm_id=farm_id)
+    return queryset
+
+
+def _set_status(job, status, **fields):
+    job.status = status
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=['status', 'updated_at', *fields])
+
+
+def run_export_job(job_id):
+    """Job nền: ghi file PDF của job vào ROOT (qua file tạm rồi đổi tên)"""
+    from .export_utils import write_inventory_report_pdf, write_stock_transactions_pdf
+
+    job = get_export_job(job_id)
+    if job is None:
+        logger.warning(f"Export job {job_id} expired before it ran")
+        return
+
+    _set_status(job, 'running')
+
+    writer = write_stock_transactions_pdf if job.kind == 'transactions' else write_inventory_report_pdf
+    root = Path(get_export_settings()['ROOT'])
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f"{job.pk}.pdf"
+
+    output = tempfile.NamedTemporaryFile(dir=root, suffix='.part', delete=False)
+    try:
+        with output:
+            writer(build_export_queryset(job.kind, job.farm_id), output, job.farm_name)
+        os.replace(output.name, path)
+    except Exception:
+        os.unlink(output.name)
+        _set_status(job, 'failed')
+        raise
+
+    _set_status(job, 'done', path=str(path))
+
+
+def cleanup_expired_exports():
+    """Xóa các job và file xuất đã quá TTL"""
+    from .models import ExportJob
+
+    ExportJob.objects.filter(created_at__lt=_expired_before()).delete()
+
+    options = get_export_settings()
+    root = Path(options['ROOT'])
+    if not root.is_dir():
+        return
+    expired_before = time.time() - options['TTL']
+    for path in root.iterdir():
+        try:
+            if path.stat().st_mtime < expired_before:
+                path.unlink()
+        except OSError:
+            pass
@@ -1,461 +1,435 @@
 """
 Utilities for exporting inventory data to PDF and Excel
 """
-from io import BytesIO
+import tempfile
 from datetime import datetime
-from django.http import HttpResponse
+from itertools import islice
+from django.http import FileResponse, HttpResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle, Paragraph, Image
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_CHUNK_SIZE = 2000  # Số dòng đọc từ database mỗi lần
 
-def export_stock_transactions_pdf(transactions, farm_name=""):
+
+# PDF được vẽ theo từng trang: mỗi trang là một Table nhỏ (tối đa số dòng vừa
+# một trang) nên reportlab không phải dựng và chia một Table khổng lồ, dữ liệu
+# đọc dần từ queryset và trang đã vẽ được ghi thẳng ra file
+PDF_MARGINS = {'left': 30, 'right': 30, 'top': 50, 'bottom': 40}
+PDF_HEADER_HEIGHT = 26
+PDF_ROW_HEIGHT = 16
+PDF_FOOTER_TEXT = "Clean Food GIS - Hệ thống quản lý thực phẩm sạch - © 2026"
+
+# TableStyle dùng chung cho mọi trang (dòng 0 của mỗi bảng là header)
+_PDF_BASE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+]
+TRANSACTIONS_PDF_STYLE = TableStyle(_PDF_BASE_STYLE + [
+    ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # STT
+    ('ALIGN', (1, 1), (1, -1), 'CENTER'),  # Ngày
+    ('ALIGN', (2, 1), (2, -1), 'CENTER'),  # Loại
+    ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Số lượng
+])
+INVENTORY_PDF_STYLE = TableStyle(_PDF_BASE_STYLE + [
+    ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+    ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+    ('ALIGN', (5, 1), (5, -1), 'RIGHT'),
+])
+# Dòng tổng kết: nhãn gộp các cột đến cột thứ 3 từ cuối, giá trị ở cột kế tiếp
+SUMMARY_PDF_STYLE = TableStyle([
+    ('SPAN', (0, 0), (-3, 0)),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fff3cd')),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+def _pdf_paragraph_styles():
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#28a745'),
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'info': ParagraphStyle('Info', parent=styles['Normal'], fontSize=10, alignment=TA_LEFT),
+    }
+
+
+def write_paged_pdf(output, pagesize, title_text, info_text, headers, col_widths, rows,
+                    table_style, summary=None):
     """
-    Xuất danh sách giao dịch kho ra file PDF
+    Ghi bảng dữ liệu ra PDF theo từng trang
+
+    Args:
+        output: File object (hoặc đường dẫn) để ghi PDF
+        rows: Iterable các dòng (list chuỗi) - được đọc dần từng trang
+        table_style: TableStyle dùng chung cho bảng của mọi trang
+        summary: Hàm trả về dòng tổng kết, gọi sau khi đã đọc hết rows
     """
-    buffer = BytesIO()
-    
-    # Tạo PDF với landscape orientation
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=50,
-        bottomMargin=30
-    )
-    
-    # Container cho các elements
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#28a745'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    # Title
+    page_width, page_height = pagesize
+    left = PDF_MARGINS['left']
+    bottom = PDF_MARGINS['bottom']
+    frame_width = page_width - left - PDF_MARGINS['right']
+    page_top = page_height - PDF_MARGINS['top']
+    page_number = 1
+
+    pdf = canvas.Canvas(output, pagesize=pagesize, pageCompression=1)
+
+    def draw_footer():
+        pdf.setFont('Helvetica', 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawCentredString(page_width / 2, bottom / 2, f"{PDF_FOOTER_TEXT} - Trang {page_number}")
+
+    def new_page():
+        nonlocal page_number
+        draw_footer()
+        pdf.showPage()
+        page_number += 1
+        return page_top
+
+    def draw_table(data, style, row_heights, top):
+        table = Table(data, colWidths=col_widths, rowHeights=row_heights)
+        table.setStyle(style)
+        _, height = table.wrapOn(pdf, frame_width, top - bottom)
+        table.drawOn(pdf, left, top - height)
+        return top - height
+
+    # Tiêu đề và thông tin chỉ có ở trang đầu
+    top = page_top
+    styles = _pdf_paragraph_styles()
+    for text, style, space_after in ((title_text, styles['title'], 24), (info_text, styles['info'], 16)):
+        paragraph = Paragraph(text, style)
+        _, height = paragraph.wrap(frame_width, top - bottom)
+        paragraph.drawOn(pdf, left, top - height)
+        top -= height + space_after
+
+    full_page_rows = int((page_top - bottom - PDF_HEADER_HEIGHT) // PDF_ROW_HEIGHT)
+    capacity = max(int((top - bottom - PDF_HEADER_HEIGHT) // PDF_ROW_HEIGHT), 1)
+    rows = iter(rows)
+    first_page = True
+    while True:
+        chunk = list(islice(rows, capacity))
+        if not chunk and not first_page:
+            break
+        if not first_page:
+            top = new_page()
+        top = draw_table(
+            [headers] + chunk,
+            table_style,
+            [PDF_HEADER_HEIGHT] + [PDF_ROW_HEIGHT] * len(chunk),
+            top
+        )
+        if len(chunk) < capacity:
+            break
+        first_page = False
+        capacity = full_page_rows
+
+    if summary is not None:
+        if top - PDF_ROW_HEIGHT < bottom:
+            top = new_page()
+        draw_table([summary()], SUMMARY_PDF_STYLE, [PDF_ROW_HEIGHT], top)
+
+    draw_footer()
+    pdf.save()
+
+
+def write_stock_transactions_pdf(transactions, output, farm_name=""):
+    """
+    Ghi danh sách giao dịch kho ra file PDF (output: file object)
+    """
+    from django.utils import timezone
+    from .models import StockTransaction
+
     title_text = f"BÁO CÁO XUẤT NHẬP KHO"
     if farm_name:
         title_text += f"<br/>{farm_name}"
-    title = Paragraph(title_text, title_style)
-    elements.append(title)
-    
-    # Thông tin báo cáo
-    info_style = ParagraphStyle(
-        'Info',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_LEFT
-    )
-    info_text = f"Ngày xuất báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')}<br/>"
-    info_text += f"Tổng số giao dịch: {transactions.count()}"
-    info = Paragraph(info_text, info_style)
-    elements.append(info)
-    elements.append(Spacer(1, 20))
-    
-    # Tạo bảng dữ liệu
-    data = [['STT', 'Ngày', 'Loại', 'Sản phẩm', 'Số lượng', 'Đơn vị', 'Nhà cung cấp', 'Ghi chú']]
-    
-    for idx, trans in enumerate(transactions, 1):
-        transaction_type = 'Nhập' if trans.transaction_type == 'IN' else 'Xuất'
-        supplier_name = trans.supplier.name if trans.supplier else '-'
-        
-        data.append([
-            str(idx),
-            trans.created_at.strftime('%d/%m/%Y'),
-            transaction_type,
-            trans.product.name[:30],
-            str(trans.quantity),
-            trans.product.unit,
-            supplier_name[:20],
-            (trans.notes or '-')[:30]
-        ])
-    
-    # Tạo table
-    table = Table(data, colWidths=[0.5*inch, 1*inch, 0.8*inch, 2*inch, 0.8*inch, 0.8*inch, 1.5*inch, 2*inch])
-    
-    # Style cho table
-    table.setStyle(TableStyle([
-        # Header
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        
-        # Body
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # STT
-        ('ALIGN', (1, 1), (1, -1), 'CENTER'),  # Ngày
-        ('ALIGN', (2, 1), (2, -1), 'CENTER'),  # Loại
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),   # Số lượng
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        
-        # Grid
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        
-        # Alternating rows
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-    ]))
-    
-    elements.append(table)
-    
-    # Footer
-    elements.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    footer = Paragraph(
-        "Clean Food GIS - Hệ thống quản lý thực phẩm sạch<br/>© 2026 All rights reserved",
-        footer_style
+
+    type_labels = dict(StockTransaction.TRANSACTION_TYPE_CHOICES)
+    count = 0
+
+    def rows():
+        nonlocal count
+        values = transactions.values_list(
+            'created_at', 'transaction_type', 'product__name', 'quantity', 'product__unit', 'supplier__name', 'notes'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for count, (created_at, transaction_type, product_name, quantity, unit, supplier_name, notes) in enumerate(values, 1):
+            yield [
+                str(count),
+                timezone.localtime(created_at).strftime('%d/%m/%Y'),
+                type_labels.get(transaction_type, transaction_type),
+                product_name[:30],
+                str(quantity),
+                unit,
+                (supplier_name or '-')[:20],
+                (notes or '-')[:30],
+            ]
+
+    inch_widths = [0.5, 1, 0.8, 2, 0.8, 0.8, 1.5, 2]
+    write_paged_pdf(
+        output,
+        landscape(A4),
+        title_text,
+        f"Ngày xuất báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+        ['STT', 'Ngày', 'Loại', 'Sản phẩm', 'Số lượng', 'Đơn vị', 'Nhà cung cấp', 'Ghi chú'],
+        [width * inch for width in inch_widths],
+        rows(),
+        TRANSACTIONS_PDF_STYLE,
+        summary=lambda: ['TỔNG SỐ GIAO DỊCH:', '', '', '', '', '', str(count), '']
     )
-    elements.append(footer)
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get PDF data
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    return pdf
-
-
-def export_stock_transactions_excel(transactions, farm_name=""):
+
+
+def write_inventory_report_pdf(products, output, farm_name=""):
     """
-    Xuất danh sách giao dịch kho ra file Excel
+    Ghi báo cáo tồn kho ra file PDF (output: file object)
     """
-    # Tạo workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Xuất Nhập Kho"
-    
-    # Styles
-    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='28a745', end_color='28a745', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    title_font = Font(name='Arial', size=16, bold=True, color='28a745')
-    title_alignment = Alignment(horizontal='center', vertical='center')
-    
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Title
-    ws.merge_cells('A1:H1')
-    title_cell = ws['A1']
-    title_text = f"BÁO CÁO XUẤT NHẬP KHO"
+    title_text = f"BÁO CÁO TỒN KHO"
     if farm_name:
-        title_text += f" - {farm_name}"
-    title_cell.value = title_text
-    title_cell.font = title_font
-    title_cell.alignment = title_alignment
-    
-    # Info
-    ws.merge_cells('A2:H2')
-    info_cell = ws['A2']
-    info_cell.value = f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Tổng: {transactions.count()} giao dịch"
-    info_cell.alignment = Alignment(horizontal='center')
-    
-    # Headers
-    headers = ['STT', 'Ngày giờ', 'Loại giao dịch', 'Sản phẩm', 'Số lượng', 'Đơn vị', 'Nhà cung cấp', 'Ghi chú']
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
-    # Data
-    for idx, trans in enumerate(transactions, 1):
-        row_num = idx + 4
-        
-        transaction_type = 'Nhập kho' if trans.transaction_type == 'IN' else 'Xuất kho'
-        supplier_name = trans.supplier.name if trans.supplier else '-'
-        
-        data_row = [
-            idx,
-            trans.created_at.strftime('%d/%m/%Y %H:%M'),
-            transaction_type,
-            trans.product.name,
-            trans.quantity,
-            trans.product.unit,
-            supplier_name,
-            trans.notes or '-'
-        ]
-        
-        for col_num, value in enumerate(data_row, 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = value
-            cell.border = border
-            
-            # Alignment
-            if col_num in [1, 2, 3, 6]:  # STT, Ngày, Loại, Đơn vị
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            elif col_num == 5:  # Số lượng
-                cell.alignment = Alignment(horizontal='right', vertical='center')
-            else:
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            # Color coding for transaction type
-            if col_num == 3:
-                if trans.transaction_type == 'IN':
-                    cell.fill = PatternFill(start_color='d4edda', end_color='d4edda', fill_type='solid')
-                    cell.font = Font(color='155724', bold=True)
-                else:
-                    cell.fill = PatternFill(start_color='f8d7da', end_color='f8d7da', fill_type='solid')
-                    cell.font = Font(color='721c24', bold=True)
-    
-    # Adjust column widths
-    column_widths = [8, 18, 15, 30, 12, 10, 25, 30]
+        title_text += f"<br/>{farm_name}"
+
+    count = 0
+    total_value = 0
+
+    def rows():
+        nonlocal count, total_value
+        values = products.values_list(
+            'name', 'category__name', 'stock_quantity', 'unit', 'price'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for count, (name, category_name, stock_quantity, unit, price) in enumerate(values, 1):
+            total_value += stock_quantity * float(price)
+            yield [
+                str(count),
+                name[:30],
+                category_name or '-',
+                str(stock_quantity),
+                unit,
+                f"{price:,.0f}đ",
+                'Sắp hết' if stock_quantity < 20 else 'Đủ hàng',
+            ]
+
+    inch_widths = [0.5, 2, 1.2, 0.8, 0.8, 1, 1.2]
+    write_paged_pdf(
+        output,
+        A4,
+        title_text,
+        f"Ngày báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+        ['STT', 'Sản phẩm', 'Danh mục', 'Tồn kho', 'Đơn vị', 'Giá', 'Trạng thái'],
+        [width * inch for width in inch_widths],
+        rows(),
+        INVENTORY_PDF_STYLE,
+        summary=lambda: [f'TỔNG GIÁ TRỊ TỒN KHO ({count} sản phẩm):', '', '', '', '', f"{total_value:,.0f}đ", '']
+    )
+
+
+def _excel_styles():
+    """
+    Style dùng chung cho cả workbook - mỗi ô tham chiếu cùng một object nên
+    openpyxl chỉ ghi mỗi style một lần
+    """
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return {
+        'title': {'font': Font(name='Arial', size=16, bold=True, color='28a745'),
+                  'alignment': Alignment(horizontal='center', vertical='center')},
+        'info': {'alignment': Alignment(horizontal='center')},
+        'header': {'font': Font(name='Arial', size=12, bold=True, color='FFFFFF'),
+                   'fill': PatternFill(start_color='28a745', end_color='28a745', fill_type='solid'),
+                   'alignment': Alignment(horizontal='center', vertical='center', wrap_text=True),
+                   'border': border},
+        'center': {'alignment': Alignment(horizontal='center', vertical='center'),
+                   'border': border},
+        'left': {'alignment': Alignment(horizontal='left', vertical='center'),
+                 'border': border},
+        'right': {'alignment': Alignment(horizontal='right', vertical='center'),
+                  'border': border},
+        'money': {'alignment': Alignment(horizontal='right', vertical='center'),
+                  'border': border,
+                  'number_format': '#,##0'},
+        'in': {'fill': PatternFill(start_color='d4edda', end_color='d4edda', fill_type='solid'),
+               'font': Font(color='155724', bold=True),
+               'alignment': Alignment(horizontal='center', vertical='center'),
+               'border': border},
+        'out': {'fill': PatternFill(start_color='f8d7da', end_color='f8d7da', fill_type='solid'),
+                'font': Font(color='721c24', bold=True),
+                'alignment': Alignment(horizontal='center', vertical='center'),
+                'border': border},
+        'warning': {'fill': PatternFill(start_color='fff3cd', end_color='fff3cd', fill_type='solid'),
+                    'font': Font(color='856404', bold=True),
+                    'alignment': Alignment(horizontal='left', vertical='center'),
+                    'border': border},
+        'ok': {'fill': PatternFill(start_color='d4edda', end_color='d4edda', fill_type='solid'),
+               'font': Font(color='155724', bold=True),
+               'alignment': Alignment(horizontal='left', vertical='center'),
+               'border': border},
+        'total_label': {'font': Font(bold=True),
+                        'alignment': Alignment(horizontal='right', vertical='center'),
+                        'border': border},
+        'total_value': {'font': Font(bold=True, color='FF0000', size=12),
+                        'fill': PatternFill(start_color='fff3cd', end_color='fff3cd', fill_type='solid'),
+                        'alignment': Alignment(horizontal='right', vertical='center'),
+                        'border': border,
+                        'number_format': '#,##0'},
+    }
+
+
+def _cell(ws, value, style=None):
+    cell = WriteOnlyCell(ws, value=value)
+    for attr, style_value in (style or {}).items():
+        setattr(cell, attr, style_value)
+    return cell
+
+
+def _new_excel_sheet(title, column_widths):
+    """Workbook ở chế độ write-only: các dòng được ghi thẳng ra file tạm, không giữ trong RAM"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title)
     for col_num, width in enumerate(column_widths, 1):
         ws.column_dimensions[get_column_letter(col_num)].width = width
-    
-    # Freeze panes
     ws.freeze_panes = 'A5'
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    wb.save(buffer)
-    excel_data = buffer.getvalue()
-    buffer.close()
-    
-    return excel_data
+    return wb, ws
+
 
+def _write_excel_heading(ws, styles, title_text, info_text, headers):
+    last_col = get_column_letter(len(headers))
+    ws.append([_cell(ws, title_text, styles['title'])])
+    ws.append([_cell(ws, info_text, styles['info'])])
+    ws.append([])
+    ws.append([_cell(ws, header, styles['header']) for header in headers])
+    ws.merged_cells.add(f'A1:{last_col}1')
+    ws.merged_cells.add(f'A2:{last_col}2')
 
-def export_inventory_report_pdf(products, farm_name=""):
+
+def excel_response(write_workbook, filename):
     """
-    Xuất báo cáo tồn kho ra PDF
+    FileResponse cho file Excel
+
+    .xlsx là file zip: openpyxl (kể cả write-only) chỉ ghi nội dung sheet vào
+    zip khi save(), nên không thể gửi byte đầu tiên trước khi đọc hết dữ liệu.
+    Workbook được ghi vào file tạm trên đĩa (bộ nhớ không tăng theo số dòng)
+    rồi gửi đi theo từng block; thời gian chờ byte đầu và dung lượng file tạm
+    vẫn tăng theo số dòng. Báo cáo rất lớn nên dùng CSV (food_store.admin).
+
+    Args:
+        write_workbook: Hàm write_workbook(output) ghi workbook vào file object
+        filename: Tên file tải về
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=50, bottomMargin=30)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#28a745'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    title_text = f"BÁO CÁO TỒN KHO"
+    output = tempfile.TemporaryFile()
+    try:
+        write_workbook(output)
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+    # FileResponse gửi file theo từng block và tự đóng file tạm khi xong
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=EXCEL_CONTENT_TYPE)
+
+
+def write_stock_transactions_excel(transactions, output, farm_name=""):
+    """
+    Ghi danh sách giao dịch kho ra file Excel (output: file object)
+    Dữ liệu đọc bằng values_list + iterator nên bộ nhớ không tăng theo số dòng
+    """
+    from django.utils import timezone
+    from .models import StockTransaction
+    from .stock_ledger import STOCK_IN_TYPES
+
+    styles = _excel_styles()
+    wb, ws = _new_excel_sheet("Xuất Nhập Kho", [8, 18, 15, 30, 12, 10, 25, 30])
+
+    title_text = f"BÁO CÁO XUẤT NHẬP KHO"
     if farm_name:
-        title_text += f"<br/>{farm_name}"
-    title = Paragraph(title_text, title_style)
-    elements.append(title)
-    
-    # Info
-    info_style = ParagraphStyle('Info', parent=styles['Normal'], fontSize=10, alignment=TA_LEFT)
-    info_text = f"Ngày báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')}<br/>"
-    info_text += f"Tổng số sản phẩm: {products.count()}"
-    info = Paragraph(info_text, info_style)
-    elements.append(info)
-    elements.append(Spacer(1, 20))
-    
-    # Table
-    data = [['STT', 'Sản phẩm', 'Danh mục', 'Tồn kho', 'Đơn vị', 'Giá', 'Trạng thái']]
-    
-    total_value = 0
-    for idx, product in enumerate(products, 1):
-        status = '⚠️ Sắp hết' if product.stock_quantity < 20 else '✓ Đủ hàng'
-        value = product.stock_quantity * float(product.price)
-        total_value += value
-        
-        data.append([
-            str(idx),
-            product.name[:30],
-            product.category.name if product.category else '-',
-            str(product.stock_quantity),
-            product.unit,
-            f"{product.price:,.0f}đ",
-            status
+        title_text += f" - {farm_name}"
+    headers = ['STT', 'Ngày giờ', 'Loại giao dịch', 'Sản phẩm', 'Số lượng', 'Đơn vị', 'Nhà cung cấp', 'Ghi chú']
+    _write_excel_heading(ws, styles, title_text, f"Ngày xuất: {datetime.now().strftime('%d/%m/%Y %H:%M')}", headers)
+
+    type_labels = dict(StockTransaction.TRANSACTION_TYPE_CHOICES)
+    rows = transactions.values_list(
+        'created_at', 'transaction_type', 'product__name', 'quantity', 'product__unit', 'supplier__name', 'notes'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    count = 0
+    for count, (created_at, transaction_type, product_name, quantity, unit, supplier_name, notes) in enumerate(rows, 1):
+        ws.append([
+            _cell(ws, count, styles['center']),
+            _cell(ws, timezone.localtime(created_at).strftime('%d/%m/%Y %H:%M'), styles['center']),
+            _cell(ws, type_labels.get(transaction_type, transaction_type),
+                  styles['in'] if transaction_type in STOCK_IN_TYPES else styles['out']),
+            _cell(ws, product_name, styles['left']),
+            _cell(ws, quantity, styles['right']),
+            _cell(ws, unit, styles['center']),
+            _cell(ws, supplier_name or '-', styles['left']),
+            _cell(ws, notes or '-', styles['left']),
         ])
-    
-    # Add total row
-    data.append(['', '', '', '', 'TỔNG GIÁ TRỊ:', f"{total_value:,.0f}đ", ''])
-    
-    table = Table(data, colWidths=[0.5*inch, 2*inch, 1.2*inch, 0.8*inch, 0.8*inch, 1*inch, 1.2*inch])
-    
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#28a745')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-        ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-        ('ALIGN', (5, 1), (5, -1), 'RIGHT'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.lightgrey]),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fff3cd')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    
-    elements.append(table)
-    elements.append(Spacer(1, 30))
-    
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=TA_CENTER)
-    footer = Paragraph("Clean Food GIS - Hệ thống quản lý thực phẩm sạch<br/>© 2026", footer_style)
-    elements.append(footer)
-    
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    return pdf
-
-
-def export_inventory_report_excel(products, farm_name=""):
+
+    ws.append([])
+    ws.append([_cell(ws, f"Tổng: {count} giao dịch", styles['total_label'])])
+    wb.save(output)
+
+
+def write_inventory_report_excel(products, output, farm_name=""):
     """
-    Xuất báo cáo tồn kho ra Excel
+    Ghi báo cáo tồn kho ra file Excel (output: file object)
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Báo Cáo Tồn Kho"
-    
-    # Styles
-    header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='28a745', end_color='28a745', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    title_font = Font(name='Arial', size=16, bold=True, color='28a745')
-    title_alignment = Alignment(horizontal='center', vertical='center')
-    
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    # Title
-    ws.merge_cells('A1:G1')
-    title_cell = ws['A1']
+    styles = _excel_styles()
+    wb, ws = _new_excel_sheet("Báo Cáo Tồn Kho", [8, 35, 20, 12, 10, 15, 15])
+
     title_text = f"BÁO CÁO TỒN KHO"
     if farm_name:
         title_text += f" - {farm_name}"
-    title_cell.value = title_text
-    title_cell.font = title_font
-    title_cell.alignment = title_alignment
-    
-    # Info
-    ws.merge_cells('A2:G2')
-    info_cell = ws['A2']
-    info_cell.value = f"Ngày báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Tổng: {products.count()} sản phẩm"
-    info_cell.alignment = Alignment(horizontal='center')
-    
-    # Headers
     headers = ['STT', 'Sản phẩm', 'Danh mục', 'Tồn kho', 'Đơn vị', 'Giá (VNĐ)', 'Trạng thái']
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
-    # Data
+    _write_excel_heading(ws, styles, title_text, f"Ngày báo cáo: {datetime.now().strftime('%d/%m/%Y %H:%M')}", headers)
+
+    rows = products.values_list(
+        'name', 'category__name', 'stock_quantity', 'unit', 'price'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    count = 0
     total_value = 0
-    for idx, product in enumerate(products, 1):
-        row_num = idx + 4
-        status = 'Sắp hết' if product.stock_quantity < 20 else 'Đủ hàng'
-        value = product.stock_quantity * float(product.price)
-        total_value += value
-        
-        data_row = [
-            idx,
-            product.name,
-            product.category.name if product.category else '-',
-            product.stock_quantity,
-            product.unit,
-            float(product.price),
-            status
-        ]
-        
-        for col_num, value_cell in enumerate(data_row, 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = value_cell
-            cell.border = border
-            
-            if col_num in [1, 4, 5]:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            elif col_num == 6:
-                cell.alignment = Alignment(horizontal='right', vertical='center')
-                cell.number_format = '#,##0'
-            else:
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-            
-            # Status color
-            if col_num == 7:
-                if product.stock_quantity < 20:
-                    cell.fill = PatternFill(start_color='fff3cd', end_color='fff3cd', fill_type='solid')
-                    cell.font = Font(color='856404', bold=True)
-                else:
-                    cell.fill = PatternFill(start_color='d4edda', end_color='d4edda', fill_type='solid')
-                    cell.font = Font(color='155724', bold=True)
-    
-    # Total row
-    total_row = products.count() + 5
-    ws.merge_cells(f'A{total_row}:E{total_row}')
-    total_cell = ws[f'A{total_row}']
-    total_cell.value = 'TỔNG GIÁ TRỊ TỒN KHO:'
-    total_cell.font = Font(bold=True)
-    total_cell.alignment = Alignment(horizontal='right', vertical='center')
-    total_cell.border = border
-    
-    value_cell = ws[f'F{total_row}']
-    value_cell.value = total_value
-    value_cell.font = Font(bold=True, color='FF0000', size=12)
-    value_cell.alignment = Alignment(horizontal='right', vertical='center')
-    value_cell.number_format = '#,##0'
-    value_cell.border = border
-    value_cell.fill = PatternFill(start_color='fff3cd', end_color='fff3cd', fill_type='solid')
-    
-    # Adjust column widths
-    column_widths = [8, 35, 20, 12, 10, 15, 15]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[get_column_letter(col_num)].width = width
-    
-    # Freeze panes
-    ws.freeze_panes = 'A5'
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    excel_data = buffer.getvalue()
-    buffer.close()
-    
-    return excel_data
+    for count, (name, category_name, stock_quantity, unit, price) in enumerate(rows, 1):
+        low_stock = stock_quantity < 20
+        total_value += stock_quantity * float(price)
+        ws.append([
+            _cell(ws, count, styles['center']),
+            _cell(ws, name, styles['left']),
+            _cell(ws, category_name or '-', styles['left']),
+            _cell(ws, stock_quantity, styles['center']),
+            _cell(ws, unit, styles['center']),
+            _cell(ws, float(price), styles['money']),
+            _cell(ws, 'Sắp hết' if low_stock else 'Đủ hàng', styles['warning'] if low_stock else styles['ok']),
+        ])
+
+    total_row = count + 5
+    ws.append([
+        _cell(ws, f'TỔNG GIÁ TRỊ TỒN KHO ({count} sản phẩm):', styles['total_label']),
+        None, None, None, None,
+        _cell(ws, total_value, styles['total_value']),
+    ])
+    ws.merged_cells.add(f'A{total_row}:E{total_row}')
+    wb.save(output)
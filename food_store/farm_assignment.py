@@ -0,0 +1,152 @@
+"""
+Gán cửa hàng phụ trách và tính phí ship cho đơn hàng
+Tách khỏi Order.save(): routing có thể phải gọi OSRM nên chỉ chạy khi được
+gọi tường minh (lúc đặt hàng) hoặc trong job nền (lệnh assign_farms), kết
+quả được lưu vào đơn hàng một lần. Kết quả theo tọa độ được cache, key gồm
+phiên bản dữ liệu Farm (xem gis_tools.map_cache) nên tự hết hạn khi cửa
+hàng thay đổi.
+"""
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENT_CACHE_TIMEOUT = 60 * 60  # 1 giờ
+ASSIGNMENT_MAX_DISTANCE_KM = 50
+# Làm tròn tọa độ ~11m: các đơn cùng địa chỉ dùng chung kết quả routing
+ASSIGNMENT_COORD_PRECISION = 4
+
+BASE_SHIPPING_FEE = 15000
+SHIPPING_FEE_PER_KM = 2000
+MAX_SHIPPING_FEE = 50000
+
+
+def calculate_shipping_fee(distance_km):
+    """
+    Returns:
+        dict {'base_fee', 'distance_fee', 'total'} (VNĐ)
+    """
+    distance_fee = distance_km * SHIPPING_FEE_PER_KM
+    total_fee = min(BASE_SHIPPING_FEE + distance_fee, MAX_SHIPPING_FEE)
+    return {'base_fee': BASE_SHIPPING_FEE, 'distance_fee': distance_fee, 'total': total_fee}
+
+
+def _nearest_farm(latitude, longitude):
+    """(farm_id, distance_km, duration_min, is_estimate) hoặc None"""
+    from gis_tools.gis_functions import FarmLocationAnalyzer
+
+    try:
+        farms = FarmLocationAnalyzer.find_nearest_farms_by_road(
+            latitude,
+            longitude,
+            max_distance_km=ASSIGNMENT_MAX_DISTANCE_KM,
+            limit=1,
+            geometry_limit=0
+        )
+        if farms:
+            farm = farms[0]
+            return farm.pk, farm.distance_km, farm.duration_min, getattr(farm, 'is_estimate', False)
+        return None
+    except Exception as e:
+        logger.warning(f"Road routing failed, falling back to straight-line distance: {e}")
+
+    from gis_tools.distance import nearest_point
+    from .models import Farm
+
+    farms = list(Farm.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).values_list('id', 'latitude', 'longitude'))
+    index, distance_km = nearest_point(latitude, longitude, [(lat, lng) for _, lat, lng in farms])
+    if index is None:
+        return None
+    return farms[index][0], distance_km, distance_km * 2, True
+
+
+def find_farm_assignment(latitude, longitude):
+    """
+    Cửa hàng gần nhất theo đường đi và phí ship cho một vị trí giao hàng (có cache)
+
+    Returns:
+        dict {'farm_id', 'distance_km', 'duration_min', 'is_estimate',
+        'shipping_fee', 'breakdown'} hoặc None nếu không có cửa hàng phù hợp
+    """
+    from gis_tools.map_cache import get_data_version
+
+    lat = round(float(latitude), ASSIGNMENT_COORD_PRECISION)
+    lng = round(float(longitude), ASSIGNMENT_COORD_PRECISION)
+    key = f"farm_assignment:{get_data_version('farm')}:{lat}:{lng}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['assignment']
+
+    assignment = None
+    nearest = _nearest_farm(latitude, longitude)
+    if nearest:
+        farm_id, distance_km, duration_min, is_estimate = nearest
+        breakdown = calculate_shipping_fee(distance_km)
+        assignment = {
+            'farm_id': farm_id,
+            'distance_km': distance_km,
+            'duration_min': duration_min,
+            'is_estimate': is_estimate,
+            'shipping_fee': float(breakdown['total']),
+            'breakdown': breakdown,
+        }
+
+    # Lưu cả kết quả None để không routing lại liên tục cho vị trí không có cửa hàng
+    cache.set(key, {'assignment': assignment}, ASSIGNMENT_CACHE_TIMEOUT)
+    return assignment
+
+
+def assign_farm(order, save=True):
+    """
+    Gán cửa hàng gần nhất, khoảng cách và thời gian giao cho đơn hàng
+
+    Args:
+        save: Lưu các trường vừa gán (update_fields) nếu đơn đã có trong database
+
+    Returns:
+        dict assignment (xem find_farm_assignment) hoặc None
+    """
+    if not order.delivery_latitude or not order.delivery_longitude:
+        return None
+
+    assignment = find_farm_assignment(order.delivery_latitude, order.delivery_longitude)
+    if assignment is None:
+        return None
+
+    order.assigned_farm_id = assignment['farm_id']
+    order.delivery_distance_km = assignment['distance_km']
+    order.delivery_duration_min = assignment['duration_min']
+    if save and order.pk:
+        order.save(update_fields=['assigned_farm', 'delivery_distance_km', 'delivery_duration_min', 'updated_at'])
+    return assignment
+
+
+def assign_unassigned_orders(orders=None, batch_size=100):
+    """
+    Job nền: gán cửa hàng cho các đơn hàng chưa có (vd: tạo từ admin/lệnh)
+
+    Args:
+        orders: QuerySet Order (mặc định tất cả đơn chưa gán, có tọa độ)
+
+    Returns:
+        Số đơn đã được gán
+    """
+    from .models import Order
+
+    if orders is None:
+        orders = Order.objects.all()
+    orders = orders.filter(
+        assigned_farm__isnull=True,
+        delivery_latitude__isnull=False,
+        delivery_longitude__isnull=False
+    ).only('id', 'delivery_latitude', 'delivery_longitude')
+
+    assigned = 0
+    for order in orders.iterator(chunk_size=batch_size):
+        if assign_farm(order):
+            assigned += 1
+    return assigned
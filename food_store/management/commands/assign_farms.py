@@ -0,0 +1,28 @@
+"""
+Management command to assign the nearest farm to orders that have none
+"""
+from django.core.management.base import BaseCommand
+
+from food_store.farm_assignment import assign_unassigned_orders
+from food_store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Assign the nearest farm (by road) to orders without an assigned farm'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order',
+            type=int,
+            action='append',
+            dest='order_ids',
+            help='Only process this order id (can be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['order_ids']:
+            orders = orders.filter(pk__in=options['order_ids'])
+
+        assigned = assign_unassigned_orders(orders)
+        self.stdout.write(self.style.SUCCESS(f'Assigned a farm to {assigned} orders'))
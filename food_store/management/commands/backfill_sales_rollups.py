@@ -0,0 +1,36 @@
+"""
+Management command to rebuild the daily sales rollup tables from orders
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from food_store.sales_rollup import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily per-farm, per-product and per-zone sales rollups from Order/OrderItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD), default: all history')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD), default: today')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+
+    def _parse_date(self, value, name):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'--{name} must be a date in YYYY-MM-DD format')
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'], 'start')
+        end = self._parse_date(options['end'], 'end')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        written = rebuild_sales_rollups(start, end, batch_size=options['batch_size'])
+        for table, count in written.items():
+            self.stdout.write(f'{table}: {count} rows')
+        self.stdout.write(self.style.SUCCESS('Sales rollups rebuilt'))
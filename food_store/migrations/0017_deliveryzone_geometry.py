@@ -0,0 +1,98 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+# Polygon các tỉnh/thành miền Nam trước đây được khai báo cứng trong
+# DeliveryZoneManager.get_all_delivery_zones_geojson
+SOUTH_VIETNAM_POLYGONS = {
+    'TP. Hồ Chí Minh': [[
+        [106.4, 10.5], [106.9, 10.5], [106.9, 11.0], [106.4, 11.0], [106.4, 10.5]
+    ]],
+    'Bình Dương': [[
+        [106.5, 11.0], [107.0, 11.0], [107.0, 11.4], [106.5, 11.4], [106.5, 11.0]
+    ]],
+    'Đồng Nai': [[
+        [106.8, 10.8], [107.6, 10.8], [107.6, 11.5], [106.8, 11.5], [106.8, 10.8]
+    ]],
+    'Bà Rịa - Vũng Tàu': [[
+        [106.8, 10.1], [107.4, 10.1], [107.4, 10.7], [106.8, 10.7], [106.8, 10.1]
+    ]],
+    'Long An': [[
+        [105.9, 10.4], [106.6, 10.4], [106.6, 11.0], [105.9, 11.0], [105.9, 10.4]
+    ]],
+    'Tây Ninh': [[
+        [105.8, 11.0], [106.5, 11.0], [106.5, 11.7], [105.8, 11.7], [105.8, 11.0]
+    ]],
+    'Tiền Giang': [[
+        [105.9, 10.1], [106.6, 10.1], [106.6, 10.6], [105.9, 10.6], [105.9, 10.1]
+    ]],
+    'Bến Tre': [[
+        [106.0, 9.9], [106.7, 9.9], [106.7, 10.4], [106.0, 10.4], [106.0, 9.9]
+    ]],
+    'Vĩnh Long': [[
+        [105.6, 9.9], [106.2, 9.9], [106.2, 10.4], [105.6, 10.4], [105.6, 9.9]
+    ]],
+    'Trà Vinh': [[
+        [106.0, 9.6], [106.6, 9.6], [106.6, 10.2], [106.0, 10.2], [106.0, 9.6]
+    ]],
+    'Đồng Tháp': [[
+        [105.3, 10.2], [105.9, 10.2], [105.9, 10.8], [105.3, 10.8], [105.3, 10.2]
+    ]],
+    'An Giang': [[
+        [104.9, 10.1], [105.7, 10.1], [105.7, 10.8], [104.9, 10.8], [104.9, 10.1]
+    ]],
+    'Kiên Giang': [[
+        [104.5, 9.5], [105.4, 9.5], [105.4, 10.5], [104.5, 10.5], [104.5, 9.5]
+    ]],
+    'Cần Thơ': [[
+        [105.5, 9.8], [106.0, 9.8], [106.0, 10.3], [105.5, 10.3], [105.5, 9.8]
+    ]],
+    'Hậu Giang': [[
+        [105.4, 9.5], [105.9, 9.5], [105.9, 10.0], [105.4, 10.0], [105.4, 9.5]
+    ]],
+    'Sóc Trăng': [[
+        [105.7, 9.3], [106.3, 9.3], [106.3, 9.9], [105.7, 9.9], [105.7, 9.3]
+    ]],
+    'Bạc Liêu': [[
+        [105.4, 9.0], [105.9, 9.0], [105.9, 9.5], [105.4, 9.5], [105.4, 9.0]
+    ]],
+    'Cà Mau': [[
+        [104.8, 8.6], [105.5, 8.6], [105.5, 9.4], [104.8, 9.4], [104.8, 8.6]
+    ]],
+    'Bình Phước': [[
+        [106.4, 11.4], [107.2, 11.4], [107.2, 12.2], [106.4, 12.2], [106.4, 11.4]
+    ]],
+    'Bình Thuận': [[
+        [107.4, 10.5], [108.5, 10.5], [108.5, 11.6], [107.4, 11.6], [107.4, 10.5]
+    ]],
+    'Ninh Thuận': [[
+        [108.2, 11.2], [109.2, 11.2], [109.2, 12.0], [108.2, 12.0], [108.2, 11.2]
+    ]],
+    'Lâm Đồng': [[
+        [107.2, 11.0], [108.8, 11.0], [108.8, 12.3], [107.2, 12.3], [107.2, 11.0]
+    ]]
+}
+
+
+def fill_zone_geometry(apps, schema_editor):
+    DeliveryZone = apps.get_model('food_store', 'DeliveryZone')
+    for zone in DeliveryZone.objects.filter(geometry__isnull=True, name__in=SOUTH_VIETNAM_POLYGONS):
+        zone.geometry = {'type': 'Polygon', 'coordinates': SOUTH_VIETNAM_POLYGONS[zone.name]}
+        zone.save(update_fields=['geometry'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0016_emailverification_passwordreset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryzone',
+            name='geometry',
+            field=models.JSONField(blank=True, help_text='GeoJSON Polygon/MultiPolygon của khu vực, tọa độ [lng, lat]', null=True),
+        ),
+        migrations.RunPython(fill_zone_geometry, migrations.RunPython.noop),
+    ]
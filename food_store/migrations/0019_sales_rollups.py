@@ -0,0 +1,67 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0018_order_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFarmSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xử lý'), ('confirmed', 'Đã xác nhận'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy')], max_length=20, verbose_name='Trạng thái')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Số đơn hàng')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Doanh thu')),
+                ('farm', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='food_store.farm', verbose_name='Cửa hàng')),
+            ],
+            options={
+                'verbose_name': 'Doanh số ngày theo cửa hàng',
+                'verbose_name_plural': 'Doanh số ngày theo cửa hàng',
+                'indexes': [models.Index(fields=['farm', 'date'], name='daily_farm_sales_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'farm', 'status'), name='uniq_daily_farm_sales'), models.UniqueConstraint(condition=models.Q(('farm__isnull', True)), fields=('date', 'status'), name='uniq_daily_unassigned_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xử lý'), ('confirmed', 'Đã xác nhận'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy')], max_length=20, verbose_name='Trạng thái đơn')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Số đơn hàng')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Số lượng')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Doanh thu')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='food_store.farm', verbose_name='Cửa hàng')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='food_store.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name': 'Doanh số ngày theo sản phẩm',
+                'verbose_name_plural': 'Doanh số ngày theo sản phẩm',
+                'indexes': [models.Index(fields=['date'], name='daily_product_sales_date_idx'), models.Index(fields=['farm', 'date'], name='daily_product_sales_farm_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'status'), name='uniq_daily_product_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyZoneSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xử lý'), ('confirmed', 'Đã xác nhận'), ('shipping', 'Đang giao hàng'), ('delivered', 'Đã giao hàng'), ('cancelled', 'Đã hủy')], max_length=20, verbose_name='Trạng thái')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Số đơn hàng')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Doanh thu')),
+                ('zone', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='food_store.deliveryzone', verbose_name='Khu vực giao hàng')),
+            ],
+            options={
+                'verbose_name': 'Doanh số ngày theo khu vực',
+                'verbose_name_plural': 'Doanh số ngày theo khu vực',
+                'indexes': [models.Index(fields=['zone', 'date'], name='daily_zone_sales_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'zone', 'status'), name='uniq_daily_zone_sales'), models.UniqueConstraint(condition=models.Q(('zone__isnull', True)), fields=('date', 'status'), name='uniq_daily_no_zone_sales')],
+            },
+        ),
+    ]
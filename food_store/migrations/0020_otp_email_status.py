@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0019_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailverification',
+            name='email_status',
+            field=models.CharField(choices=[('pending', 'Đang gửi'), ('sent', 'Đã gửi'), ('failed', 'Gửi lỗi')], default='pending', max_length=10, verbose_name='Trạng thái gửi email'),
+        ),
+        migrations.AddField(
+            model_name='passwordreset',
+            name='email_status',
+            field=models.CharField(choices=[('pending', 'Đang gửi'), ('sent', 'Đã gửi'), ('failed', 'Gửi lỗi')], default='pending', max_length=10, verbose_name='Trạng thái gửi email'),
+        ),
+    ]
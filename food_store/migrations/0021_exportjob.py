@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:30
+
+import django.db.models.deletion
+import food_store.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0020_otp_email_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.CharField(default=food_store.models.new_export_job_id, editable=False, max_length=32, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('transactions', 'Giao dịch kho'), ('inventory', 'Tồn kho')], max_length=20, verbose_name='Loại báo cáo')),
+                ('farm_name', models.CharField(blank=True, max_length=200, verbose_name='Tên cửa hàng trên báo cáo')),
+                ('filename', models.CharField(max_length=255, verbose_name='Tên file')),
+                ('status', models.CharField(choices=[('pending', 'Chờ xử lý'), ('running', 'Đang xuất'), ('done', 'Hoàn tất'), ('failed', 'Lỗi')], default='pending', max_length=20, verbose_name='Trạng thái')),
+                ('path', models.CharField(blank=True, max_length=500, verbose_name='Đường dẫn file')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+                ('farm', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='food_store.farm', verbose_name='Cửa hàng')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Người tạo')),
+            ],
+            options={
+                'verbose_name': 'Job xuất báo cáo',
+                'verbose_name_plural': 'Job xuất báo cáo',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='export_job_created_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:10
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 1000
+
+
+def backfill_sales_rollups(apps, schema_editor):
+    # Dashboard và báo cáo chỉ đọc bảng tổng hợp: tổng hợp dữ liệu đơn hàng cũ.
+    # Sao chép logic của food_store/sales_rollup.py trên model lịch sử để
+    # migration không phụ thuộc vào code hiện tại của app
+    Order = apps.get_model('food_store', 'Order')
+    OrderItem = apps.get_model('food_store', 'OrderItem')
+    DailyFarmSales = apps.get_model('food_store', 'DailyFarmSales')
+    DailyProductSales = apps.get_model('food_store', 'DailyProductSales')
+    DailyZoneSales = apps.get_model('food_store', 'DailyZoneSales')
+
+    orders = Order.objects.order_by().annotate(day=TruncDate('created_at'))
+    items = OrderItem.objects.order_by().annotate(day=TruncDate('order__created_at'))
+
+    farm_rows = (
+        orders.values('day', 'assigned_farm_id', 'status')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+    )
+    zone_rows = (
+        orders.values('day', 'delivery_zone_id', 'status')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+    )
+    product_rows = (
+        items.values('day', 'product_id', 'product__farm_id', 'order__status')
+        .annotate(
+            order_count=Count('order_id', distinct=True),
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(ExpressionWrapper(
+                F('quantity') * F('price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )),
+        )
+    )
+
+    DailyFarmSales.objects.all().delete()
+    DailyFarmSales.objects.bulk_create(
+        (
+            DailyFarmSales(
+                date=row['day'],
+                farm_id=row['assigned_farm_id'],
+                status=row['status'],
+                order_count=row['order_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in farm_rows
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    DailyZoneSales.objects.all().delete()
+    DailyZoneSales.objects.bulk_create(
+        (
+            DailyZoneSales(
+                date=row['day'],
+                zone_id=row['delivery_zone_id'],
+                status=row['status'],
+                order_count=row['order_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in zone_rows
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    DailyProductSales.objects.all().delete()
+    DailyProductSales.objects.bulk_create(
+        (
+            DailyProductSales(
+                date=row['day'],
+                product_id=row['product_id'],
+                farm_id=row['product__farm_id'],
+                status=row['order__status'],
+                order_count=row['order_count'],
+                quantity=row['total_quantity'] or 0,
+                revenue=row['total_revenue'] or 0,
+            )
+            for row in product_rows
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0021_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_rollups, migrations.RunPython.noop),
+    ]
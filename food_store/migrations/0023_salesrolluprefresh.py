@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_store', '0022_backfill_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Ngày')),
+                ('requested_at', models.DateTimeField(auto_now=True, verbose_name='Thời điểm yêu cầu')),
+            ],
+            options={
+                'verbose_name': 'Ngày chờ tổng hợp doanh số',
+                'verbose_name_plural': 'Ngày chờ tổng hợp doanh số',
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 """
 Models for Clean Food Store
 """
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -83,6 +85,10 @@ class DeliveryZone(models.Model):
     delivery_fee = models.DecimalField(max_digits=8, decimal_places=2)
     delivery_time = models.CharField(max_length=50)
     is_active = models.BooleanField(default=True)
+    geometry = models.JSONField(
+        null=True, blank=True,
+        help_text='GeoJSON Polygon/MultiPolygon của khu vực, tọa độ [lng, lat]'
+    )
     
     class Meta:
         verbose_name = "Delivery Zone"
@@ -90,6 +96,16 @@ class DeliveryZone(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from gis_tools.zone_index import prepare_geometry
+        
+        if self.geometry:
+            try:
+                prepare_geometry(self.geometry)
+            except ValueError as e:
+                raise ValidationError({'geometry': str(e)})
 
 
 class Customer(models.Model):
@@ -318,109 +334,38 @@ class Order(models.Model):
         verbose_name = "Đơn hàng"
         verbose_name_plural = "Đơn hàng"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='order_created_at_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.pk} - {self.customer.user.get_full_name()}"
     
     def auto_assign_nearest_farm(self):
-        """Auto assign nearest farm based on actual road distance"""
-        if not self.delivery_latitude or not self.delivery_longitude:
-            return None
+        """
+        Gán cửa hàng gần nhất theo đường đi thực tế (không lưu đơn hàng)
         
-        from gis_tools.gis_functions import FarmLocationAnalyzer
+        Xem food_store.farm_assignment - kết quả theo tọa độ được cache.
+        Order.save() không tự gọi hàm này; đơn tạo ngoài luồng đặt hàng (có tọa
+        độ, chưa có cửa hàng) được gán trong job nền tasks.assign_farm_task do
+        signal assign_farm_in_background (food_store/signals.py) đưa vào hàng
+        đợi. Đơn cũ được gán bằng lệnh `manage.py assign_farms`.
+        """
+        from .farm_assignment import assign_farm
         
-        try:
-            nearest_farms = FarmLocationAnalyzer.find_nearest_farms_by_road(
-                self.delivery_latitude,
-                self.delivery_longitude,
-                max_distance_km=50
-            )
-        except:
-            from django.db.models import Q
-            import math
-            
-            farms = Farm.objects.filter(
-                latitude__isnull=False,
-                longitude__isnull=False
-            )
-            
-            nearest_farm = None
-            min_distance = float('inf')
-            
-            for farm in farms:
-                lat1, lon1 = math.radians(self.delivery_latitude), math.radians(self.delivery_longitude)
-                lat2, lon2 = math.radians(farm.latitude), math.radians(farm.longitude)
-                
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-                c = 2 * math.asin(math.sqrt(a))
-                distance = 6371 * c
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_farm = farm
-            
-            if nearest_farm:
-                self.assigned_farm = nearest_farm
-                
-                base_fee = 15000
-                distance_fee = min_distance * 2000
-                total_fee = base_fee + distance_fee
-                
-                if total_fee > 50000:
-                    total_fee = 50000
-                
-                return {
-                    'farm': nearest_farm,
-                    'distance_km': min_distance,
-                    'duration_min': min_distance * 2,
-                    'shipping_fee': float(total_fee),
-                    'route_geometry': None,
-                    'is_free_shipping': total_fee == 0,
-                    'breakdown': {
-                        'base_fee': base_fee,
-                        'distance_fee': distance_fee,
-                        'total': total_fee
-                    }
-                }
-            
+        assignment = assign_farm(self, save=False)
+        if assignment is None:
             return None
         
-        if nearest_farms:
-            nearest_farm = nearest_farms[0]
-            self.assigned_farm = nearest_farm
-            
-            base_fee = 15000
-            distance_km = getattr(nearest_farm, 'distance_km', 10)
-            distance_fee = distance_km * 2000
-            total_fee = base_fee + distance_fee
-            
-            if total_fee > 50000:
-                total_fee = 50000
-            
-            return {
-                'farm': nearest_farm,
-                'distance_km': distance_km,
-                'duration_min': distance_km * 2,
-                'shipping_fee': float(total_fee),
-                'route_geometry': None,
-                'is_free_shipping': total_fee == 0,
-                'breakdown': {
-                    'base_fee': base_fee,
-                    'distance_fee': distance_fee,
-                    'total': total_fee
-                }
-            }
-        
-        return None
-    
-    def save(self, *args, **kwargs):
-        """Override save to auto assign farm if not set"""
-        if not self.assigned_farm and self.delivery_latitude and self.delivery_longitude:
-            self.auto_assign_nearest_farm()
-        
-        super().save(*args, **kwargs)
+        return {
+            'farm': self.assigned_farm,
+            'distance_km': assignment['distance_km'],
+            'duration_min': assignment['duration_min'],
+            'shipping_fee': assignment['shipping_fee'],
+            'route_geometry': None,
+            'is_free_shipping': assignment['shipping_fee'] == 0,
+            'breakdown': assignment['breakdown']
+        }
 
 
 class OrderItem(models.Model):
@@ -556,42 +501,21 @@ class StockTransaction(models.Model):
         return f"{self.get_transaction_type_display()} - {self.product.name} ({self.quantity})"
     
     def save(self, *args, **kwargs):
-        # Tính tổng tiền
-        if self.unit_price and self.quantity:
-            self.total_amount = abs(self.quantity) * self.unit_price
+        """
+        Giao dịch mới tự cập nhật tồn kho sản phẩm (xem food_store.stock_ledger).
+        Ghi nhiều giao dịch cùng lúc thì dùng stock_ledger.record_stock_movements
+        """
+        from django.db import transaction
+        from .stock_ledger import apply_stock_movements
         
-        # Lưu tồn kho trước
-        if not self.pk:  # Chỉ khi tạo mới
-            self.stock_before = self.product.stock_quantity
-            
-            # Kiểm tra tồn kho trước khi xuất
-            if self.transaction_type in ['export', 'damaged']:
-                if abs(self.quantity) > self.product.stock_quantity:
-                    from django.core.exceptions import ValidationError
-                    raise ValidationError(
-                        f'Không đủ hàng trong kho! '
-                        f'Tồn kho hiện tại: {self.product.stock_quantity}, '
-                        f'Số lượng xuất: {abs(self.quantity)}'
-                    )
-            
-            # Cập nhật tồn kho sản phẩm
-            if self.transaction_type == 'import':
-                self.product.stock_quantity += abs(self.quantity)
-            elif self.transaction_type in ['export', 'damaged']:
-                self.product.stock_quantity -= abs(self.quantity)
-            elif self.transaction_type == 'adjustment':
-                self.product.stock_quantity = abs(self.quantity)
-            elif self.transaction_type == 'return':
-                self.product.stock_quantity += abs(self.quantity)
-            
-            # Đảm bảo không âm
-            if self.product.stock_quantity < 0:
-                self.product.stock_quantity = 0
-            
-            self.stock_after = self.product.stock_quantity
-            self.product.save()
+        if self.pk:
+            if self.unit_price and self.quantity:
+                self.total_amount = abs(self.quantity) * self.unit_price
+            return super().save(*args, **kwargs)
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            apply_stock_movements([self])
+            super().save(*args, **kwargs)
 
 
 class StockAlert(models.Model):
@@ -682,6 +606,184 @@ class InventoryReport(models.Model):
         return f"Kiểm kê {self.farm.name} - {self.report_date}"
 
 
+def new_export_job_id():
+    return uuid.uuid4().hex
+
+
+class ExportJob(models.Model):
+    """
+    Job xuất báo cáo PDF chạy nền (xem food_store/export_jobs.py)
+    Trạng thái lưu trong database để mọi web worker (và Celery worker) đều
+    thấy cùng một job khi người dùng xem trạng thái/tải file.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Chờ xử lý'),
+        ('running', 'Đang xuất'),
+        ('done', 'Hoàn tất'),
+        ('failed', 'Lỗi'),
+    ]
+
+    KIND_CHOICES = [
+        ('transactions', 'Giao dịch kho'),
+        ('inventory', 'Tồn kho'),
+    ]
+
+    id = models.CharField(max_length=32, primary_key=True, default=new_export_job_id, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs', verbose_name="Người tạo")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Loại báo cáo")
+    farm = models.ForeignKey(
+        Farm,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='export_jobs',
+        verbose_name="Cửa hàng"
+    )
+    farm_name = models.CharField(max_length=200, blank=True, verbose_name="Tên cửa hàng trên báo cáo")
+    filename = models.CharField(max_length=255, verbose_name="Tên file")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Trạng thái")
+    path = models.CharField(max_length=500, blank=True, verbose_name="Đường dẫn file")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lúc")
+
+    class Meta:
+        verbose_name = "Job xuất báo cáo"
+        verbose_name_plural = "Job xuất báo cáo"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='export_job_created_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+
+# ============================================
+# Bảng tổng hợp doanh số theo ngày
+# ============================================
+# Được cập nhật lại theo từng ngày khi đơn hàng thay đổi, dữ liệu cũ được
+# tổng hợp trong migration 0022; dựng lại toàn bộ bằng lệnh
+# backfill_sales_rollups (xem food_store/sales_rollup.py)
+
+class DailyFarmSales(models.Model):
+    """Doanh số theo ngày của từng cửa hàng (farm trống = đơn chưa gán cửa hàng)"""
+    date = models.DateField(verbose_name="Ngày")
+    farm = models.ForeignKey(
+        Farm,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_sales',
+        verbose_name="Cửa hàng"
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Trạng thái")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="Số đơn hàng")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Doanh thu")
+    
+    class Meta:
+        verbose_name = "Doanh số ngày theo cửa hàng"
+        verbose_name_plural = "Doanh số ngày theo cửa hàng"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'farm', 'status'], name='uniq_daily_farm_sales'),
+            models.UniqueConstraint(
+                fields=['date', 'status'],
+                condition=models.Q(farm__isnull=True),
+                name='uniq_daily_unassigned_sales'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['farm', 'date'], name='daily_farm_sales_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.farm_id} - {self.status}"
+
+
+class DailyProductSales(models.Model):
+    """Số lượng bán theo ngày của từng sản phẩm"""
+    date = models.DateField(verbose_name="Ngày")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales',
+        verbose_name="Sản phẩm"
+    )
+    farm = models.ForeignKey(
+        Farm,
+        on_delete=models.CASCADE,
+        related_name='daily_product_sales',
+        verbose_name="Cửa hàng"
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Trạng thái đơn")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="Số đơn hàng")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Số lượng")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Doanh thu")
+    
+    class Meta:
+        verbose_name = "Doanh số ngày theo sản phẩm"
+        verbose_name_plural = "Doanh số ngày theo sản phẩm"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'status'], name='uniq_daily_product_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='daily_product_sales_date_idx'),
+            models.Index(fields=['farm', 'date'], name='daily_product_sales_farm_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.product_id} - {self.status}"
+
+
+class DailyZoneSales(models.Model):
+    """Doanh số theo ngày của từng khu vực giao hàng (zone trống = ngoài khu vực)"""
+    date = models.DateField(verbose_name="Ngày")
+    zone = models.ForeignKey(
+        DeliveryZone,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_sales',
+        verbose_name="Khu vực giao hàng"
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Trạng thái")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="Số đơn hàng")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Doanh thu")
+    
+    class Meta:
+        verbose_name = "Doanh số ngày theo khu vực"
+        verbose_name_plural = "Doanh số ngày theo khu vực"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'zone', 'status'], name='uniq_daily_zone_sales'),
+            models.UniqueConstraint(
+                fields=['date', 'status'],
+                condition=models.Q(zone__isnull=True),
+                name='uniq_daily_no_zone_sales'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['zone', 'date'], name='daily_zone_sales_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.zone_id} - {self.status}"
+
+
+class SalesRollupRefresh(models.Model):
+    """
+    Ngày đã có job tổng hợp lại đang chờ trong hàng đợi - các thay đổi khác
+    của cùng ngày trước khi job chạy không đưa thêm job vào hàng đợi
+    """
+    date = models.DateField(unique=True, verbose_name="Ngày")
+    requested_at = models.DateTimeField(auto_now=True, verbose_name="Thời điểm yêu cầu")
+    
+    class Meta:
+        verbose_name = "Ngày chờ tổng hợp doanh số"
+        verbose_name_plural = "Ngày chờ tổng hợp doanh số"
+    
+    def __str__(self):
+        return f"{self.date}"
+
+
 # ============================================
 # Email Verification & Password Reset Models
 # ============================================
@@ -691,6 +793,13 @@ from django.utils import timezone
 import random
 import string
 
+# Trạng thái gửi email OTP (job nền ghi lại để trang nhập mã báo lỗi gửi)
+OTP_EMAIL_STATUS_CHOICES = [
+    ('pending', 'Đang gửi'),
+    ('sent', 'Đã gửi'),
+    ('failed', 'Gửi lỗi'),
+]
+
 
 class EmailVerification(models.Model):
     """
@@ -702,6 +811,9 @@ class EmailVerification(models.Model):
     expires_at = models.DateTimeField(verbose_name="Thời gian hết hạn")
     is_verified = models.BooleanField(default=False, verbose_name="Đã xác thực")
     attempts = models.IntegerField(default=0, verbose_name="Số lần thử")
+    email_status = models.CharField(
+        max_length=10, choices=OTP_EMAIL_STATUS_CHOICES, default='pending', verbose_name="Trạng thái gửi email"
+    )
     
     # Thông tin đăng ký tạm thời
     username = models.CharField(max_length=150, verbose_name="Username")
@@ -767,6 +879,9 @@ class PasswordReset(models.Model):
     expires_at = models.DateTimeField(verbose_name="Thời gian hết hạn")
     is_used = models.BooleanField(default=False, verbose_name="Đã sử dụng")
     attempts = models.IntegerField(default=0, verbose_name="Số lần thử")
+    email_status = models.CharField(
+        max_length=10, choices=OTP_EMAIL_STATUS_CHOICES, default='pending', verbose_name="Trạng thái gửi email"
+    )
     
     class Meta:
         verbose_name = "Reset Password"
@@ -0,0 +1,196 @@
+"""
+Bảng tổng hợp doanh số theo ngày: DailyFarmSales, DailyProductSales, DailyZoneSales
+Các trang báo cáo/dashboard đọc vài trăm dòng đã cộng sẵn thay vì quét toàn
+bộ lịch sử Order/OrderItem.
+
+Khi đơn hàng hoặc chi tiết đơn thay đổi (xem food_store/signals.py), ngày đặt
+của đơn được tổng hợp lại trong job nền (tasks.refresh_sales_rollup_task) -
+chỉ quét đơn của ngày đó. Mỗi ngày chỉ có một job chờ trong hàng đợi
+(SalesRollupRefresh): đặt một đơn N sản phẩm hay nhiều đơn liên tiếp cùng
+ngày chỉ tổng hợp lại một lần. Dữ liệu cũ được tổng hợp trong migration;
+dựng lại toàn bộ: python manage.py backfill_sales_rollups
+"""
+import logging
+import threading
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Các ngày cần tổng hợp lại của transaction đang chạy trong thread này
+_scheduled = threading.local()
+
+# Các trường của Order ảnh hưởng đến bảng tổng hợp
+ROLLUP_ORDER_FIELDS = {'status', 'total_amount', 'assigned_farm', 'delivery_zone', 'created_at'}
+ROLLUP_BATCH_SIZE = 1000
+ROLLUP_RETRIES = 3
+# Job chờ lâu hơn thời gian này coi như đã mất (worker dừng...) - thay đổi
+# tiếp theo của ngày đó đưa job mới vào hàng đợi
+ROLLUP_PENDING_TIMEOUT = 10 * 60  # giây
+
+
+def rollup_date(created_at):
+    """Ngày (theo múi giờ hiện tại) mà đơn hàng được cộng vào"""
+    return timezone.localdate(created_at)
+
+
+def _day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def _rollup_rows(orders, items):
+    """Các dòng tổng hợp (chưa lưu) cho tập đơn hàng và chi tiết đơn"""
+    from .models import DailyFarmSales, DailyProductSales, DailyZoneSales
+
+    farm_rows = (
+        orders.annotate(day=TruncDate('created_at'))
+        .values('day', 'assigned_farm_id', 'status')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+    )
+    zone_rows = (
+        orders.annotate(day=TruncDate('created_at'))
+        .values('day', 'delivery_zone_id', 'status')
+        .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+    )
+    product_rows = (
+        items.annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id', 'product__farm_id', 'order__status')
+        .annotate(
+            order_count=Count('order_id', distinct=True),
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(ExpressionWrapper(
+                F('quantity') * F('price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )),
+        )
+    )
+
+    return {
+        DailyFarmSales: [
+            DailyFarmSales(
+                date=row['day'],
+                farm_id=row['assigned_farm_id'],
+                status=row['status'],
+                order_count=row['order_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in farm_rows
+        ],
+        DailyZoneSales: [
+            DailyZoneSales(
+                date=row['day'],
+                zone_id=row['delivery_zone_id'],
+                status=row['status'],
+                order_count=row['order_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in zone_rows
+        ],
+        DailyProductSales: [
+            DailyProductSales(
+                date=row['day'],
+                product_id=row['product_id'],
+                farm_id=row['product__farm_id'],
+                status=row['order__status'],
+                order_count=row['order_count'],
+                quantity=row['total_quantity'] or 0,
+                revenue=row['total_revenue'] or 0,
+            )
+            for row in product_rows
+        ],
+    }
+
+
+def rebuild_sales_rollups(start=None, end=None, batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Tổng hợp lại doanh số cho các ngày từ start đến end (tính cả hai đầu)
+
+    Args:
+        start, end: date - bỏ trống để không giới hạn
+
+    Returns:
+        dict tên bảng -> số dòng đã ghi
+    """
+    from .models import Order, OrderItem
+
+    orders = Order.objects.order_by()
+    items = OrderItem.objects.order_by()
+    rollup_filters = {}
+    if start:
+        orders = orders.filter(created_at__gte=_day_start(start))
+        items = items.filter(order__created_at__gte=_day_start(start))
+        rollup_filters['date__gte'] = start
+    if end:
+        orders = orders.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+        items = items.filter(order__created_at__lt=_day_start(end + timedelta(days=1)))
+        rollup_filters['date__lte'] = end
+
+    # Hai job dựng lại cùng một ngày song song có thể va chạm unique constraint:
+    # job thua làm lại và đọc dữ liệu mới nhất
+    for attempt in range(1, ROLLUP_RETRIES + 1):
+        try:
+            with transaction.atomic():
+                written = {}
+                for model, rows in _rollup_rows(orders, items).items():
+                    model.objects.filter(**rollup_filters).delete()
+                    model.objects.bulk_create(rows, batch_size=batch_size)
+                    written[model._meta.model_name] = len(rows)
+            return written
+        except IntegrityError:
+            if attempt == ROLLUP_RETRIES:
+                raise
+            logger.info(f"Sales rollup {start}..{end} collided with another rebuild, retrying")
+
+
+def refresh_sales_rollup(date):
+    """Tổng hợp lại một ngày và xóa cache số liệu dashboard liên quan"""
+    from .dashboard_metrics import invalidate_admin_site_stats, invalidate_farm_metrics
+    from .models import DailyFarmSales, SalesRollupRefresh
+
+    # Bỏ cờ chờ trước khi đọc đơn hàng: thay đổi commit sau thời điểm này sẽ
+    # đưa job mới vào hàng đợi thay vì bị bỏ sót
+    SalesRollupRefresh.objects.filter(date=date).delete()
+
+    farm_ids = set(DailyFarmSales.objects.filter(date=date).values_list('farm_id', flat=True))
+    rebuild_sales_rollups(date, date)
+    farm_ids.update(DailyFarmSales.objects.filter(date=date).values_list('farm_id', flat=True))
+
+    invalidate_farm_metrics(*farm_ids)
+    invalidate_admin_site_stats()
+
+
+def _request_refresh(date):
+    """Đưa job tổng hợp lại ngày vào hàng đợi nếu ngày đó chưa có job đang chờ"""
+    from .models import SalesRollupRefresh
+    from .tasks import refresh_sales_rollup_task
+
+    pending, created = SalesRollupRefresh.objects.get_or_create(date=date)
+    if not created:
+        if pending.requested_at >= timezone.now() - timedelta(seconds=ROLLUP_PENDING_TIMEOUT):
+            return
+        pending.save(update_fields=['requested_at'])
+    refresh_sales_rollup_task.delay(date.isoformat())
+
+
+def _flush_scheduled_dates():
+    # Callback đầu tiên sau commit xử lý hết các ngày, các callback sau không còn gì
+    dates = getattr(_scheduled, 'dates', set())
+    _scheduled.dates = set()
+    for date in sorted(dates):
+        _request_refresh(date)
+
+
+def schedule_rollup_refresh(created_at):
+    """
+    Tổng hợp lại ngày của đơn hàng trong job nền (sau khi transaction commit)
+    Gọi nhiều lần trong một transaction chỉ tạo một yêu cầu cho mỗi ngày; ngày
+    của transaction bị rollback được tổng hợp lại (vô hại) ở lần commit sau
+    """
+    if not hasattr(_scheduled, 'dates'):
+        _scheduled.dates = set()
+    _scheduled.dates.add(rollup_date(created_at))
+    transaction.on_commit(_flush_scheduled_dates)
@@ -0,0 +1,60 @@
+"""
+Signal handlers cho Food Store
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dashboard_metrics import invalidate_admin_site_stats, invalidate_farm_metrics
+from .models import Customer, Farm, Order, OrderItem, Product, Shipper, StockAlert
+from .sales_rollup import ROLLUP_ORDER_FIELDS, schedule_rollup_refresh
+from .tasks import assign_farm_task
+
+
+@receiver(post_save, sender=Order)
+def assign_farm_in_background(sender, instance, created, **kwargs):
+    """Đơn tạo ngoài luồng đặt hàng (admin, lệnh...) được gán cửa hàng trong job nền"""
+    if created and instance.assigned_farm_id is None and instance.delivery_latitude and instance.delivery_longitude:
+        assign_farm_task.delay(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Shipper)
+def invalidate_assigned_farm_metrics(sender, instance, **kwargs):
+    """Số liệu dashboard của cửa hàng phụ trách đơn hàng/shipper"""
+    invalidate_farm_metrics(instance.assigned_farm_id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=StockAlert)
+def invalidate_farm_metrics_on_change(sender, instance, **kwargs):
+    """Số liệu dashboard của cửa hàng có sản phẩm/cảnh báo tồn kho thay đổi"""
+    invalidate_farm_metrics(instance.farm_id)
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Farm)
+def invalidate_admin_stats(sender, **kwargs):
+    """Thống kê trang chủ Django admin (context processor dashboard_stats)"""
+    invalidate_admin_site_stats()
+
+
+@receiver(post_save, sender=Order)
+def refresh_sales_rollup_on_order_save(sender, instance, update_fields=None, **kwargs):
+    """Tổng hợp lại doanh số ngày của đơn khi trạng thái/số tiền/cửa hàng/khu vực đổi"""
+    if update_fields is None or ROLLUP_ORDER_FIELDS.intersection(update_fields):
+        schedule_rollup_refresh(instance.created_at)
+
+
+@receiver(post_delete, sender=Order)
+def refresh_sales_rollup_on_order_delete(sender, instance, **kwargs):
+    schedule_rollup_refresh(instance.created_at)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def refresh_sales_rollup_on_item_change(sender, instance, **kwargs):
+    """Chi tiết đơn sửa riêng (đơn mới đã được tổng hợp khi lưu Order)"""
+    created_at = Order.objects.filter(pk=instance.order_id).values_list('created_at', flat=True).first()
+    if created_at:
+        schedule_rollup_refresh(created_at)
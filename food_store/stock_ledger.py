@@ -0,0 +1,120 @@
+"""
+Sổ kho: ghi nhiều giao dịch xuất nhập kho cùng lúc
+Khóa các sản phẩm liên quan một lần (theo thứ tự id), tính stock_before /
+stock_after tuần tự cho từng giao dịch trên giá trị đã khóa, cập nhật tồn kho
+của cả nhóm sản phẩm bằng một câu UPDATE với F() rồi bulk_create các
+StockTransaction. Thay cho việc mỗi giao dịch tự đọc-sửa-lưu cả dòng Product.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+
+STOCK_IN_TYPES = ('import', 'return')
+STOCK_OUT_TYPES = ('export', 'damaged')
+
+
+class InsufficientStockError(ValidationError):
+    """Xuất kho nhiều hơn tồn kho hiện tại"""
+
+    def __init__(self, product, requested, available):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f'Không đủ hàng trong kho! '
+            f'Tồn kho hiện tại: {available}, '
+            f'Số lượng xuất: {requested}'
+        )
+
+
+class StockConflictError(Exception):
+    """Tồn kho bị thay đổi bởi giao dịch khác trong lúc ghi sổ"""
+
+
+def apply_stock_movements(transactions):
+    """
+    Cập nhật tồn kho cho các StockTransaction chưa lưu (không tự lưu chúng)
+
+    Điền stock_before, stock_after, total_amount của từng giao dịch theo đúng
+    thứ tự trong list. Phải gọi trong transaction.atomic().
+
+    Raises:
+        InsufficientStockError: giao dịch xuất/hư hỏng vượt quá tồn kho
+        StockConflictError: tồn kho đổi giữa lúc đọc và lúc ghi (database
+            không hỗ trợ select_for_update)
+    """
+    from .models import Product
+    from .tasks import update_stock_alerts_task
+
+    product_ids = sorted({t.product_id for t in transactions})
+    locked = dict(
+        Product.objects.select_for_update()
+        .filter(pk__in=product_ids).order_by('pk')
+        .values_list('pk', 'stock_quantity')
+    )
+    stock = dict(locked)
+
+    for t in transactions:
+        quantity = abs(t.quantity)
+        before = stock[t.product_id]
+        if t.transaction_type in STOCK_IN_TYPES:
+            after = before + quantity
+        elif t.transaction_type in STOCK_OUT_TYPES:
+            if quantity > before:
+                raise InsufficientStockError(t.product, quantity, before)
+            after = before - quantity
+        elif t.transaction_type == 'adjustment':
+            after = quantity
+        else:
+            after = before
+
+        t.stock_before = before
+        t.stock_after = max(after, 0)
+        if t.unit_price and t.quantity:
+            t.total_amount = quantity * t.unit_price
+        stock[t.product_id] = t.stock_after
+
+    # Đồng bộ Product đã nạp sẵn trên giao dịch với tồn kho mới
+    for t in transactions:
+        if t._meta.get_field('product').is_cached(t):
+            t.product.stock_quantity = stock[t.product_id]
+
+    changed = {pk: stock[pk] - locked[pk] for pk in product_ids if stock[pk] != locked[pk]}
+    if not changed:
+        return transactions
+
+    # Chỉ cập nhật dòng còn đúng giá trị đã đọc - nếu thiếu dòng nghĩa là có xung đột
+    unchanged = Q()
+    for pk in changed:
+        unchanged |= Q(pk=pk, stock_quantity=locked[pk])
+    updated = Product.objects.filter(unchanged).update(
+        stock_quantity=Case(
+            *[When(pk=pk, then=F('stock_quantity') + delta) for pk, delta in changed.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated != len(changed):
+        raise StockConflictError('Tồn kho vừa được cập nhật bởi giao dịch khác, vui lòng thử lại')
+
+    # Cảnh báo tồn kho được cập nhật trong job nền sau khi transaction commit
+    update_stock_alerts_task.delay(list(changed))
+    return transactions
+
+
+def record_stock_movements(transactions):
+    """
+    Cập nhật tồn kho và lưu các StockTransaction chưa lưu trong một transaction
+
+    Returns:
+        List StockTransaction đã lưu (cùng thứ tự)
+    """
+    from .models import StockTransaction
+
+    transactions = list(transactions)
+    if not transactions:
+        return []
+    with transaction.atomic():
+        apply_stock_movements(transactions)
+        return StockTransaction.objects.bulk_create(transactions)
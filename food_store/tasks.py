@@ -0,0 +1,124 @@
+"""
+Job nền của cửa hàng (xem clean_food_gis/task_queue.py)
+"""
+import logging
+
+from clean_food_gis.task_queue import task
+
+logger = logging.getLogger(__name__)
+
+# Cùng ngưỡng "sắp hết hàng" với trang admin (dashboard_metrics.ADMIN_LOW_STOCK_THRESHOLD)
+LOW_STOCK_THRESHOLD = 10
+
+
+@task
+def send_verification_email_task(verification_id):
+    """
+    Gửi email OTP đăng ký - chỉ nhận id, mã OTP được đọc từ database để không
+    nằm trong broker/log của hàng đợi. Kết quả ghi vào email_status.
+    """
+    from .email_utils import send_verification_email
+    from .models import EmailVerification
+
+    verification = EmailVerification.objects.filter(pk=verification_id, is_verified=False).first()
+    if verification is None:
+        return
+
+    sent = send_verification_email(verification.email, verification.otp_code, verification.username)
+    if not sent:
+        logger.error(f"Could not send verification email to {verification.email}")
+    EmailVerification.objects.filter(pk=verification_id).update(email_status='sent' if sent else 'failed')
+
+
+@task
+def send_password_reset_email_task(reset_id):
+    """Gửi email OTP đặt lại mật khẩu (như send_verification_email_task)"""
+    from .email_utils import send_password_reset_email
+    from .models import PasswordReset
+
+    reset = PasswordReset.objects.select_related('user').filter(pk=reset_id, is_used=False).first()
+    if reset is None:
+        return
+
+    sent = send_password_reset_email(reset.email, reset.otp_code, reset.user.username)
+    if not sent:
+        logger.error(f"Could not send password reset email to {reset.email}")
+    PasswordReset.objects.filter(pk=reset_id).update(email_status='sent' if sent else 'failed')
+
+
+@task
+def assign_farm_task(order_id):
+    """Gán cửa hàng gần nhất cho đơn hàng chưa có (routing OSRM)"""
+    from .farm_assignment import assign_unassigned_orders
+    from .models import Order
+
+    assign_unassigned_orders(Order.objects.filter(pk=order_id))
+
+
+@task
+def update_stock_alerts_task(product_ids):
+    """
+    Tạo cảnh báo sắp hết/hết hàng cho sản phẩm vừa xuất nhập kho và đánh dấu
+    đã xử lý các cảnh báo không còn đúng
+    """
+    from django.utils import timezone
+    from .dashboard_metrics import invalidate_admin_site_stats, invalidate_farm_metrics
+    from .models import Product, StockAlert
+
+    products = list(Product.objects.filter(pk__in=product_ids).values_list('id', 'farm_id', 'stock_quantity'))
+    open_alerts = {
+        (alert.product_id, alert.alert_type): alert
+        for alert in StockAlert.objects.filter(
+            product_id__in=product_ids,
+            is_resolved=False,
+            alert_type__in=['low_stock', 'out_of_stock']
+        )
+    }
+
+    new_alerts = []
+    current_types = {}
+    for product_id, farm_id, stock in products:
+        if stock == 0:
+            alert_type = 'out_of_stock'
+        elif stock < LOW_STOCK_THRESHOLD:
+            alert_type = 'low_stock'
+        else:
+            alert_type = None
+        current_types[product_id] = alert_type
+
+        if alert_type and (product_id, alert_type) not in open_alerts:
+            new_alerts.append(StockAlert(
+                product_id=product_id,
+                farm_id=farm_id,
+                alert_type=alert_type,
+                threshold=LOW_STOCK_THRESHOLD,
+                current_stock=stock,
+            ))
+
+    resolved_ids = [
+        alert.pk for (product_id, alert_type), alert in open_alerts.items()
+        if current_types.get(product_id) != alert_type
+    ]
+    StockAlert.objects.filter(pk__in=resolved_ids).update(is_resolved=True, resolved_at=timezone.now())
+    StockAlert.objects.bulk_create(new_alerts)
+    if resolved_ids or new_alerts:
+        invalidate_farm_metrics(*(farm_id for _, farm_id, _ in products))
+    # Số sản phẩm sắp hết trên trang admin
+    invalidate_admin_site_stats()
+
+
+@task
+def export_pdf_task(job_id):
+    """Xuất báo cáo PDF (xem food_store/export_jobs.py)"""
+    from .export_jobs import run_export_job
+
+    run_export_job(job_id)
+
+
+@task
+def refresh_sales_rollup_task(date):
+    """Tổng hợp lại doanh số của một ngày 'YYYY-MM-DD' (xem food_store/sales_rollup.py)"""
+    from datetime import date as date_type
+    from .sales_rollup import refresh_sales_rollup
+
+    refresh_sales_rollup(date_type.fromisoformat(date))
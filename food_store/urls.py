@@ -166,6 +166,7 @@ shipper_patterns = [
 urlpatterns += shipper_patterns
 
 # Store Admin URLs (Quản lý chi nhánh)
+from . import views_export
 from . import views_store_admin
 
 store_admin_patterns = [
@@ -189,6 +190,10 @@ store_admin_patterns = [
     path('chi-nhanh/kho/ton-kho-pdf/', views_store_admin.export_inventory_pdf, name='export_inventory_pdf'),
     path('chi-nhanh/kho/ton-kho-excel/', views_store_admin.export_inventory_excel, name='export_inventory_excel'),
     
+    # Export jobs (PDF xuất nền)
+    path('xuat-bao-cao/<str:job_id>/', views_export.export_job_status, name='export_job_status'),
+    path('xuat-bao-cao/<str:job_id>/tai-ve/', views_export.export_job_download, name='export_job_download'),
+    
     path('chi-nhanh/shipper/', views_store_admin.store_admin_shippers, name='store_admin_shippers'),
     path('chi-nhanh/shipper/them/', views_store_admin.store_admin_shipper_create, name='store_admin_shipper_create'),
     path('chi-nhanh/shipper/<int:pk>/sua/', views_store_admin.store_admin_shipper_edit, name='store_admin_shipper_edit'),
@@ -10,8 +10,12 @@ from django.db.models import Q
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 
-from .models import Product, Category, Farm, Customer, Cart, CartItem, Order, OrderItem, DeliveryZone, StockTransaction
-from gis_tools.gis_functions import MapGenerator
+from .models import Product, Category, Farm, Customer, Cart, CartItem, Order, DeliveryZone
+from .checkout import CheckoutError, place_order
+from .stock_ledger import InsufficientStockError, StockConflictError
+from .farm_assignment import assign_farm
+from gis_tools.gis_functions import MapGenerator, DeliveryZoneManager
+from gis_tools.map_cache import render_map
 
 
 def home_view(request):
@@ -175,13 +179,13 @@ def farm_detail_view(request, pk):
     
     products = farm.product_set.filter(is_available=True)
     
-    farm_map = MapGenerator.create_single_farm_map(farm)
+    map_html = render_map('single_farm', lambda pk: MapGenerator.create_single_farm_map(farm), farm.pk)
     
     context = {
         'title': farm.name,
         'farm': farm,
         'products': products,
-        'map_html': farm_map._repr_html_() if farm_map else None,
+        'map_html': map_html,
     }
     return render(request, 'pages/stores/farm_detail.html', context)
 
@@ -445,6 +449,7 @@ def create_order_api(request):
     if request.method == 'POST':
         try:
             import json
+            from decimal import Decimal
             data = json.loads(request.body)
             
             # Get delivery location
@@ -480,112 +485,76 @@ def create_order_api(request):
                     'error': 'Giỏ hàng trống'
                 }, status=400)
             
-            # Find or create default delivery zone
-            delivery_zone, created = DeliveryZone.objects.get_or_create(
-                name="TP. Hồ Chí Minh",
-                defaults={
-                    'area_description': 'Khu vực TP. Hồ Chí Minh',
-                    'delivery_fee': 30000,  # Default, will be overridden
-                    'delivery_time': '1-2 ngày',
-                    'is_active': True
-                }
-            )
+            # Tìm khu vực giao hàng chứa tọa độ (point-in-polygon)
+            zone_info = DeliveryZoneManager.find_zone(latitude, longitude)
+            delivery_zone = DeliveryZone.objects.filter(pk=zone_info['id']).first() if zone_info else None
+            if delivery_zone is None:
+                # Find or create default delivery zone
+                delivery_zone, created = DeliveryZone.objects.get_or_create(
+                    name="TP. Hồ Chí Minh",
+                    defaults={
+                        'area_description': 'Khu vực TP. Hồ Chí Minh',
+                        'delivery_fee': 30000,  # Default, will be overridden
+                        'delivery_time': '1-2 ngày',
+                        'is_active': True
+                    }
+                )
             
-            # Create order first (without farm assignment)
-            order = Order.objects.create(
+            # Gán cửa hàng và tính phí ship theo đường đi thực tế - làm trước
+            # transaction vì routing gọi dịch vụ bên ngoài
+            order = Order(
                 customer=cart.customer,
                 delivery_address=delivery_address,
                 delivery_latitude=latitude,
                 delivery_longitude=longitude,
                 delivery_zone=delivery_zone,
-                delivery_fee=0,  # Will be set after routing
-                total_amount=cart.total_amount,  # Will be updated
                 notes=notes,
                 payment_method=payment_method  # ✅ LƯU payment_method
             )
-            
-            # Auto-assign farm và tính phí ship dựa trên đường đi thực tế
-            route_info = order.auto_assign_nearest_farm()
+            route_info = assign_farm(order, save=False)
             
             if route_info:
-                # Cập nhật phí ship và routing info
-                from decimal import Decimal
                 order.delivery_fee = Decimal(str(route_info['shipping_fee']))
-                order.delivery_distance_km = route_info['distance_km']
-                order.delivery_duration_min = route_info['duration_min']
-                order.total_amount = cart.total_amount + Decimal(str(route_info['shipping_fee']))
-                order.save()
                 
                 shipping_info = {
                     'distance_km': round(route_info['distance_km'], 2),
                     'duration_min': round(route_info['duration_min'], 0),
-                    'fee_breakdown': {
-                        'base_fee': 15000,
-                        'distance_fee': route_info['shipping_fee'] - 15000,
-                        'total': route_info['shipping_fee']
-                    }
+                    'fee_breakdown': route_info['breakdown']
                 }
             else:
-                # Fallback: không tìm được farm, dùng phí cố định
-                order.delivery_fee = 30000
-                order.total_amount = cart.total_amount + 30000
-                order.save()
+                # Fallback: không tìm được farm, dùng phí cố định của khu vực
+                zone_fee = delivery_zone.delivery_fee
+                order.delivery_fee = zone_fee
                 
                 shipping_info = {
                     'distance_km': None,
                     'duration_min': None,
                     'fee_breakdown': {
-                        'base_fee': 30000,
+                        'base_fee': float(zone_fee),
                         'distance_fee': 0,
-                        'total': 30000
+                        'total': float(zone_fee)
                     }
                 }
             
-            # Create order items and update stock
-            for cart_item in cart.items.all():
-                product = cart_item.product
-                quantity = cart_item.quantity
-                
-                # ✅ KIỂM TRA TỒN KHO trước khi tạo order
-                if product.stock_quantity < quantity:
-                    # Xóa order vừa tạo nếu không đủ hàng
-                    order.delete()
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Sản phẩm "{product.name}" không đủ hàng! Còn {product.stock_quantity} {product.unit}, bạn đặt {quantity} {product.unit}'
-                    }, status=400)
-                
-                # Tạo order item
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=product.price
-                )
-                
-                # ✅ TRỪ TỒN KHO và TẠO STOCK TRANSACTION
-                try:
-                    StockTransaction.objects.create(
-                        product=product,
-                        farm=order.assigned_farm if order.assigned_farm else product.farm,
-                        transaction_type='export',
-                        quantity=quantity,
-                        unit_price=product.price,
-                        order=order,
-                        notes=f'Xuất kho cho đơn hàng #{order.id}',
-                        created_by=None  # System auto
-                    )
-                    # Model StockTransaction.save() sẽ TỰ ĐỘNG trừ tồn kho
-                except Exception as e:
-                    # Nếu lỗi, xóa order và rollback
-                    order.delete()
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Lỗi cập nhật kho: {str(e)}'
-                    }, status=400)
-            
-            # Clear cart
-            cart.items.all().delete()
+            # Khóa tồn kho, tạo đơn + order items + xuất kho, xóa giỏ hàng (atomic)
+            try:
+                place_order(cart, order)
+            except CheckoutError as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+            except InsufficientStockError as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': e.message
+                }, status=400)
+            except StockConflictError as e:
+                # Đơn đặt đồng thời đã đổi tồn kho - transaction đã rollback, giỏ hàng còn nguyên
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=409)
             
             return JsonResponse({
                 'success': True,
@@ -672,12 +641,12 @@ def order_detail_view(request, pk):
         order = get_object_or_404(Order, pk=pk, customer=customer)
         
         # Tạo bản đồ theo dõi
-        tracking_map = MapGenerator.create_order_tracking_map(order.id)
+        map_html = render_map('order_tracking', MapGenerator.create_order_tracking_map, order.pk)
         
         context = {
             'title': f'Đơn hàng #{order.pk}',
             'order': order,
-            'map_html': tracking_map._repr_html_() if tracking_map else None,
+            'map_html': map_html,
         }
         return render(request, 'pages/orders/order_detail.html', context)
         
@@ -11,6 +11,7 @@ from food_store.models import (
     Order, Product, Farm, Customer, 
     StockTransaction, StockAlert, Supplier, Shipper
 )
+from food_store.stock_ledger import record_stock_movements
 
 
 def is_staff_user(user):
@@ -27,27 +28,10 @@ def check_login_status(request):
 @user_passes_test(is_staff_user, login_url='/')
 def admin_dashboard(request):
     """Trang dashboard admin chính"""
+    from food_store.dashboard_metrics import get_admin_dashboard_metrics
     
-    # Thống kê tổng quan
-    total_orders = Order.objects.count()
-    total_products = Product.objects.count()
-    total_customers = Customer.objects.count()
-    total_farms = Farm.objects.count()
-    
-    # Doanh thu
-    total_revenue = Order.objects.filter(
-        status='delivered'
-    ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    
-    # Đơn hàng hôm nay
-    today = timezone.now().date()
-    orders_today = Order.objects.filter(created_at__date=today).count()
-    
-    # Đơn hàng chờ xử lý
-    pending_orders = Order.objects.filter(status='pending').count()
-    
-    # Cảnh báo tồn kho
-    stock_alerts = StockAlert.objects.filter(is_resolved=False).count()
+    # Thống kê tổng quan, doanh thu, cảnh báo và doanh thu 7 ngày
+    metrics = get_admin_dashboard_metrics()
     
     # Đơn hàng gần nhất
     recent_orders = Order.objects.select_related(
@@ -59,36 +43,15 @@ def admin_dashboard(request):
         stock_quantity__lt=20
     ).order_by('stock_quantity')[:10]
     
-    # Doanh thu 7 ngày gần nhất
-    last_7_days = []
-    revenue_7_days = []
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        revenue = Order.objects.filter(
-            created_at__date=date,
-            status='delivered'
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        last_7_days.append(date.strftime('%d/%m'))
-        revenue_7_days.append(float(revenue))
-    
     # Top sản phẩm bán chạy
     top_products = Product.objects.annotate(
         total_sold=Count('orderitem')
     ).order_by('-total_sold')[:5]
     
     context = {
-        'total_orders': total_orders,
-        'total_products': total_products,
-        'total_customers': total_customers,
-        'total_farms': total_farms,
-        'total_revenue': total_revenue,
-        'orders_today': orders_today,
-        'pending_orders': pending_orders,
-        'stock_alerts': stock_alerts,
+        **metrics,
         'recent_orders': recent_orders,
         'low_stock_products': low_stock_products,
-        'last_7_days': last_7_days,
-        'revenue_7_days': revenue_7_days,
         'top_products': top_products,
     }
     
@@ -288,33 +251,29 @@ def admin_suppliers(request):
 @login_required(login_url='/accounts/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_reports(request):
-    """Báo cáo thống kê chi tiết"""
-    from food_store.models import InventoryReport
-    from django.db.models.functions import TruncDate
+    """Báo cáo thống kê chi tiết (đọc từ bảng tổng hợp doanh số theo ngày)"""
+    from food_store.models import InventoryReport, DailyFarmSales, DailyProductSales
     
     # Thống kê theo ngày (7 ngày gần nhất)
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    daily_orders = Order.objects.filter(
-        created_at__gte=seven_days_ago
-    ).annotate(
-        date=TruncDate('created_at')
+    seven_days_ago = timezone.localdate() - timedelta(days=7)
+    daily_orders = DailyFarmSales.objects.filter(
+        date__gte=seven_days_ago
     ).values('date').annotate(
-        count=Count('id'),
-        revenue=Sum('total_amount')
+        count=Sum('order_count'),
+        revenue=Sum('revenue')
     ).order_by('date')
     
     # Thống kê theo trạng thái đơn hàng
-    order_status_stats = Order.objects.values('status').annotate(
-        count=Count('id')
+    order_status_stats = DailyFarmSales.objects.values('status').annotate(
+        count=Sum('order_count')
     ).order_by('-count')
     
     # Top sản phẩm bán chạy
-    from food_store.models import OrderItem
-    top_products = OrderItem.objects.values(
+    top_products = DailyProductSales.objects.values(
         'product__name', 'product__farm__name'
     ).annotate(
         total_quantity=Sum('quantity'),
-        total_revenue=Sum('price')
+        total_revenue=Sum('revenue')
     ).order_by('-total_quantity')[:10]
     
     # Báo cáo kiểm kê
@@ -576,6 +535,24 @@ def admin_category_delete(request, pk):
 
 
 # ============= CRUD KHU VỰC GIAO HÀNG =============
+def _parse_zone_geometry(raw):
+    """Đọc GeoJSON ranh giới khu vực từ form, None nếu để trống"""
+    import json
+    from gis_tools.zone_index import prepare_geometry
+    
+    raw = (raw or '').strip()
+    if not raw:
+        return None
+    try:
+        geometry = json.loads(raw)
+    except ValueError:
+        raise ValueError('Ranh giới khu vực không phải JSON hợp lệ')
+    if isinstance(geometry, dict) and geometry.get('type') == 'Feature':
+        geometry = geometry.get('geometry')
+    prepare_geometry(geometry)
+    return geometry
+
+
 @login_required(login_url='/accounts/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_zone_create(request):
@@ -590,7 +567,8 @@ def admin_zone_create(request):
                 area_description=request.POST.get('area_description'),
                 delivery_fee=float(request.POST.get('delivery_fee', 0)),
                 delivery_time=request.POST.get('delivery_time'),
-                is_active=request.POST.get('is_active') == 'on'
+                is_active=request.POST.get('is_active') == 'on',
+                geometry=_parse_zone_geometry(request.POST.get('geometry'))
             )
             messages.success(request, 'Thêm khu vực thành công!')
             return redirect('food_store:admin_delivery_zones')
@@ -608,22 +586,32 @@ def admin_zone_edit(request, pk):
     from django.shortcuts import get_object_or_404
     from food_store.models import DeliveryZone
     
+    import json
+    
     zone = get_object_or_404(DeliveryZone, pk=pk)
+    geometry_json = json.dumps(zone.geometry, ensure_ascii=False) if zone.geometry else ''
     
     if request.method == 'POST':
-        zone.name = request.POST.get('name')
-        zone.area_description = request.POST.get('area_description')
-        zone.delivery_fee = float(request.POST.get('delivery_fee', 0))
-        zone.delivery_time = request.POST.get('delivery_time')
-        zone.is_active = request.POST.get('is_active') == 'on'
-        zone.save()
-        
-        messages.success(request, 'Cập nhật thành công!')
-        return redirect('food_store:admin_delivery_zones')
+        geometry_json = request.POST.get('geometry', '')
+        try:
+            zone.geometry = _parse_zone_geometry(geometry_json)
+        except ValueError as e:
+            messages.error(request, f'Lỗi: {str(e)}')
+        else:
+            zone.name = request.POST.get('name')
+            zone.area_description = request.POST.get('area_description')
+            zone.delivery_fee = float(request.POST.get('delivery_fee', 0))
+            zone.delivery_time = request.POST.get('delivery_time')
+            zone.is_active = request.POST.get('is_active') == 'on'
+            zone.save()
+            
+            messages.success(request, 'Cập nhật thành công!')
+            return redirect('food_store:admin_delivery_zones')
     
     return render(request, 'admin_dashboard/zone_form.html', {
         'action': 'edit',
-        'zone': zone
+        'zone': zone,
+        'geometry_json': geometry_json
     })
 
 
@@ -851,9 +839,8 @@ def admin_stock_import(request):
             
             product = Product.objects.get(id=product_id)
             
-            # Tạo giao dịch nhập kho
-            # Model StockTransaction.save() sẽ TỰ ĐỘNG cập nhật tồn kho
-            transaction = StockTransaction.objects.create(
+            # Tạo giao dịch nhập kho và cập nhật tồn kho qua sổ kho
+            [transaction] = record_stock_movements([StockTransaction(
                 product_id=product_id,
                 farm_id=farm_id,
                 transaction_type='import',  # ✅ SỬA: 'in' → 'import'
@@ -863,10 +850,7 @@ def admin_stock_import(request):
                 reference_number=reference_number,
                 notes=notes,
                 created_by=request.user
-            )
-            
-            # ✅ XÓA: Không cần cập nhật tồn kho thủ công
-            # Model đã tự động cập nhật trong save()
+            )])
             
             messages.success(request, f'Nhập hàng thành công! Đã thêm {quantity} {product.unit} vào kho. Tồn kho mới: {transaction.stock_after}')
             return redirect('food_store:admin_inventory')
@@ -917,9 +901,8 @@ def admin_stock_export(request):
                 messages.error(request, f'Không đủ hàng trong kho! Tồn kho hiện tại: {product.stock_quantity} {product.unit}')
                 return redirect('food_store:admin_stock_export')
             
-            # Tạo giao dịch xuất kho
-            # Model StockTransaction.save() sẽ TỰ ĐỘNG cập nhật tồn kho
-            transaction = StockTransaction.objects.create(
+            # Tạo giao dịch xuất kho và cập nhật tồn kho qua sổ kho
+            [transaction] = record_stock_movements([StockTransaction(
                 product_id=product_id,
                 farm_id=farm_id,
                 transaction_type='export',  # ✅ SỬA: 'out' → 'export'
@@ -928,10 +911,7 @@ def admin_stock_export(request):
                 reference_number=reference_number,
                 notes=notes,
                 created_by=request.user
-            )
-            
-            # ✅ XÓA: Không cần cập nhật tồn kho thủ công
-            # Model đã tự động cập nhật trong save()
+            )])
             
             messages.success(request, f'Xuất hàng thành công! Đã xuất {quantity} {product.unit} ra khỏi kho. Tồn kho còn: {transaction.stock_after}')
             return redirect('food_store:admin_inventory')
@@ -1516,84 +1496,54 @@ def admin_store_admin_detail(request, pk):
 @login_required(login_url='/admin-panel/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_export_transactions_pdf(request):
-    """Xuất danh sách giao dịch kho ra PDF (Admin)"""
-    from food_store.export_utils import export_stock_transactions_pdf
+    """Xuất danh sách giao dịch kho ra PDF (Admin) - chạy nền, chuyển sang trang chờ tải file"""
+    from food_store.export_jobs import start_export_job
     from datetime import datetime
-    from django.http import HttpResponse
     
-    transactions = StockTransaction.objects.select_related(
-        'product', 'farm', 'supplier'
-    ).order_by('-created_at')
-    
-    pdf_data = export_stock_transactions_pdf(transactions, "Tất cả cửa hàng")
-    
-    response = HttpResponse(pdf_data, content_type='application/pdf')
     filename = f"XuatNhapKho_TatCa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    job = start_export_job(request.user, 'transactions', filename, farm_name="Tất cả cửa hàng")
+    return redirect('food_store:export_job_status', job_id=job.pk)
 
 
 @login_required(login_url='/admin-panel/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_export_transactions_excel(request):
     """Xuất danh sách giao dịch kho ra Excel (Admin)"""
-    from food_store.export_utils import export_stock_transactions_excel
+    from food_store.export_utils import excel_response, write_stock_transactions_excel
     from datetime import datetime
-    from django.http import HttpResponse
     
-    transactions = StockTransaction.objects.select_related(
-        'product', 'farm', 'supplier'
-    ).order_by('-created_at')
-    
-    excel_data = export_stock_transactions_excel(transactions, "Tất cả cửa hàng")
+    transactions = StockTransaction.objects.order_by('-created_at')
     
-    response = HttpResponse(
-        excel_data,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
     filename = f"XuatNhapKho_TatCa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return excel_response(
+        lambda output: write_stock_transactions_excel(transactions, output, "Tất cả cửa hàng"),
+        filename
+    )
 
 
 @login_required(login_url='/admin-panel/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_export_inventory_pdf(request):
-    """Xuất báo cáo tồn kho ra PDF (Admin)"""
-    from food_store.export_utils import export_inventory_report_pdf
+    """Xuất báo cáo tồn kho ra PDF (Admin) - chạy nền, chuyển sang trang chờ tải file"""
+    from food_store.export_jobs import start_export_job
     from datetime import datetime
-    from django.http import HttpResponse
     
-    products = Product.objects.select_related('category', 'farm').order_by('farm__name', 'name')
-    
-    pdf_data = export_inventory_report_pdf(products, "Tất cả cửa hàng")
-    
-    response = HttpResponse(pdf_data, content_type='application/pdf')
     filename = f"BaoCaoTonKho_TatCa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    job = start_export_job(request.user, 'inventory', filename, farm_name="Tất cả cửa hàng")
+    return redirect('food_store:export_job_status', job_id=job.pk)
 
 
 @login_required(login_url='/admin-panel/login/')
 @user_passes_test(is_staff_user, login_url='/')
 def admin_export_inventory_excel(request):
     """Xuất báo cáo tồn kho ra Excel (Admin)"""
-    from food_store.export_utils import export_inventory_report_excel
+    from food_store.export_utils import excel_response, write_inventory_report_excel
     from datetime import datetime
-    from django.http import HttpResponse
-    
-    products = Product.objects.select_related('category', 'farm').order_by('farm__name', 'name')
     
-    excel_data = export_inventory_report_excel(products, "Tất cả cửa hàng")
+    products = Product.objects.order_by('farm__name', 'name')
     
-    response = HttpResponse(
-        excel_data,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
     filename = f"BaoCaoTonKho_TatCa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return excel_response(
+        lambda output: write_inventory_report_excel(products, output, "Tất cả cửa hàng"),
+        filename
+    )
@@ -0,0 +1,45 @@
+"""
+Export Job Views - Trạng thái và tải file báo cáo xuất bằng job nền
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+
+from .export_jobs import get_export_job
+
+
+def _get_user_job(request, job_id):
+    """Job của người dùng hiện tại - job của người khác coi như không tồn tại"""
+    job = get_export_job(job_id)
+    if job is None or job.user_id != request.user.pk:
+        raise Http404("Export job not found")
+    return job
+
+
+@login_required(login_url='/accounts/login/')
+def export_job_status(request, job_id):
+    """Trang chờ xuất file; ?format=json trả trạng thái cho JS polling"""
+    job = _get_user_job(request, job_id)
+    download_url = reverse('food_store:export_job_download', args=[job_id]) if job.status == 'done' else None
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'status': job.status, 'download_url': download_url})
+
+    return render(request, 'exports/export_job.html', {
+        'job': job,
+        'download_url': download_url,
+    })
+
+
+@login_required(login_url='/accounts/login/')
+def export_job_download(request, job_id):
+    """Tải file PDF đã xuất xong"""
+    job = _get_user_job(request, job_id)
+    if job.status != 'done':
+        raise Http404("Export is not ready")
+    try:
+        output = open(job.path, 'rb')
+    except FileNotFoundError:
+        raise Http404("Export file expired")
+    return FileResponse(output, as_attachment=True, filename=job.filename, content_type='application/pdf')
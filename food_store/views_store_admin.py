@@ -5,9 +5,8 @@ Dashboard riêng cho quản lý chi nhánh
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Q
 from django.utils import timezone
-from django.http import HttpResponse
 from datetime import timedelta, datetime
 
 from food_store.models import (
@@ -19,6 +18,8 @@ from food_store.permissions import (
     filter_queryset_by_farm, get_managed_farm,
     check_permission, is_super_admin
 )
+from food_store.stock_ledger import record_stock_movements
+from food_store.dashboard_metrics import get_farm_dashboard_metrics
 
 
 @login_required(login_url='/accounts/login/')
@@ -31,35 +32,8 @@ def store_admin_dashboard(request):
         messages.error(request, 'Không tìm thấy chi nhánh bạn quản lý!')
         return redirect('food_store:home')
     
-    # Thống kê tổng quan CHỈ CỦA CHI NHÁNH NÀY
-    total_orders = Order.objects.filter(assigned_farm=managed_farm).count()
-    total_products = Product.objects.filter(farm=managed_farm).count()
-    total_shippers = Shipper.objects.filter(assigned_farm=managed_farm).count()
-    
-    # Doanh thu CHI NHÁNH
-    total_revenue = Order.objects.filter(
-        assigned_farm=managed_farm,
-        status='delivered'
-    ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    
-    # Đơn hàng hôm nay
-    today = timezone.now().date()
-    orders_today = Order.objects.filter(
-        assigned_farm=managed_farm,
-        created_at__date=today
-    ).count()
-    
-    # Đơn hàng chờ xử lý
-    pending_orders = Order.objects.filter(
-        assigned_farm=managed_farm,
-        status='pending'
-    ).count()
-    
-    # Cảnh báo tồn kho
-    stock_alerts = StockAlert.objects.filter(
-        farm=managed_farm,
-        is_resolved=False
-    ).count()
+    # Thống kê tổng quan, doanh thu 7 ngày, top sản phẩm CHỈ CỦA CHI NHÁNH NÀY (có cache)
+    metrics = get_farm_dashboard_metrics(managed_farm.pk)
     
     # Đơn hàng gần nhất
     recent_orders = Order.objects.filter(
@@ -74,51 +48,11 @@ def store_admin_dashboard(request):
         stock_quantity__lt=20
     ).order_by('stock_quantity')[:10]
     
-    # Doanh thu 7 ngày gần nhất
-    last_7_days = []
-    revenue_7_days = []
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        revenue = Order.objects.filter(
-            assigned_farm=managed_farm,
-            created_at__date=date,
-            status='delivered'
-        ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        last_7_days.append(date.strftime('%d/%m'))
-        revenue_7_days.append(float(revenue))
-    
-    # Top sản phẩm bán chạy CỦA CHI NHÁNH
-    from food_store.models import OrderItem
-    top_products = OrderItem.objects.filter(
-        product__farm=managed_farm
-    ).values(
-        'product__name'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum('price')
-    ).order_by('-total_quantity')[:5]
-    
-    # Shipper đang hoạt động
-    active_shippers = Shipper.objects.filter(
-        assigned_farm=managed_farm,
-        status__in=['available', 'busy']
-    ).count()
-    
     context = {
         'managed_farm': managed_farm,
-        'total_orders': total_orders,
-        'total_products': total_products,
-        'total_shippers': total_shippers,
-        'active_shippers': active_shippers,
-        'total_revenue': total_revenue,
-        'orders_today': orders_today,
-        'pending_orders': pending_orders,
-        'stock_alerts': stock_alerts,
+        **metrics,
         'recent_orders': recent_orders,
         'low_stock_products': low_stock_products,
-        'last_7_days': last_7_days,
-        'revenue_7_days': revenue_7_days,
-        'top_products': top_products,
     }
     
     return render(request, 'store_admin_dashboard/dashboard.html', context)
@@ -355,9 +289,8 @@ def store_admin_stock_import(request):
             
             product = Product.objects.get(id=product_id, farm=managed_farm)
             
-            # Tạo giao dịch nhập kho
-            # Model StockTransaction.save() sẽ TỰ ĐỘNG cập nhật tồn kho
-            transaction = StockTransaction.objects.create(
+            # Tạo giao dịch nhập kho và cập nhật tồn kho qua sổ kho
+            [transaction] = record_stock_movements([StockTransaction(
                 product=product,
                 farm=managed_farm,
                 transaction_type='import',
@@ -367,7 +300,7 @@ def store_admin_stock_import(request):
                 reference_number=reference_number,
                 notes=notes,
                 created_by=request.user
-            )
+            )])
             
             messages.success(request, f'Nhập hàng thành công! Đã thêm {quantity} {product.unit} vào kho. Tồn kho mới: {transaction.stock_after}')
             return redirect('food_store:store_admin_inventory')
@@ -424,9 +357,8 @@ def store_admin_stock_export(request):
                 messages.error(request, f'Không đủ hàng trong kho! Tồn kho hiện tại: {product.stock_quantity} {product.unit}')
                 return redirect('food_store:store_admin_stock_export')
             
-            # Tạo giao dịch xuất kho
-            # Model StockTransaction.save() sẽ TỰ ĐỘNG cập nhật tồn kho
-            transaction = StockTransaction.objects.create(
+            # Tạo giao dịch xuất kho và cập nhật tồn kho qua sổ kho
+            [transaction] = record_stock_movements([StockTransaction(
                 product=product,
                 farm=managed_farm,
                 transaction_type='export',
@@ -435,7 +367,7 @@ def store_admin_stock_export(request):
                 reference_number=reference_number,
                 notes=notes,
                 created_by=request.user
-            )
+            )])
             
             messages.success(request, f'Xuất hàng thành công! Đã xuất {quantity} {product.unit} ra khỏi kho. Tồn kho còn: {transaction.stock_after}')
             return redirect('food_store:store_admin_inventory')
@@ -616,39 +548,34 @@ def store_admin_shipper_delete(request, pk):
 @require_store_admin
 @require_permission('can_view_reports')
 def store_admin_reports(request):
-    """Báo cáo thống kê chi nhánh"""
+    """Báo cáo thống kê chi nhánh (đọc từ bảng tổng hợp doanh số theo ngày)"""
     managed_farm = get_managed_farm(request.user)
     
-    from django.db.models.functions import TruncDate
-    from food_store.models import OrderItem, InventoryReport
+    from food_store.models import InventoryReport, DailyFarmSales, DailyProductSales
     
     # Thống kê theo ngày (7 ngày gần nhất)
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    daily_orders = Order.objects.filter(
-        assigned_farm=managed_farm,
-        created_at__gte=seven_days_ago
-    ).annotate(
-        date=TruncDate('created_at')
+    seven_days_ago = timezone.localdate() - timedelta(days=7)
+    farm_sales = DailyFarmSales.objects.filter(farm=managed_farm)
+    daily_orders = farm_sales.filter(
+        date__gte=seven_days_ago
     ).values('date').annotate(
-        count=Count('id'),
-        revenue=Sum('total_amount')
+        count=Sum('order_count'),
+        revenue=Sum('revenue')
     ).order_by('date')
     
     # Thống kê theo trạng thái đơn hàng
-    order_status_stats = Order.objects.filter(
-        assigned_farm=managed_farm
-    ).values('status').annotate(
-        count=Count('id')
+    order_status_stats = farm_sales.values('status').annotate(
+        count=Sum('order_count')
     ).order_by('-count')
     
     # Top sản phẩm bán chạy
-    top_products = OrderItem.objects.filter(
-        product__farm=managed_farm
+    top_products = DailyProductSales.objects.filter(
+        farm=managed_farm
     ).values(
         'product__name'
     ).annotate(
         total_quantity=Sum('quantity'),
-        total_revenue=Sum('price')
+        total_revenue=Sum('revenue')
     ).order_by('-total_quantity')[:10]
     
     # Báo cáo kiểm kê
@@ -758,21 +685,13 @@ def store_admin_order_update_status(request, pk):
 @require_store_admin
 @require_permission('can_manage_inventory')
 def export_transactions_pdf(request):
-    """Xuất danh sách giao dịch kho ra PDF"""
-    from food_store.export_utils import export_stock_transactions_pdf
+    """Xuất danh sách giao dịch kho ra PDF - chạy nền, chuyển sang trang chờ tải file"""
+    from food_store.export_jobs import start_export_job
     
     managed_farm = get_managed_farm(request.user)
-    transactions = StockTransaction.objects.filter(
-        farm=managed_farm
-    ).select_related('product', 'supplier').order_by('-created_at')
-    
-    pdf_data = export_stock_transactions_pdf(transactions, managed_farm.name)
-    
-    response = HttpResponse(pdf_data, content_type='application/pdf')
     filename = f"XuatNhapKho_{managed_farm.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    job = start_export_job(request.user, 'transactions', filename, farm_id=managed_farm.pk, farm_name=managed_farm.name)
+    return redirect('food_store:export_job_status', job_id=job.pk)
 
 
 @login_required(login_url='/accounts/login/')
@@ -780,44 +699,31 @@ def export_transactions_pdf(request):
 @require_permission('can_manage_inventory')
 def export_transactions_excel(request):
     """Xuất danh sách giao dịch kho ra Excel"""
-    from food_store.export_utils import export_stock_transactions_excel
+    from food_store.export_utils import excel_response, write_stock_transactions_excel
     
     managed_farm = get_managed_farm(request.user)
     transactions = StockTransaction.objects.filter(
         farm=managed_farm
-    ).select_related('product', 'supplier').order_by('-created_at')
-    
-    excel_data = export_stock_transactions_excel(transactions, managed_farm.name)
+    ).order_by('-created_at')
     
-    response = HttpResponse(
-        excel_data,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
     filename = f"XuatNhapKho_{managed_farm.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return excel_response(
+        lambda output: write_stock_transactions_excel(transactions, output, managed_farm.name),
+        filename
+    )
 
 
 @login_required(login_url='/accounts/login/')
 @require_store_admin
 @require_permission('can_manage_inventory')
 def export_inventory_pdf(request):
-    """Xuất báo cáo tồn kho ra PDF"""
-    from food_store.export_utils import export_inventory_report_pdf
+    """Xuất báo cáo tồn kho ra PDF - chạy nền, chuyển sang trang chờ tải file"""
+    from food_store.export_jobs import start_export_job
     
     managed_farm = get_managed_farm(request.user)
-    products = Product.objects.filter(
-        farm=managed_farm
-    ).select_related('category').order_by('name')
-    
-    pdf_data = export_inventory_report_pdf(products, managed_farm.name)
-    
-    response = HttpResponse(pdf_data, content_type='application/pdf')
     filename = f"BaoCaoTonKho_{managed_farm.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    job = start_export_job(request.user, 'inventory', filename, farm_id=managed_farm.pk, farm_name=managed_farm.name)
+    return redirect('food_store:export_job_status', job_id=job.pk)
 
 
 @login_required(login_url='/accounts/login/')
@@ -825,20 +731,15 @@ def export_inventory_pdf(request):
 @require_permission('can_manage_inventory')
 def export_inventory_excel(request):
     """Xuất báo cáo tồn kho ra Excel"""
-    from food_store.export_utils import export_inventory_report_excel
+    from food_store.export_utils import excel_response, write_inventory_report_excel
     
     managed_farm = get_managed_farm(request.user)
     products = Product.objects.filter(
         farm=managed_farm
-    ).select_related('category').order_by('name')
+    ).order_by('name')
     
-    excel_data = export_inventory_report_excel(products, managed_farm.name)
-    
-    response = HttpResponse(
-        excel_data,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
     filename = f"BaoCaoTonKho_{managed_farm.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return excel_response(
+        lambda output: write_inventory_report_excel(products, output, managed_farm.name),
+        filename
+    )
@@ -9,7 +9,20 @@ from django.contrib.auth import login as auth_login
 from django.conf import settings
 
 from food_store.models import EmailVerification, PasswordReset, Customer
-from food_store.email_utils import send_verification_email, send_password_reset_email
+from food_store.tasks import send_verification_email_task, send_password_reset_email_task
+
+SEND_FAILED_MESSAGE = 'Không thể gửi email. Vui lòng thử lại!'
+RESEND_FAILED_MESSAGE = 'Không thể gửi email mã OTP. Vui lòng bấm "Gửi lại OTP"!'
+
+
+def _email_failed(otp):
+    """
+    Job gửi email đã chạy và báo lỗi (EmailVerification/PasswordReset)
+    Với TASK_QUEUE 'immediate' job chạy xong ngay trong request; với backend
+    khác trang nhập mã sẽ báo lỗi khi người dùng tải lại.
+    """
+    otp.refresh_from_db(fields=['email_status'])
+    return otp.email_status == 'failed'
 
 
 def register_step1(request):
@@ -58,13 +71,14 @@ def register_step1(request):
             phone=phone
         )
         
-        # Gửi email
-        if send_verification_email(email, verification.otp_code, username):
-            messages.success(request, f'Mã OTP đã được gửi đến {email}. Vui lòng kiểm tra email!')
-            return redirect('food_store:register_step2', verification_id=verification.id)
-        else:
-            messages.error(request, 'Không thể gửi email. Vui lòng thử lại!')
+        # Gửi email (job nền - chỉ truyền id, mã OTP không đi qua hàng đợi)
+        send_verification_email_task.delay(verification.id)
+        if _email_failed(verification):
+            messages.error(request, SEND_FAILED_MESSAGE)
             verification.delete()
+            return render(request, 'auth/register_step1.html')
+        messages.success(request, f'Mã OTP đang được gửi đến {email}. Vui lòng kiểm tra email!')
+        return redirect('food_store:register_step2', verification_id=verification.id)
     
     return render(request, 'auth/register_step1.html')
 
@@ -85,6 +99,9 @@ def register_step2(request, verification_id):
         verification.delete()
         return redirect('food_store:register_step1')
     
+    if request.method != 'POST' and verification.email_status == 'failed':
+        messages.error(request, RESEND_FAILED_MESSAGE)
+    
     if request.method == 'POST':
         otp_code = request.POST.get('otp_code')
         
@@ -159,13 +176,11 @@ def resend_otp(request, verification_id):
         phone=verification.phone
     )
     
-    # Gửi email
-    if send_verification_email(new_verification.email, new_verification.otp_code, new_verification.username):
-        messages.success(request, 'Mã OTP mới đã được gửi đến email của bạn!')
-        return redirect('food_store:register_step2', verification_id=new_verification.id)
-    else:
-        messages.error(request, 'Không thể gửi email. Vui lòng thử lại!')
-        return redirect('food_store:register_step2', verification_id=verification_id)
+    # Gửi email (job nền) - gửi lỗi thì trang nhập mã báo lỗi
+    send_verification_email_task.delay(new_verification.id)
+    if not _email_failed(new_verification):
+        messages.success(request, 'Mã OTP mới đang được gửi đến email của bạn!')
+    return redirect('food_store:register_step2', verification_id=new_verification.id)
 
 
 def forgot_password_step1(request):
@@ -189,13 +204,14 @@ def forgot_password_step1(request):
         # Tạo mã reset
         reset = PasswordReset.create_reset(user)
         
-        # Gửi email
-        if send_password_reset_email(email, reset.otp_code, user.username):
-            messages.success(request, f'Mã OTP đã được gửi đến {email}. Vui lòng kiểm tra email!')
-            return redirect('food_store:forgot_password_step2', reset_id=reset.id)
-        else:
-            messages.error(request, 'Không thể gửi email. Vui lòng thử lại!')
+        # Gửi email (job nền - chỉ truyền id, mã OTP không đi qua hàng đợi)
+        send_password_reset_email_task.delay(reset.id)
+        if _email_failed(reset):
+            messages.error(request, SEND_FAILED_MESSAGE)
             reset.delete()
+            return render(request, 'auth/forgot_password_step1.html')
+        messages.success(request, f'Mã OTP đang được gửi đến {email}. Vui lòng kiểm tra email!')
+        return redirect('food_store:forgot_password_step2', reset_id=reset.id)
     
     return render(request, 'auth/forgot_password_step1.html')
 
@@ -216,6 +232,9 @@ def forgot_password_step2(request, reset_id):
         reset.delete()
         return redirect('food_store:forgot_password_step1')
     
+    if request.method != 'POST' and reset.email_status == 'failed':
+        messages.error(request, RESEND_FAILED_MESSAGE)
+    
     if request.method == 'POST':
         otp_code = request.POST.get('otp_code')
         new_password = request.POST.get('new_password')
@@ -280,10 +299,8 @@ def resend_reset_otp(request, reset_id):
     # Tạo mã mới
     new_reset = PasswordReset.create_reset(reset.user)
     
-    # Gửi email
-    if send_password_reset_email(new_reset.email, new_reset.otp_code, new_reset.user.username):
-        messages.success(request, 'Mã OTP mới đã được gửi đến email của bạn!')
-        return redirect('food_store:forgot_password_step2', reset_id=new_reset.id)
-    else:
-        messages.error(request, 'Không thể gửi email. Vui lòng thử lại!')
-        return redirect('food_store:forgot_password_step2', reset_id=reset_id)
+    # Gửi email (job nền) - gửi lỗi thì trang nhập mã báo lỗi
+    send_password_reset_email_task.delay(new_reset.id)
+    if not _email_failed(new_reset):
+        messages.success(request, 'Mã OTP mới đang được gửi đến email của bạn!')
+    return redirect('food_store:forgot_password_step2', reset_id=new_reset.id)
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class GisToolsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gis_tools'
-    verbose_name = 'Công cụ GIS'
\ No newline at end of file
+    verbose_name = 'Công cụ GIS'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,84 @@
+"""
+Tính khoảng cách Haversine theo lô bằng NumPy
+Một phép toán mảng cho cả một-nhiều (1 điểm → N điểm) và nhiều-nhiều (ma trận M x N)
+thay vì gọi calculate_distance N lần trong vòng lặp Python.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Khoảng cách Haversine (km) giữa các mảng tọa độ, theo quy tắc broadcasting của NumPy
+
+    Args:
+        lat1, lng1, lat2, lng2: Số hoặc mảng (độ)
+
+    Returns:
+        ndarray khoảng cách (km)
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lng1 = np.radians(np.asarray(lng1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lng2 = np.radians(np.asarray(lng2, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def split_points(points):
+    """
+    Tách list (lat, lng) thành 2 mảng lats, lngs
+
+    Returns:
+        (lats, lngs): ndarray float64
+    """
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+def distances_from(latitude, longitude, points):
+    """
+    Khoảng cách từ một điểm tới nhiều điểm (một-nhiều)
+
+    Args:
+        latitude, longitude: Điểm gốc
+        points: List (lat, lng)
+
+    Returns:
+        ndarray shape (N,) khoảng cách (km), cùng thứ tự với points
+    """
+    lats, lngs = split_points(points)
+    return haversine_km(latitude, longitude, lats, lngs)
+
+
+def distance_matrix(sources, destinations):
+    """
+    Ma trận khoảng cách giữa hai tập điểm (nhiều-nhiều)
+
+    Args:
+        sources: List (lat, lng), M điểm
+        destinations: List (lat, lng), N điểm
+
+    Returns:
+        ndarray shape (M, N), phần tử [i][j] là khoảng cách sources[i] → destinations[j] (km)
+    """
+    src_lats, src_lngs = split_points(sources)
+    dst_lats, dst_lngs = split_points(destinations)
+    return haversine_km(src_lats[:, None], src_lngs[:, None], dst_lats[None, :], dst_lngs[None, :])
+
+
+def nearest_point(latitude, longitude, points):
+    """
+    Tìm điểm gần nhất trong points
+
+    Returns:
+        (index, distance_km) hoặc (None, None) nếu points rỗng
+    """
+    if not len(points):
+        return None, None
+    distances = distances_from(latitude, longitude, points)
+    index = int(np.argmin(distances))
+    return index, float(distances[index])
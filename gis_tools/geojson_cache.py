@@ -0,0 +1,107 @@
+"""
+GeoJSON đã serialize sẵn cho các endpoint bản đồ
+Mỗi payload được serialize và nén (gzip, brotli nếu có cài) một lần, lưu
+trong Django cache cho tới khi dữ liệu thay đổi (xóa qua signal), và được
+trả về kèm ETag mạnh + Last-Modified để trình duyệt xác thực lại bằng 304.
+"""
+import gzip
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn, chỉ dùng gzip
+    brotli = None
+
+DELIVERY_ZONES_CACHE_KEY = 'gis:geojson:delivery_zones'
+
+# Luôn xác thực lại với server - dữ liệu đổi là client thấy ngay, không đổi thì nhận 304
+CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+def build_payload(data):
+    """
+    Serialize data thành JSON bytes kèm các bản nén và ETag
+
+    Returns:
+        dict {'etag', 'last_modified', 'bodies': {encoding: bytes}}
+        với encoding '' là bản không nén
+    """
+    return build_body_payload(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def build_body_payload(body):
+    """Payload cho body (bytes) đã serialize sẵn, vd: vector tile"""
+    bodies = {'': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body)
+    return {
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'last_modified': int(time.time()),
+        'bodies': bodies,
+    }
+
+
+def get_cached_payload(key, build_data, timeout=None):
+    """
+    Lấy payload từ cache, build lại bằng build_data() nếu chưa có
+
+    Args:
+        timeout: Thời gian giữ trong cache (giây), None = tới khi bị xóa
+    """
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_payload(build_data())
+        cache.set(key, payload, timeout)
+    return payload
+
+
+def choose_encoding(request, bodies):
+    """Chọn bản nén tốt nhất mà client chấp nhận (br > gzip > không nén)"""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in bodies and encoding in accepted:
+            return encoding
+    return ''
+
+
+def payload_response(request, payload, content_type='application/json'):
+    """
+    HttpResponse cho payload, 304 nếu If-None-Match/If-Modified-Since còn khớp
+    """
+    encoding = choose_encoding(request, payload['bodies'])
+    # Mỗi bản nén là một representation khác nhau nên có ETag riêng
+    etag = f'"{payload["etag"]}-{encoding}"' if encoding else f'"{payload["etag"]}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=payload['last_modified'])
+    if response is None:
+        response = HttpResponse(payload['bodies'][encoding], content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(payload['last_modified'])
+    response['Cache-Control'] = CACHE_CONTROL
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def get_delivery_zones_payload():
+    """Payload GeoJSON của các khu vực giao hàng đang hoạt động"""
+    from .gis_functions import DeliveryZoneManager
+
+    return get_cached_payload(DELIVERY_ZONES_CACHE_KEY, DeliveryZoneManager.get_all_delivery_zones_geojson)
+
+
+def invalidate_delivery_zones_geojson():
+    """Xóa GeoJSON khu vực giao hàng đã cache (gọi khi DeliveryZone thay đổi)"""
+    cache.delete(DELIVERY_ZONES_CACHE_KEY)
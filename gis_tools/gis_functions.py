@@ -10,6 +10,15 @@ import folium
 from folium import plugins
 import json
 
+# Sai số cho phép khi so khoảng cách đường chim bay với đường bộ (km):
+# OSRM snap điểm vào đường gần nhất nên đường bộ có thể ngắn hơn một chút
+PREFILTER_SLACK_KM = 0.5
+
+# Số cửa hàng tối thiểu cho mỗi lần gọi Table API khi tìm theo đường bộ.
+# Mỗi batch chỉ khoảng 2 * limit ứng viên gần nhất để sau batch đầu tiên
+# khoảng cách thứ k đã loại được các cửa hàng xa còn lại
+ROAD_MATRIX_MIN_BATCH = 8
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate distance between two points using Haversine formula
@@ -46,72 +55,204 @@ class FarmLocationAnalyzer:
             max_distance_km: Khoảng cách tối đa (km) - mặc định không giới hạn
             limit: Số lượng cửa hàng tối đa trả về
         """
-        all_farms = Farm.objects.all()
+        from .spatial_index import farm_index
+        from .distance import distances_from
+        
+        # Nếu max_distance_km >= 99999, coi như không giới hạn
+        radius = None if max_distance_km >= 99999 else max_distance_km
+        
+        # Tra cứu k cửa hàng gần nhất qua KD-tree thay vì quét toàn bộ bảng
+        candidates = farm_index.nearest(latitude, longitude, k=limit, max_distance_km=radius)
+        farms_by_id = Farm.objects.in_bulk([farm_id for farm_id, _ in candidates])
+        
         nearest_farms = []
+        for farm_id, _ in candidates:
+            farm = farms_by_id.get(farm_id)
+            if farm is None or farm.latitude is None or farm.longitude is None:
+                continue
+            nearest_farms.append(farm)
+        
+        # Tính khoảng cách cho tất cả cửa hàng trong một phép toán mảng
+        distances = distances_from(
+            latitude, longitude, [(farm.latitude, farm.longitude) for farm in nearest_farms]
+        )
+        for farm, distance in zip(nearest_farms, distances.round(2).tolist()):
+            # Attach distance to farm object temporarily
+            farm.distance_km = distance
         
-        for farm in all_farms:
-            if farm.latitude is not None and farm.longitude is not None:
-                dist = calculate_distance(latitude, longitude, farm.latitude, farm.longitude)
-                
-                # Nếu max_distance_km >= 99999, coi như không giới hạn
-                if max_distance_km >= 99999 or dist <= max_distance_km:
-                    # Attach distance to farm object temporarily
-                    farm.distance_km = dist 
-                    nearest_farms.append(farm)
+        return nearest_farms
+    
+    @staticmethod
+    def prefilter_farms(latitude, longitude, max_distance_km=99999):
+        """
+        Lọc ứng viên bằng khoảng cách đường chim bay trước khi gọi routing
+        
+        Khoảng cách đường chim bay luôn <= khoảng cách đường bộ nên cửa hàng
+        nào có đường chim bay > max_distance_km chắc chắn không thỏa bán kính.
+        
+        Returns:
+            (candidates, total): candidates là list (farm, straight_km) sắp xếp
+            theo straight_km tăng dần, total là tổng số cửa hàng có tọa độ
+        """
+        from .spatial_index import farm_index, EARTH_RADIUS_KM
+        
+        # Nếu max_distance_km >= 99999, coi như không giới hạn
+        if max_distance_km >= 99999:
+            search_radius = math.pi * EARTH_RADIUS_KM
+        else:
+            search_radius = max_distance_km + PREFILTER_SLACK_KM
         
-        # Sort by distance
-        nearest_farms.sort(key=lambda x: x.distance_km)
+        nearby = farm_index.within_radius(latitude, longitude, search_radius)
+        farms_by_id = Farm.objects.in_bulk([farm_id for farm_id, _ in nearby])
         
-        return nearest_farms[:limit]
+        candidates = []
+        for farm_id, straight_km in nearby:
+            farm = farms_by_id.get(farm_id)
+            if farm is not None and farm.latitude is not None and farm.longitude is not None:
+                candidates.append((farm, straight_km))
+        
+        return candidates, len(farm_index)
     
     @staticmethod
-    def find_nearest_farms_by_road(latitude, longitude, max_distance_km=99999, limit=50, vehicle_type='driving'):
+    def find_nearest_farms_by_road(latitude, longitude, max_distance_km=99999, limit=50, vehicle_type='driving',
+                                   use_matrix=True, geometry_limit=None, stats=None):
         """
         Tìm cửa hàng gần nhất theo ĐƯỜNG ĐI THỰC TẾ (road routing)
         
+        Chỉ những cửa hàng qua được bước lọc đường chim bay mới được gọi routing:
+            1. Bỏ cửa hàng có đường chim bay > max_distance_km
+            2. Route theo thứ tự đường chim bay tăng dần, mỗi batch khoảng
+               2 * limit cửa hàng; khi đã có đủ `limit` kết quả thì bỏ các cửa
+               hàng có đường chim bay > kết quả thứ k
+        
         Args:
             latitude: Vĩ độ khách hàng
             longitude: Kinh độ khách hàng
             max_distance_km: Khoảng cách tối đa (km) - mặc định không giới hạn
             limit: Số lượng cửa hàng tối đa trả về
             vehicle_type: Loại phương tiện ('driving', 'motorcycle', 'bicycle', 'foot')
+            use_matrix: Dùng OSRM Table API (1 request cho tất cả cửa hàng).
+                Nếu Table API lỗi sẽ tự chuyển về gọi /route song song
+                (ROUTING['MAX_WORKERS'] route mỗi lô, route quá hạn bị bỏ qua)
+            geometry_limit: Số cửa hàng đứng đầu được lấy route geometry
+                (None = tất cả cửa hàng trả về, 0 = không lấy)
+            stats: dict (tùy chọn) để nhận thống kê lọc ứng viên:
+                total_farms, pruned_by_radius, pruned_by_kth, routed
         
         Returns:
             List of Store objects với attributes:
                 - distance_km: Khoảng cách đường bộ (km)
                 - duration_min: Thời gian di chuyển (phút)
-                - route_geometry: GeoJSON LineString
+                - route_geometry: GeoJSON LineString (None nếu không lấy)
                 - vehicle_type: Loại phương tiện
+                - is_estimate: True nếu OSRM bị ngắt mạch và dùng đường chim bay
         """
-        from .routing import get_road_route
+        from .routing import get_road_routes, get_distance_matrix, get_routing_settings
+        from .routing_backends import get_routing_backend
+        
+        candidates, total_farms = FarmLocationAnalyzer.prefilter_farms(latitude, longitude, max_distance_km)
+        if stats is not None:
+            stats.update({
+                'total_farms': total_farms,
+                'pruned_by_radius': max(total_farms - len(candidates), 0),
+                'pruned_by_kth': 0,
+                'routed': 0,
+            })
         
-        all_farms = Farm.objects.all()
-        farms_with_route = []
+        # Nếu max_distance_km >= 99999, coi như không giới hạn
+        def within_radius(distance_km):
+            return max_distance_km >= 99999 or distance_km <= max_distance_km
         
-        for farm in all_farms:
-            if farm.latitude and farm.longitude:
-                # Call routing API để lấy route thực tế với vehicle type
-                route_info = get_road_route(
-                    farm.latitude, farm.longitude,  # FROM farm
-                    latitude, longitude,             # TO customer
-                    vehicle_type=vehicle_type
-                )
-                
-                # Nếu max_distance_km >= 99999, coi như không giới hạn
-                distance_check = max_distance_km >= 99999 or (route_info and route_info['distance_km'] <= max_distance_km)
-                
-                if route_info and distance_check:
+        def route_parallel(farms):
+            # Gọi /route song song cho cả batch, route quá hạn bị bỏ qua
+            routes = get_road_routes(
+                [((farm.latitude, farm.longitude), (latitude, longitude)) for farm in farms],  # FROM farm TO customer
+                vehicle_type=vehicle_type
+            )
+            routed = []
+            for farm, route_info in zip(farms, routes):
+                if route_info and within_radius(route_info['distance_km']):
                     # Attach route info to farm object (không tính phí ship)
                     farm.distance_km = route_info['distance_km']
                     farm.duration_min = route_info['duration_min']
                     farm.route_geometry = route_info['geometry']
                     farm.vehicle_type = route_info['vehicle_type']
-                    farms_with_route.append(farm)
+                    farm.is_estimate = route_info['is_estimate']
+                    routed.append(farm)
+            return routed
+        
+        def route_matrix(farms):
+            # FROM farms TO customer trong một lần gọi Table API
+            matrix = get_distance_matrix(
+                [(farm.latitude, farm.longitude) for farm in farms],
+                [(latitude, longitude)],
+                vehicle_type=vehicle_type
+            )
+            if matrix is None:
+                return None
+            routed = []
+            for farm, distances, durations in zip(farms, matrix['distances_km'], matrix['durations_min']):
+                distance_km, duration_min = distances[0], durations[0]
+                if distance_km is None or duration_min is None or not within_radius(distance_km):
+                    continue
+                farm.distance_km = distance_km
+                farm.duration_min = duration_min
+                farm.route_geometry = None
+                farm.vehicle_type = vehicle_type
+                farm.is_estimate = matrix['is_estimate']
+                routed.append(farm)
+            return routed
+        
+        farms_with_route = []
+        parallel_batch_size = get_routing_settings()['MAX_WORKERS']
+        matrix_batch_size = min(
+            get_routing_backend().table_max_coordinates - 1, max(2 * limit, ROAD_MATRIX_MIN_BATCH)
+        )
+        batch_size = matrix_batch_size if use_matrix else parallel_batch_size
+        position = 0
+        
+        while position < len(candidates):
+            if len(farms_with_route) >= limit:
+                # Cửa hàng có đường chim bay > kết quả thứ k không thể lọt vào top k
+                kth_distance = sorted(f.distance_km for f in farms_with_route)[limit - 1]
+                cutoff = position
+                while cutoff < len(candidates) and candidates[cutoff][1] <= kth_distance + PREFILTER_SLACK_KM:
+                    cutoff += 1
+                if stats is not None:
+                    stats['pruned_by_kth'] += len(candidates) - cutoff
+                candidates = candidates[:cutoff]
+                if position >= len(candidates):
+                    break
+            
+            batch = [farm for farm, _ in candidates[position:position + batch_size]]
+            position += len(batch)
+            if stats is not None:
+                stats['routed'] += len(batch)
+            
+            routed = route_matrix(batch) if use_matrix else None
+            if routed is None:
+                # Fallback: gọi /route cho từng cửa hàng (song song theo batch)
+                use_matrix = False
+                batch_size = parallel_batch_size
+                routed = route_parallel(batch)
+            farms_with_route.extend(routed)
         
         # Sort by road distance
         farms_with_route.sort(key=lambda x: x.distance_km)
+        winners = farms_with_route[:limit]
+        
+        # Chỉ lấy route geometry đầy đủ cho các cửa hàng đứng đầu (song song)
+        top = winners if geometry_limit is None else winners[:geometry_limit]
+        missing = [farm for farm in top if farm.route_geometry is None]
+        routes = get_road_routes(
+            [((farm.latitude, farm.longitude), (latitude, longitude)) for farm in missing],
+            vehicle_type=vehicle_type
+        )
+        for farm, route_info in zip(missing, routes):
+            if route_info:
+                farm.route_geometry = route_info['geometry']
         
-        return farms_with_route[:limit]
+        return winners
     
     @staticmethod
     def calculate_farm_distance(farm_location, customer_location):
@@ -133,25 +274,53 @@ class DeliveryZoneManager:
     Quản lý khu vực giao hàng
     """
     
+    @staticmethod
+    def find_zone(latitude, longitude):
+        """
+        Tìm khu vực giao hàng chứa điểm (point-in-polygon)
+        
+        Returns:
+            dict {'id', 'name', 'delivery_fee', 'delivery_time'} của khu vực
+            nhỏ nhất chứa điểm, None nếu điểm nằm ngoài mọi khu vực
+        """
+        from .zone_index import delivery_zone_index
+        
+        return delivery_zone_index.locate(latitude, longitude)
+    
     @staticmethod
     def check_delivery_availability(latitude, longitude):
         """
-        Kiểm tra khả năng giao hàng (Simple approximation)
+        Kiểm tra khả năng giao hàng theo polygon của các khu vực đang hoạt động
         """
-        # Giả lập: TP.HCM center
-        hcm_lat, hcm_lng = 10.762622, 106.660172
-        dist = calculate_distance(latitude, longitude, hcm_lat, hcm_lng)
+        from .zone_index import delivery_zone_index
         
-        if dist < 20:  # 20km radius from HCM center
+        zone = delivery_zone_index.locate(latitude, longitude)
+        if zone:
             return {
                 'can_deliver': True,
-                'zone_name': 'TP. Hồ Chí Minh',
-                'delivery_fee': 30000,
-                'delivery_time': '1-2 ngày'
+                'zone_id': zone['id'],
+                'zone_name': zone['name'],
+                'delivery_fee': float(zone['delivery_fee']),
+                'delivery_time': zone['delivery_time']
             }
         
+        if not len(delivery_zone_index):
+            # Chưa khu vực nào có polygon: ước lượng 20km quanh trung tâm TP.HCM
+            hcm_lat, hcm_lng = 10.762622, 106.660172
+            dist = calculate_distance(latitude, longitude, hcm_lat, hcm_lng)
+            
+            if dist < 20:
+                return {
+                    'can_deliver': True,
+                    'zone_id': None,
+                    'zone_name': 'TP. Hồ Chí Minh',
+                    'delivery_fee': 30000,
+                    'delivery_time': '1-2 ngày'
+                }
+        
         return {
             'can_deliver': False,
+            'zone_id': None,
             'zone_name': None,
             'delivery_fee': 0,
             'delivery_time': 'Không giao hàng đến khu vực này'
@@ -160,90 +329,12 @@ class DeliveryZoneManager:
     @staticmethod
     def get_all_delivery_zones_geojson():
         """
-        Tạo GeoJSON cho delivery zones miền Nam Việt Nam
+        Tạo GeoJSON cho các khu vực giao hàng đang hoạt động có polygon
         """
-        zones = DeliveryZone.objects.filter(is_active=True)
+        zones = DeliveryZone.objects.filter(is_active=True, geometry__isnull=False)
         features = []
         
-        # Định nghĩa polygon cho các tỉnh/thành miền Nam (tọa độ thực tế)
-        south_vietnam_polygons = {
-            'TP. Hồ Chí Minh': [[
-                [106.4, 10.5], [106.9, 10.5], [106.9, 11.0], [106.4, 11.0], [106.4, 10.5]
-            ]],
-            'Bình Dương': [[
-                [106.5, 11.0], [107.0, 11.0], [107.0, 11.4], [106.5, 11.4], [106.5, 11.0]
-            ]],
-            'Đồng Nai': [[
-                [106.8, 10.8], [107.6, 10.8], [107.6, 11.5], [106.8, 11.5], [106.8, 10.8]
-            ]],
-            'Bà Rịa - Vũng Tàu': [[
-                [106.8, 10.1], [107.4, 10.1], [107.4, 10.7], [106.8, 10.7], [106.8, 10.1]
-            ]],
-            'Long An': [[
-                [105.9, 10.4], [106.6, 10.4], [106.6, 11.0], [105.9, 11.0], [105.9, 10.4]
-            ]],
-            'Tây Ninh': [[
-                [105.8, 11.0], [106.5, 11.0], [106.5, 11.7], [105.8, 11.7], [105.8, 11.0]
-            ]],
-            'Tiền Giang': [[
-                [105.9, 10.1], [106.6, 10.1], [106.6, 10.6], [105.9, 10.6], [105.9, 10.1]
-            ]],
-            'Bến Tre': [[
-                [106.0, 9.9], [106.7, 9.9], [106.7, 10.4], [106.0, 10.4], [106.0, 9.9]
-            ]],
-            'Vĩnh Long': [[
-                [105.6, 9.9], [106.2, 9.9], [106.2, 10.4], [105.6, 10.4], [105.6, 9.9]
-            ]],
-            'Trà Vinh': [[
-                [106.0, 9.6], [106.6, 9.6], [106.6, 10.2], [106.0, 10.2], [106.0, 9.6]
-            ]],
-            'Đồng Tháp': [[
-                [105.3, 10.2], [105.9, 10.2], [105.9, 10.8], [105.3, 10.8], [105.3, 10.2]
-            ]],
-            'An Giang': [[
-                [104.9, 10.1], [105.7, 10.1], [105.7, 10.8], [104.9, 10.8], [104.9, 10.1]
-            ]],
-            'Kiên Giang': [[
-                [104.5, 9.5], [105.4, 9.5], [105.4, 10.5], [104.5, 10.5], [104.5, 9.5]
-            ]],
-            'Cần Thơ': [[
-                [105.5, 9.8], [106.0, 9.8], [106.0, 10.3], [105.5, 10.3], [105.5, 9.8]
-            ]],
-            'Hậu Giang': [[
-                [105.4, 9.5], [105.9, 9.5], [105.9, 10.0], [105.4, 10.0], [105.4, 9.5]
-            ]],
-            'Sóc Trăng': [[
-                [105.7, 9.3], [106.3, 9.3], [106.3, 9.9], [105.7, 9.9], [105.7, 9.3]
-            ]],
-            'Bạc Liêu': [[
-                [105.4, 9.0], [105.9, 9.0], [105.9, 9.5], [105.4, 9.5], [105.4, 9.0]
-            ]],
-            'Cà Mau': [[
-                [104.8, 8.6], [105.5, 8.6], [105.5, 9.4], [104.8, 9.4], [104.8, 8.6]
-            ]],
-            'Bình Phước': [[
-                [106.4, 11.4], [107.2, 11.4], [107.2, 12.2], [106.4, 12.2], [106.4, 11.4]
-            ]],
-            'Bình Thuận': [[
-                [107.4, 10.5], [108.5, 10.5], [108.5, 11.6], [107.4, 11.6], [107.4, 10.5]
-            ]],
-            'Ninh Thuận': [[
-                [108.2, 11.2], [109.2, 11.2], [109.2, 12.0], [108.2, 12.0], [108.2, 11.2]
-            ]],
-            'Lâm Đồng': [[
-                [107.2, 11.0], [108.8, 11.0], [108.8, 12.3], [107.2, 12.3], [107.2, 11.0]
-            ]]
-        }
-        
         for zone in zones:
-            coordinates = south_vietnam_polygons.get(zone.name, [])
-            if not coordinates:
-                # Default fallback polygon
-                coordinates = [[
-                    [106.0, 10.0], [107.0, 10.0], 
-                    [107.0, 11.0], [106.0, 11.0], [106.0, 10.0]
-                ]]
-                
             feature = {
                 'type': 'Feature',
                 'properties': {
@@ -252,10 +343,7 @@ class DeliveryZoneManager:
                     'delivery_time': zone.delivery_time,
                     'area_description': zone.area_description
                 },
-                'geometry': {
-                    'type': 'Polygon',
-                    'coordinates': coordinates
-                }
+                'geometry': zone.geometry
             }
             features.append(feature)
         
@@ -284,33 +372,40 @@ class RouteOptimizer:
         if not delivery_points:
             return {'route': [], 'total_distance': 0}
         
+        import numpy as np
+        from .distance import distance_matrix
+        
+        # Ma trận khoảng cách tính một lần: hàng 0 là điểm bắt đầu,
+        # hàng i + 1 là delivery_points[i]
+        points = [(p['lat'], p['lng']) for p in delivery_points]
+        distances = distance_matrix([(user_lat, user_lng)] + points, points).round(2)
+        
         # Khởi tạo
-        current_lat, current_lng = user_lat, user_lng
-        unvisited = delivery_points.copy()
+        current = 0
+        visited = np.zeros(len(points), dtype=bool)
         route = []
         total_distance = 0
         
         # Nearest Neighbor algorithm
-        while unvisited:
-            # Tìm điểm gần nhất
-            nearest = min(unvisited, key=lambda p: calculate_distance(
-                current_lat, current_lng, p['lat'], p['lng']
-            ))
+        for _ in range(len(points)):
+            # Tìm điểm gần nhất trong các điểm chưa đi qua
+            row = np.where(visited, np.inf, distances[current])
+            nearest = int(np.argmin(row))
             
             # Tính khoảng cách
-            distance = calculate_distance(current_lat, current_lng, nearest['lat'], nearest['lng'])
+            distance = float(row[nearest])
             total_distance += distance
             
             # Cập nhật
             route.append({
-                **nearest,
+                **delivery_points[nearest],
                 'distance_from_previous': distance,
                 'cumulative_distance': total_distance
             })
             
             # Di chuyển đến điểm tiếp theo
-            current_lat, current_lng = nearest['lat'], nearest['lng']
-            unvisited.remove(nearest)
+            visited[nearest] = True
+            current = nearest + 1
         
         return {
             'route': route,
@@ -417,9 +512,11 @@ class MapGenerator:
         ]
         
         for i, feature in enumerate(zones_data['features']):
-            coords = feature['geometry']['coordinates'][0]
+            geometry = feature['geometry']
+            polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
             # Folium cần Lat, Lng - GeoJSON là Lng, Lat
-            folium_coords = [[c[1], c[0]] for c in coords]
+            folium_polygons = [[[[c[1], c[0]] for c in ring] for ring in rings] for rings in polygons]
+            folium_coords = folium_polygons[0][0]
             props = feature['properties']
             
             color = colors[i % len(colors)]
@@ -466,18 +563,19 @@ class MapGenerator:
             </div>
             """
             
-            # Vẽ polygon cho khu vực
-            folium.Polygon(
-                locations=folium_coords,
-                popup=folium.Popup(popup_html, max_width=320),
-                tooltip=f"{props['name']} - {props['delivery_time']} - {props['delivery_fee']:,.0f} VNĐ",
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.3,
-                weight=2,
-                opacity=0.8
-            ).add_to(m)
+            # Vẽ polygon cho khu vực (mỗi phần của MultiPolygon, kể cả lỗ)
+            for rings in folium_polygons:
+                folium.Polygon(
+                    locations=rings,
+                    popup=folium.Popup(popup_html, max_width=320),
+                    tooltip=f"{props['name']} - {props['delivery_time']} - {props['delivery_fee']:,.0f} VNĐ",
+                    color=color,
+                    fill=True,
+                    fillColor=color,
+                    fillOpacity=0.3,
+                    weight=2,
+                    opacity=0.8
+                ).add_to(m)
             
             # Tính center của polygon để đặt marker
             center_lat = sum([c[0] for c in folium_coords]) / len(folium_coords)
@@ -526,29 +624,34 @@ class MapGenerator:
 
     
     @staticmethod
-    def create_heatmap_map():
-        """Tạo bản đồ nhiệt mật độ đơn hàng"""
-        farms = Farm.objects.all()
-        center_lat = 10.8231
-        center_lng = 106.6297
+    def create_heatmap_map(zoom=11, date_from=None, date_to=None, farm_id=None):
+        """
+        Tạo bản đồ nhiệt mật độ đơn hàng
         
-        if farms.exists():
-            center_lat = sum(f.latitude for f in farms) / farms.count()
-            center_lng = sum(f.longitude for f in farms) / farms.count()
+        Đơn hàng được gom thành ô lưới theo mức zoom (xem gis_tools.map_data.heat_points)
+        nên số điểm không phụ thuộc số đơn hàng.
+        """
+        from django.db.models import Avg
+        from .map_data import heat_points
+        
+        center = Farm.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).aggregate(lat=Avg('latitude'), lng=Avg('longitude'))
+        center_lat = center['lat'] or 10.8231
+        center_lng = center['lng'] or 106.6297
             
         m = folium.Map(
             location=[center_lat, center_lng],
-            zoom_start=11,
+            zoom_start=zoom,
             tiles='CartoDB positron',
             attr='© OpenStreetMap contributors, © CartoDB'
         )
         
-        # Lấy dữ liệu đơn hàng
-        orders = Order.objects.filter(delivery_latitude__isnull=False, delivery_longitude__isnull=False)
-        heat_data = [[o.delivery_latitude, o.delivery_longitude, 1] for o in orders]
+        # Lấy dữ liệu đơn hàng đã gom theo ô lưới
+        heat = heat_points(zoom=zoom, date_from=date_from, date_to=date_to, farm_id=farm_id)
         
-        if heat_data:
-            plugins.HeatMap(heat_data).add_to(m)
+        if heat['points']:
+            plugins.HeatMap(heat['points']).add_to(m)
             
         return m
     
@@ -596,6 +699,10 @@ class MapGenerator:
                 order.delivery_latitude, order.delivery_longitude
             )
             
+            # Đường chim bay (routing lỗi/bị ngắt mạch) không được cache,
+            # xem gis_tools.map_cache.render_map
+            m.is_estimate = not route_info or route_info['is_estimate']
+            
             if route_info:
                 # Tính phí ship để hiển thị
                 shipping_fee = order.delivery_fee if order.delivery_fee else 0
@@ -669,18 +776,27 @@ class OrderAnalytics:
     @staticmethod
     def get_orders_by_zone():
         """
-        Thống kê đơn hàng theo khu vực giao hàng
+        Thống kê đơn hàng theo khu vực giao hàng (từ bảng tổng hợp DailyZoneSales)
         Returns: Dict với thống kê theo zone
         """
-        zones_stats = {}
-        zones = DeliveryZone.objects.filter(is_active=True)
+        from django.db.models import Sum
+        from food_store.models import DailyZoneSales
+        
+        totals = {
+            row['zone_id']: row
+            for row in DailyZoneSales.objects.filter(zone__isnull=False).values('zone_id').annotate(
+                total_orders=Sum('order_count'),
+                total_revenue=Sum('revenue')
+            )
+        }
         
-        for zone in zones:
-            orders = Order.objects.filter(delivery_zone=zone)
-            total_orders = orders.count()
-            total_revenue = sum(order.total_amount for order in orders)
+        zones_stats = {}
+        for zone_id, name in DeliveryZone.objects.filter(is_active=True).values_list('id', 'name'):
+            row = totals.get(zone_id, {})
+            total_orders = row.get('total_orders') or 0
+            total_revenue = row.get('total_revenue') or 0
             
-            zones_stats[zone.name] = {
+            zones_stats[name] = {
                 'total_orders': total_orders,
                 'total_revenue': float(total_revenue),
                 'average_order_value': float(total_revenue / total_orders) if total_orders > 0 else 0
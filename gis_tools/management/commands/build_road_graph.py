@@ -0,0 +1,134 @@
+"""
+Management command to build the offline road graph from an OSM extract
+"""
+import math
+import xml.etree.ElementTree as ET
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Tốc độ (km/h) theo loại đường; loại đường không có trong bảng sẽ bị bỏ qua
+HIGHWAY_SPEEDS = {
+    'driving': {
+        'motorway': 80, 'motorway_link': 40,
+        'trunk': 60, 'trunk_link': 40,
+        'primary': 50, 'primary_link': 35,
+        'secondary': 40, 'secondary_link': 30,
+        'tertiary': 35, 'tertiary_link': 30,
+        'unclassified': 30, 'residential': 25,
+        'service': 15, 'living_street': 10,
+    },
+    'bicycle': {
+        'primary': 15, 'secondary': 15, 'tertiary': 15,
+        'unclassified': 15, 'residential': 15, 'service': 12,
+        'living_street': 10, 'cycleway': 18, 'path': 12, 'track': 10,
+    },
+    'foot': {
+        'primary': 5, 'secondary': 5, 'tertiary': 5,
+        'unclassified': 5, 'residential': 5, 'service': 5,
+        'living_street': 5, 'pedestrian': 5, 'footway': 5,
+        'path': 5, 'steps': 3, 'track': 5, 'cycleway': 5,
+    },
+}
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + \
+        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 6371000 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class Command(BaseCommand):
+    help = 'Tạo road graph (.npz) cho router offline từ file OSM XML (.osm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('osm_file', help='File OSM XML (vd: export từ Geofabrik/Overpass)')
+        parser.add_argument('output', help='File .npz đầu ra (dùng cho ROUTING["GRAPH_PATH"])')
+        parser.add_argument(
+            '--profile', choices=sorted(HIGHWAY_SPEEDS), default='driving',
+            help='Loại phương tiện (mặc định: driving)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+        except ImportError:
+            raise CommandError('Cần cài numpy để tạo road graph (pip install numpy)')
+
+        profile = options['profile']
+        speeds = HIGHWAY_SPEEDS[profile]
+        respect_oneway = profile == 'driving'
+
+        nodes = {}
+        ways = []
+
+        self.stdout.write(f'Đang đọc {options["osm_file"]}...')
+        try:
+            for _, elem in ET.iterparse(options['osm_file'], events=('end',)):
+                if elem.tag == 'node':
+                    nodes[elem.get('id')] = (float(elem.get('lat')), float(elem.get('lon')))
+                    elem.clear()
+                elif elem.tag == 'way':
+                    tags = {t.get('k'): t.get('v') for t in elem.findall('tag')}
+                    speed = speeds.get(tags.get('highway'))
+                    if speed:
+                        refs = [nd.get('ref') for nd in elem.findall('nd')]
+                        oneway = tags.get('oneway') if respect_oneway else None
+                        if respect_oneway and tags.get('highway') in ('motorway', 'motorway_link') and oneway is None:
+                            oneway = 'yes'
+                        ways.append((refs, speed, oneway))
+                    elem.clear()
+        except (OSError, ET.ParseError) as e:
+            raise CommandError(f'Không đọc được file OSM: {e}')
+
+        index = {}
+        node_lat = []
+        node_lng = []
+
+        def node_index(ref):
+            if ref not in index:
+                lat, lng = nodes[ref]
+                index[ref] = len(node_lat)
+                node_lat.append(lat)
+                node_lng.append(lng)
+            return index[ref]
+
+        edges = []
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in nodes]
+            if oneway == '-1':
+                refs.reverse()
+            forward_only = oneway in ('yes', '1', 'true', '-1')
+            for a, b in zip(refs, refs[1:]):
+                u, v = node_index(a), node_index(b)
+                distance = haversine_m(node_lat[u], node_lng[u], node_lat[v], node_lng[v])
+                duration = distance / (speed / 3.6)
+                edges.append((u, v, distance, duration))
+                if not forward_only:
+                    edges.append((v, u, distance, duration))
+
+        if not edges:
+            raise CommandError(f'Không tìm thấy đường nào cho profile "{profile}"')
+
+        edges.sort(key=lambda edge: edge[0])
+        indptr = np.zeros(len(node_lat) + 1, dtype=np.int64)
+        for u, _, _, _ in edges:
+            indptr[u + 1] += 1
+        indptr = np.cumsum(indptr)
+
+        np.savez_compressed(
+            options['output'],
+            node_lat=np.array(node_lat, dtype=np.float64),
+            node_lng=np.array(node_lng, dtype=np.float64),
+            indptr=indptr,
+            indices=np.array([edge[1] for edge in edges], dtype=np.int32),
+            distance_m=np.array([edge[2] for edge in edges], dtype=np.float32),
+            duration_s=np.array([edge[3] for edge in edges], dtype=np.float32),
+            max_speed_kmh=np.float64(max(speeds.values())),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Đã tạo road graph: {len(node_lat)} nodes, {len(edges)} cạnh → {options["output"]}'
+        ))
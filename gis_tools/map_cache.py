@@ -0,0 +1,94 @@
+"""
+Cache HTML đã render của các bản đồ Folium
+Key gồm loại bản đồ, tham số và "phiên bản dữ liệu" của các model mà bản đồ
+phụ thuộc. Khi Farm/DeliveryZone/Order thay đổi, signal tăng phiên bản của
+model đó (xem gis_tools.signals) nên các bản đồ liên quan tự render lại,
+còn bản đồ không liên quan vẫn dùng HTML đã cache. Bản đồ theo dõi đơn hàng
+chỉ phụ thuộc phiên bản của chính đơn đó nên lưu đơn khác không làm mất cache.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+MAP_CACHE_TIMEOUT = 60 * 60  # 1 giờ - chỉ để dọn HTML cũ, dữ liệu đổi là key đổi
+VERSION_KEY_PREFIX = 'gis:map:version:'
+HTML_KEY_PREFIX = 'gis:map:html:'
+
+# Model mà mỗi loại bản đồ phụ thuộc
+# (bản đồ cửa hàng/khu vực/nhiệt được vẽ phía client, xem gis_tools.map_data).
+# '{0}' được thay bằng tham số đầu tiên của bản đồ: bản đồ theo dõi chỉ phụ
+# thuộc phiên bản của chính đơn hàng đó ('order:<pk>')
+MAP_DEPENDENCIES = {
+    'single_farm': ('farm',),
+    'order_tracking': ('order:{0}', 'farm'),
+}
+
+
+def get_data_version(model_name):
+    """Phiên bản dữ liệu hiện tại của model (vd: 'farm', 'order') hoặc một bản ghi ('order:12')"""
+    key = VERSION_KEY_PREFIX + model_name
+    version = cache.get(key)
+    if version is None:
+        # Dùng thời điểm hiện tại để không trùng với phiên bản trước khi cache bị xóa
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(model_name):
+    """Tăng phiên bản dữ liệu của model - mọi bản đồ phụ thuộc sẽ render lại"""
+    key = VERSION_KEY_PREFIX + model_name
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def make_data_key(name, model_names, params=None):
+    """Key cache cho dữ liệu bản đồ (JSON) - đổi khi model phụ thuộc thay đổi"""
+    versions = ':'.join(f"{model_name}={get_data_version(model_name)}" for model_name in model_names)
+    key = f"gis:map:data:{name}:{versions}"
+    if params:
+        key += ':' + hashlib.md5(repr(sorted(params.items())).encode('utf-8')).hexdigest()
+    return key
+
+
+def make_map_key(map_type, params=()):
+    versions = ':'.join(
+        f"{model_name}={get_data_version(model_name)}"
+        for model_name in (dependency.format(*params) for dependency in MAP_DEPENDENCIES[map_type])
+    )
+    raw = f"{map_type}|{'|'.join(str(p) for p in params)}|{versions}"
+    return HTML_KEY_PREFIX + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def render_map(map_type, build, *params):
+    """
+    HTML của bản đồ, lấy từ cache nếu dữ liệu chưa thay đổi
+
+    Args:
+        map_type: Loại bản đồ (khóa trong MAP_DEPENDENCIES)
+        build: Hàm build(*params) trả về folium.Map hoặc None
+        params: Tham số của bản đồ (phải xác định được HTML)
+
+    Returns:
+        HTML (str) hoặc None nếu build trả về None
+
+    Kết quả None và bản đồ ước lượng (folium.Map có is_estimate=True, vd: route
+    đường chim bay khi routing server lỗi) không được cache để lần xem sau
+    render lại khi server hoạt động trở lại
+    """
+    key = make_map_key(map_type, params)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['html']
+
+    folium_map = build(*params)
+    if folium_map is None:
+        return None
+
+    html = folium_map._repr_html_()
+    if not getattr(folium_map, 'is_estimate', False):
+        cache.set(key, {'html': html}, MAP_CACHE_TIMEOUT)
+    return html
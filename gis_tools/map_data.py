@@ -0,0 +1,208 @@
+"""
+Dữ liệu gọn cho bản đồ vẽ phía client (Leaflet)
+Trả về mảng tọa độ thay vì HTML Folium: server chỉ gửi dữ liệu, còn khung
+bản đồ trong template là tĩnh. Tọa độ làm tròn 5 chữ số thập phân (~1m).
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F
+from django.db.models.functions import Floor
+from django.utils import timezone
+
+from food_store.models import Farm, Order
+
+COORD_PRECISION = 5
+
+# Lưới bản đồ nhiệt: mỗi ô ~HEAT_CELL_PIXELS pixel ở mức zoom được yêu cầu
+HEAT_CELL_PIXELS = 8
+DEFAULT_HEAT_ZOOM = 11
+MIN_HEAT_ZOOM = 3
+MAX_HEAT_ZOOM = 18
+HEAT_BBOX_SNAP_CELLS = 32
+
+FARM_FIELDS = ['id', 'name', 'lat', 'lng', 'organic', 'address']
+
+
+def round_coord(value):
+    return round(value, COORD_PRECISION)
+
+
+def farm_points():
+    """
+    Returns:
+        dict {'fields': FARM_FIELDS, 'farms': [[id, name, lat, lng, organic, address], ...]}
+    """
+    farms = Farm.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).values_list('id', 'name', 'latitude', 'longitude', 'organic_certified', 'address')
+
+    return {
+        'fields': FARM_FIELDS,
+        'farms': [
+            [farm_id, name, round_coord(lat), round_coord(lng), organic, address]
+            for farm_id, name, lat, lng, organic, address in farms
+        ],
+    }
+
+
+def heat_cell_size(zoom):
+    """
+    Kích thước ô lưới (độ) ở mức zoom - mỗi ô rộng khoảng HEAT_CELL_PIXELS pixel trên bản đồ
+    """
+    zoom = min(max(int(zoom), MIN_HEAT_ZOOM), MAX_HEAT_ZOOM)
+    return HEAT_CELL_PIXELS * 360 / (256 * 2 ** zoom)
+
+
+def parse_heat_params(params):
+    """
+    Đọc tham số bản đồ nhiệt từ query string
+
+    Query: zoom, date_from, date_to (YYYY-MM-DD), farm, bbox (south,west,north,east).
+    bbox được nới ra theo lưới HEAT_BBOX_SNAP_CELLS ô để các lần kéo bản đồ
+    nhỏ dùng lại cùng một kết quả đã cache.
+
+    Returns:
+        dict tham số cho heat_points
+
+    Raises:
+        ValueError: tham số không hợp lệ
+    """
+    from django.utils.dateparse import parse_date
+
+    zoom = min(max(int(params.get('zoom', DEFAULT_HEAT_ZOOM)), MIN_HEAT_ZOOM), MAX_HEAT_ZOOM)
+
+    dates = {}
+    for name in ('date_from', 'date_to'):
+        value = params.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            raise ValueError(f'{name} phải có dạng YYYY-MM-DD')
+
+    farm_id = int(params['farm']) if params.get('farm') else None
+
+    bbox = None
+    if params.get('bbox'):
+        south, west, north, east = (float(v) for v in params['bbox'].split(','))
+        snap = heat_cell_size(zoom) * HEAT_BBOX_SNAP_CELLS
+        bbox = (
+            math.floor(south / snap) * snap, math.floor(west / snap) * snap,
+            math.ceil(north / snap) * snap, math.ceil(east / snap) * snap,
+        )
+
+    return {'zoom': zoom, 'farm_id': farm_id, 'bbox': bbox, **dates}
+
+
+def _day_start(date):
+    """Đầu ngày theo múi giờ hiện tại - lọc created_at theo khoảng để dùng được index"""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def filter_heat_orders(orders, date_from=None, date_to=None, farm_id=None, bbox=None):
+    """
+    Lọc đơn hàng cho bản đồ nhiệt
+
+    Args:
+        date_from, date_to: date - khoảng ngày tạo đơn (bao gồm 2 đầu)
+        farm_id: Chỉ lấy đơn được gán cho cửa hàng này
+        bbox: (south, west, north, east) - vùng đang hiển thị trên bản đồ
+    """
+    orders = orders.filter(delivery_latitude__isnull=False, delivery_longitude__isnull=False)
+    if date_from:
+        orders = orders.filter(created_at__gte=_day_start(date_from))
+    if date_to:
+        orders = orders.filter(created_at__lt=_day_start(date_to + timedelta(days=1)))
+    if farm_id:
+        orders = orders.filter(assigned_farm_id=farm_id)
+    if bbox:
+        south, west, north, east = bbox
+        orders = orders.filter(
+            delivery_latitude__gte=south, delivery_latitude__lte=north,
+            delivery_longitude__gte=west, delivery_longitude__lte=east,
+        )
+    return orders
+
+
+def heat_points(zoom=DEFAULT_HEAT_ZOOM, date_from=None, date_to=None, farm_id=None, bbox=None):
+    """
+    Gom vị trí giao hàng thành các ô lưới có trọng số, tính bằng GROUP BY trong SQL
+
+    Số điểm gửi về trình duyệt tỉ lệ với số ô có đơn trong vùng nhìn thấy,
+    không phụ thuộc số đơn hàng.
+
+    Returns:
+        dict {'zoom', 'cell_size', 'max_weight', 'points': [[lat, lng, weight], ...]}
+        với (lat, lng) là tâm ô lưới và weight là số đơn trong ô
+    """
+    cell_size = heat_cell_size(zoom)
+    orders = filter_heat_orders(Order.objects.all(), date_from, date_to, farm_id, bbox)
+    cells = (
+        orders.order_by()
+        .annotate(
+            cell_y=Floor(F('delivery_latitude') / cell_size),
+            cell_x=Floor(F('delivery_longitude') / cell_size),
+        )
+        .values_list('cell_y', 'cell_x')
+        .annotate(weight=Count('id'))
+    )
+
+    points = [
+        [round_coord((cell_y + 0.5) * cell_size), round_coord((cell_x + 0.5) * cell_size), weight]
+        for cell_y, cell_x, weight in cells
+    ]
+    return {
+        'zoom': min(max(int(zoom), MIN_HEAT_ZOOM), MAX_HEAT_ZOOM),
+        'cell_size': cell_size,
+        'max_weight': max((point[2] for point in points), default=0),
+        'points': points,
+    }
+
+
+def order_tracking_data(order):
+    """
+    Vị trí giao hàng, cửa hàng được gán và tuyến đường của đơn hàng
+
+    Returns:
+        dict hoặc None nếu đơn hàng không có tọa độ giao hàng
+    """
+    from .routing import get_road_route
+
+    if not (order.delivery_latitude and order.delivery_longitude):
+        return None
+
+    data = {
+        'order': {
+            'id': order.pk,
+            'status': order.status,
+            'address': order.delivery_address,
+            'delivery_fee': float(order.delivery_fee or 0),
+        },
+        'delivery': [round_coord(order.delivery_latitude), round_coord(order.delivery_longitude)],
+        'farm': None,
+        'route': None,
+    }
+
+    farm = order.assigned_farm
+    if farm and farm.latitude and farm.longitude:
+        data['farm'] = {
+            'id': farm.pk,
+            'name': farm.name,
+            'location': [round_coord(farm.latitude), round_coord(farm.longitude)],
+        }
+
+        route = get_road_route(farm.latitude, farm.longitude, order.delivery_latitude, order.delivery_longitude)
+        if route:
+            geometry = route.get('geometry') or {}
+            data['route'] = {
+                'distance_km': round(route['distance_km'], 2),
+                'duration_min': round(route['duration_min'], 1),
+                'is_estimate': route.get('is_estimate', False),
+                # GeoJSON là [lng, lat] - đổi sang [lat, lng] cho Leaflet
+                'coordinates': [
+                    [round_coord(lat), round_coord(lng)]
+                    for lng, lat, *_ in geometry.get('coordinates', [])
+                ],
+            }
+
+    return data
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True, verbose_name='Cache key')),
+                ('distance_km', models.FloatField(verbose_name='Khoảng cách (km)')),
+                ('duration_min', models.FloatField(verbose_name='Thời gian (phút)')),
+                ('geometry', models.JSONField(blank=True, null=True, verbose_name='GeoJSON LineString')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Hết hạn')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='Lần dùng cuối')),
+            ],
+            options={
+                'verbose_name': 'Route cache',
+                'verbose_name_plural': 'Route cache',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+"""
+Models for GIS Tools
+"""
+from django.db import models
+
+
+class RouteCacheEntry(models.Model):
+    """Route OSRM đã cache (backend 'database' của route cache)"""
+    key = models.CharField(max_length=200, unique=True, verbose_name="Cache key")
+    distance_km = models.FloatField(verbose_name="Khoảng cách (km)")
+    duration_min = models.FloatField(verbose_name="Thời gian (phút)")
+    geometry = models.JSONField(null=True, blank=True, verbose_name="GeoJSON LineString")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Hết hạn")
+    last_used_at = models.DateTimeField(db_index=True, verbose_name="Lần dùng cuối")
+    
+    class Meta:
+        verbose_name = "Route cache"
+        verbose_name_plural = "Route cache"
+    
+    def __str__(self):
+        return self.key
+    
+    def to_route(self):
+        return {
+            'distance_km': self.distance_km,
+            'duration_min': self.duration_min,
+            'geometry': self.geometry,
+        }
@@ -0,0 +1,262 @@
+"""
+Mapbox Vector Tile (MVT 2.1) encoder
+Tự mã hóa protobuf nên không cần thư viện ngoài: chuyển tọa độ lng/lat sang
+hệ tọa độ tile (Web Mercator, extent 4096), cắt polygon theo khung tile và
+ghi các layer điểm/polygon theo đặc tả https://github.com/mapbox/vector-tile-spec
+"""
+import math
+import struct
+
+EXTENT = 4096
+BUFFER = 64  # Phần tràn ra ngoài tile để nét vẽ không bị cắt ở mép
+
+GEOM_POINT = 1
+GEOM_POLYGON = 3
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+MAX_LATITUDE = 85.0511287798
+
+
+def tile_bounds(z, x, y):
+    """
+    Returns:
+        (west, south, east, north) của tile theo độ
+    """
+    n = 2 ** z
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return (x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y))
+
+
+def buffered_bounds(z, x, y, buffer=BUFFER):
+    """Khung tile nới thêm buffer (đơn vị extent) để truy vấn dữ liệu"""
+    west, south, east, north = tile_bounds(z, x, y)
+    pad_x = (east - west) * buffer / EXTENT
+    pad_y = (north - south) * buffer / EXTENT
+    return (west - pad_x, max(south - pad_y, -MAX_LATITUDE), east + pad_x, min(north + pad_y, MAX_LATITUDE))
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= 24 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+class TileProjection:
+    """Chuyển (lng, lat) sang tọa độ nguyên trong tile z/x/y"""
+
+    def __init__(self, z, x, y, extent=EXTENT):
+        self.scale = 2 ** z * extent
+        self.offset_x = x * extent
+        self.offset_y = y * extent
+
+    def __call__(self, lng, lat):
+        lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+        px = (lng + 180) / 360 * self.scale
+        sin_lat = math.sin(math.radians(lat))
+        py = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * self.scale
+        return (round(px - self.offset_x), round(py - self.offset_y))
+
+
+def clip_ring(ring, low=-BUFFER, high=EXTENT + BUFFER):
+    """Cắt một vòng polygon theo khung vuông [low, high] (Sutherland-Hodgman)"""
+    edges = (
+        (lambda p: p[0] >= low, lambda a, b: _cross_x(a, b, low)),
+        (lambda p: p[0] <= high, lambda a, b: _cross_x(a, b, high)),
+        (lambda p: p[1] >= low, lambda a, b: _cross_y(a, b, low)),
+        (lambda p: p[1] <= high, lambda a, b: _cross_y(a, b, high)),
+    )
+    points = list(ring)
+    for inside, intersect in edges:
+        if not points:
+            break
+        clipped = []
+        previous = points[-1]
+        for point in points:
+            if inside(point):
+                if not inside(previous):
+                    clipped.append(intersect(previous, point))
+                clipped.append(point)
+            elif inside(previous):
+                clipped.append(intersect(previous, point))
+            previous = point
+        points = clipped
+    return points
+
+
+def _cross_x(a, b, x):
+    t = (x - a[0]) / (b[0] - a[0])
+    return (x, round(a[1] + t * (b[1] - a[1])))
+
+
+def _cross_y(a, b, y):
+    t = (y - a[1]) / (b[1] - a[1])
+    return (round(a[0] + t * (b[0] - a[0])), y)
+
+
+def _signed_area(ring):
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+def _dedupe(ring):
+    """Bỏ điểm trùng liên tiếp sau khi làm tròn (giảm chi tiết ở zoom thấp)"""
+    result = []
+    for point in ring:
+        if not result or point != result[-1]:
+            result.append(point)
+    if len(result) > 1 and result[0] == result[-1]:
+        result.pop()
+    return result
+
+
+def project_polygon(rings, project):
+    """
+    Chiếu và cắt polygon GeoJSON ([lng, lat]) vào tile
+
+    Returns:
+        List vòng (tọa độ tile) đúng chiều MVT: vòng ngoài có diện tích dương
+        (chiều kim đồng hồ trên màn hình), lỗ có diện tích âm; [] nếu nằm ngoài tile
+    """
+    result = []
+    for index, ring in enumerate(rings):
+        points = _dedupe(clip_ring(_dedupe([project(lng, lat) for lng, lat, *_ in ring])))
+        area = _signed_area(points) if len(points) >= 3 else 0
+        if area == 0:
+            if index == 0:
+                return []
+            continue
+        if (index == 0) != (area > 0):
+            points.reverse()
+        result.append(points)
+    return result
+
+
+# --- Protobuf ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, data):
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _command(command, count):
+    return (command & 0x7) | (count << 3)
+
+
+def encode_point_geometry(point):
+    x, y = point
+    return [_command(CMD_MOVE_TO, 1), _zigzag(x), _zigzag(y)]
+
+
+def encode_polygon_geometry(rings):
+    commands = []
+    cursor_x = cursor_y = 0
+    for ring in rings:
+        first, rest = ring[0], ring[1:]
+        commands += [_command(CMD_MOVE_TO, 1), _zigzag(first[0] - cursor_x), _zigzag(first[1] - cursor_y)]
+        cursor_x, cursor_y = first
+        commands.append(_command(CMD_LINE_TO, len(rest)))
+        for x, y in rest:
+            commands += [_zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+            cursor_x, cursor_y = x, y
+        commands.append(_command(CMD_CLOSE_PATH, 1))
+    return commands
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int) and value >= 0:
+        return _key(5, 0) + _varint(value)
+    if isinstance(value, (int, float)):
+        return _key(3, 1) + struct.pack('<d', float(value))
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+class LayerEncoder:
+    """
+    Gom feature của một layer rồi mã hóa thành protobuf
+
+    Feature: (id, geom_type, geometry_commands, properties)
+    """
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self._keys = {}
+        self._values = {}
+        self._features = []
+
+    def __len__(self):
+        return len(self._features)
+
+    def _index(self, table, item):
+        if item not in table:
+            table[item] = len(table)
+        return table[item]
+
+    def add_feature(self, geom_type, geometry, properties=None, feature_id=None):
+        tags = []
+        for key, value in (properties or {}).items():
+            if value is None:
+                continue
+            tags.append(self._index(self._keys, key))
+            tags.append(self._index(self._values, (type(value).__name__, value)))
+
+        data = b''
+        if feature_id is not None:
+            data += _key(1, 0) + _varint(feature_id)
+        if tags:
+            data += _packed_field(2, tags)
+        data += _key(3, 0) + _varint(geom_type)
+        data += _packed_field(4, geometry)
+        self._features.append(data)
+
+    def add_point(self, point, properties=None, feature_id=None):
+        self.add_feature(GEOM_POINT, encode_point_geometry(point), properties, feature_id)
+
+    def add_polygon(self, rings, properties=None, feature_id=None):
+        if rings:
+            self.add_feature(GEOM_POLYGON, encode_polygon_geometry(rings), properties, feature_id)
+
+    def encode(self):
+        data = _key(15, 0) + _varint(2)
+        data += _bytes_field(1, self.name.encode('utf-8'))
+        for feature in self._features:
+            data += _bytes_field(2, feature)
+        for key in self._keys:
+            data += _bytes_field(3, key.encode('utf-8'))
+        for _, value in self._values:
+            data += _bytes_field(4, _encode_value(value))
+        data += _key(5, 0) + _varint(self.extent)
+        return data
+
+
+def encode_tile(layers):
+    """Mã hóa các LayerEncoder (bỏ qua layer rỗng) thành một tile MVT"""
+    return b''.join(_bytes_field(3, layer.encode()) for layer in layers if len(layer))
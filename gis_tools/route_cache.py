@@ -0,0 +1,308 @@
+"""
+Route Cache cho OSRM
+Lưu kết quả đường đi theo (profile, tọa độ đã làm tròn) để các lần hỏi lại
+cùng một cặp cửa hàng → khách hàng không phải gọi OSRM nữa
+
+Cấu hình trong settings.ROUTE_CACHE:
+    ROUTE_CACHE = {
+        'BACKEND': 'memory',     # 'memory' | 'database' | 'django' | dotted path
+        'TTL': 86400,            # Thời gian sống (giây)
+        'MAX_ENTRIES': 5000,     # Số route tối đa (LRU)
+        'PRECISION': 4,          # Số chữ số thập phân khi làm tròn tọa độ (~11m)
+        'CACHE_ALIAS': 'default' # Chỉ dùng cho backend 'django' (Redis, Memcached...)
+    }
+"""
+import hashlib
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTE_CACHE = {
+    'BACKEND': 'memory',
+    'TTL': 24 * 60 * 60,
+    'MAX_ENTRIES': 5000,
+    'PRECISION': 4,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def make_route_key(profile, start_lat, start_lng, end_lat, end_lng, precision=4):
+    """
+    Tạo cache key từ profile và tọa độ đã làm tròn
+    precision=4 ≈ 11m, đủ để gom các lần hỏi cùng một địa chỉ
+    """
+    coords = ','.join(f'{round(float(v), precision):.{precision}f}' for v in (start_lat, start_lng, end_lat, end_lng))
+    return f'route:{profile}:{coords}'
+
+
+class RouteCacheStats:
+    """Bộ đếm hit/miss cho route cache (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.stores = 0
+            self.evictions = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class BaseRouteCache(ABC):
+    """
+    Interface chung cho các backend route cache
+
+    Subclass cần cài đặt clear(), _get(key) và _set(key, value)
+    """
+
+    def __init__(self, ttl=DEFAULT_ROUTE_CACHE['TTL'], max_entries=DEFAULT_ROUTE_CACHE['MAX_ENTRIES'],
+                 precision=DEFAULT_ROUTE_CACHE['PRECISION'], **options):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.stats = RouteCacheStats()
+
+    def make_key(self, profile, start_lat, start_lng, end_lat, end_lng):
+        return make_route_key(profile, start_lat, start_lng, end_lat, end_lng, self.precision)
+
+    def get(self, key):
+        """Trả về dict route đã cache hoặc None"""
+        try:
+            value = self._get(key)
+        except Exception as e:
+            logger.error(f"Route cache read error: {e}")
+            value = None
+        self.stats.incr('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        try:
+            self._set(key, value)
+            self.stats.incr('stores')
+        except Exception as e:
+            logger.error(f"Route cache write error: {e}")
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Lấy route từ cache, nếu miss thì gọi fetch() và lưu kết quả
+        (không cache kết quả None để lần sau còn thử lại)
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = fetch()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def _get(self, key):
+        pass
+
+    @abstractmethod
+    def _set(self, key, value):
+        pass
+
+
+class MemoryRouteCache(BaseRouteCache):
+    """LRU + TTL trong bộ nhớ process (mặc định, dùng cho dev/test)"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DatabaseRouteCache(BaseRouteCache):
+    """
+    Lưu route trong bảng gis_tools.RouteCacheEntry
+    Dùng chung giữa các worker và còn giữ được sau khi restart server
+    """
+
+    # Dọn dẹp bảng sau mỗi N lần ghi thay vì mỗi lần
+    PRUNE_EVERY = 50
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._writes = 0
+
+    def _get(self, key):
+        from django.utils import timezone
+        from .models import RouteCacheEntry
+
+        now = timezone.now()
+        entry = RouteCacheEntry.objects.filter(key=key, expires_at__gt=now).first()
+        if entry is None:
+            return None
+        RouteCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=now)
+        return entry.to_route()
+
+    def _set(self, key, value):
+        from django.utils import timezone
+        from .models import RouteCacheEntry
+
+        now = timezone.now()
+        RouteCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'distance_km': value['distance_km'],
+                'duration_min': value['duration_min'],
+                'geometry': value.get('geometry'),
+                'expires_at': now + timedelta(seconds=self.ttl),
+                'last_used_at': now,
+            }
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Xóa route hết hạn và các route ít dùng nhất khi vượt MAX_ENTRIES"""
+        from django.utils import timezone
+        from .models import RouteCacheEntry
+
+        deleted, _ = RouteCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        overflow = RouteCacheEntry.objects.count() - self.max_entries
+        if overflow > 0:
+            stale_ids = list(
+                RouteCacheEntry.objects.order_by('last_used_at').values_list('pk', flat=True)[:overflow]
+            )
+            deleted += RouteCacheEntry.objects.filter(pk__in=stale_ids).delete()[0]
+        if deleted:
+            self.stats.incr('evictions', deleted)
+
+    def clear(self):
+        from .models import RouteCacheEntry
+
+        RouteCacheEntry.objects.all().delete()
+
+
+class DjangoCacheRouteCache(BaseRouteCache):
+    """
+    Dùng Django cache framework (vd: Redis qua django.core.cache.backends.redis)
+    TTL do cache backend quản lý, LRU do chính sách eviction của Redis/Memcached
+    """
+
+    def __init__(self, cache_alias='default', **options):
+        super().__init__(**options)
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    def _cache_key(self, key):
+        # Memcached giới hạn key 250 ký tự và không cho phép khoảng trắng
+        return 'gis_route:' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def _get(self, key):
+        return self.cache.get(self._cache_key(key))
+
+    def _set(self, key, value):
+        self.cache.set(self._cache_key(key), value, timeout=self.ttl)
+
+    def clear(self):
+        # Không xóa toàn bộ cache dùng chung, chỉ reset bộ đếm
+        self.stats.reset()
+
+
+ROUTE_CACHE_BACKENDS = {
+    'memory': MemoryRouteCache,
+    'database': DatabaseRouteCache,
+    'django': DjangoCacheRouteCache,
+}
+
+_route_cache = None
+_route_cache_lock = threading.Lock()
+
+
+def build_route_cache(config=None):
+    """Tạo route cache từ dict cấu hình (mặc định đọc settings.ROUTE_CACHE)"""
+    options = dict(DEFAULT_ROUTE_CACHE)
+    options.update(config if config is not None else getattr(settings, 'ROUTE_CACHE', {}))
+
+    backend = options.pop('BACKEND')
+    backend_class = ROUTE_CACHE_BACKENDS.get(backend) or import_string(backend)
+
+    return backend_class(
+        ttl=options.pop('TTL'),
+        max_entries=options.pop('MAX_ENTRIES'),
+        precision=options.pop('PRECISION'),
+        cache_alias=options.pop('CACHE_ALIAS'),
+        **{k.lower(): v for k, v in options.items()}
+    )
+
+
+def get_route_cache():
+    """Route cache dùng chung trong process"""
+    global _route_cache
+    if _route_cache is None:
+        with _route_cache_lock:
+            if _route_cache is None:
+                _route_cache = build_route_cache()
+    return _route_cache
+
+
+def reset_route_cache():
+    """Bỏ route cache hiện tại (vd: sau khi đổi settings)"""
+    global _route_cache
+    with _route_cache_lock:
+        _route_cache = None
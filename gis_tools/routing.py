@@ -1,16 +1,127 @@
 """
 Road Routing Module using OSRM (OpenStreetMap Routing Machine)
 Tính toán đường đi thực tế trên bản đồ thay vì đường chim bay
+Backend tính đường (OSRM public, OSRM tự host, router offline) được chọn
+qua settings.ROUTING['BACKEND'] - xem gis_tools.routing_backends
 """
-import requests
+import math
 import logging
 
+from django.conf import settings
+
 logger = logging.getLogger(__name__)
 
+OSRM_PUBLIC_URL = 'http://router.project-osrm.org'
+
+DEFAULT_ROUTING = {
+    'BACKEND': 'osrm_public',
+    'OSRM_URL': OSRM_PUBLIC_URL,
+    'TABLE_MAX_COORDINATES': 100,
+    'GRAPH_PATH': None,
+    'GRAPH_PATHS': {},
+    'MAX_WORKERS': 8,
+    'REQUEST_TIMEOUT': 5,
+    'TOTAL_TIMEOUT': 8,
+    'FAILURE_THRESHOLD': 5,
+    'RECOVERY_TIMEOUT': 30,
+}
+
+
+def get_routing_settings():
+    """settings.ROUTING gộp với giá trị mặc định"""
+    config = dict(DEFAULT_ROUTING)
+    config.update(getattr(settings, 'ROUTING', {}))
+    return config
+
+
+# Map vehicle types to OSRM profiles
+VEHICLE_PROFILES = {
+    'driving': 'driving',      # Ô tô
+    'car': 'driving',          # Ô tô (alias)
+    'motorcycle': 'driving',   # Xe máy (dùng driving profile nhưng sẽ điều chỉnh)
+    'motorbike': 'driving',    # Xe máy (alias)
+    'bicycle': 'bicycle',      # Xe đạp
+    'bike': 'bicycle',         # Xe đạp (alias)
+    'foot': 'foot',           # Đi bộ
+    'walking': 'foot'         # Đi bộ (alias)
+}
+
+
+def get_profile(vehicle_type):
+    """Lấy OSRM profile tương ứng với loại phương tiện"""
+    return VEHICLE_PROFILES.get(vehicle_type, 'driving')
+
+
+def adjust_duration(duration_min, distance_km, vehicle_type):
+    """
+    Điều chỉnh thời gian cho xe máy (nhanh hơn ô tô trong thành phố)
+    """
+    if vehicle_type in ['motorcycle', 'motorbike']:
+        # Xe máy nhanh hơn 20-30% trong thành phố
+        if distance_km <= 20:  # Trong thành phố
+            return duration_min * 0.75  # Giảm 25% thời gian
+        elif distance_km <= 50:  # Ngoại thành
+            return duration_min * 0.85  # Giảm 15% thời gian
+        # Đường dài giữ nguyên vì xe máy không nhanh hơn trên cao tốc
+    return duration_min
+
+
+# Tốc độ trung bình (km/h) để ước lượng thời gian khi không có routing
+ESTIMATED_SPEED_KMH = {
+    'driving': 30,
+    'bicycle': 15,
+    'foot': 5,
+}
+
+
+def straight_line_distance(start_lat, start_lng, end_lat, end_lng):
+    """Khoảng cách đường chim bay (Haversine, km)"""
+    dlat = math.radians(end_lat - start_lat)
+    dlng = math.radians(end_lng - start_lng)
+    a = math.sin(dlat / 2) ** 2 + \
+        math.cos(math.radians(start_lat)) * math.cos(math.radians(end_lat)) * math.sin(dlng / 2) ** 2
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def straight_line_route(start_lat, start_lng, end_lat, end_lng, vehicle_type='driving'):
+    """
+    Route ước lượng theo đường chim bay (dùng khi routing server không khả dụng)
+    """
+    distance_km = straight_line_distance(start_lat, start_lng, end_lat, end_lng)
+    speed = ESTIMATED_SPEED_KMH[get_profile(vehicle_type)]
+    duration_min = adjust_duration(distance_km / speed * 60, distance_km, vehicle_type)
+    
+    return {
+        'distance_km': distance_km,
+        'duration_min': duration_min,
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[start_lng, start_lat], [end_lng, end_lat]]
+        },
+        'vehicle_type': vehicle_type,
+        'is_estimate': True
+    }
+
 
-def get_road_route(start_lat, start_lng, end_lat, end_lng, vehicle_type='driving', timeout=5):
+def fetch_route(profile, start_lat, start_lng, end_lat, end_lng, timeout=5):
     """
-    Lấy thông tin đường đi thực tế từ OSRM API
+    Tính route bằng routing backend đang cấu hình (không qua cache)
+    
+    Returns:
+        dict {'distance_km', 'duration_min', 'geometry'} theo profile gốc
+        None nếu không tìm được route
+    
+    Raises:
+        RoutingUnavailable: circuit breaker của backend đang mở
+    """
+    from .routing_backends import get_routing_backend
+    
+    return get_routing_backend().route(profile, start_lat, start_lng, end_lat, end_lng, timeout=timeout)
+
+
+def get_road_route(start_lat, start_lng, end_lat, end_lng, vehicle_type='driving', timeout=5, use_cache=True):
+    """
+    Lấy thông tin đường đi thực tế từ routing backend (mặc định OSRM API)
     
     Args:
         start_lat (float): Vĩ độ điểm bắt đầu
@@ -19,79 +130,171 @@ def get_road_route(start_lat, start_lng, end_lat, end_lng, vehicle_type='driving
         end_lng (float): Kinh độ điểm kết thúc
         vehicle_type (str): Loại phương tiện ('driving', 'motorcycle', 'bicycle', 'foot')
         timeout (int): Timeout cho API call (seconds)
+        use_cache (bool): Dùng route cache (xem gis_tools.route_cache)
     
     Returns:
         dict: {
             'distance_km': float,     # Khoảng cách (km)
             'duration_min': float,    # Thời gian (phút)
             'geometry': dict,         # GeoJSON LineString
-            'vehicle_type': str       # Loại phương tiện đã sử dụng
+            'vehicle_type': str,      # Loại phương tiện đã sử dụng
+            'is_estimate': bool       # True nếu là ước lượng đường chim bay
         }
         None nếu không tìm được route
+        
+        Khi backend đang bị ngắt mạch (circuit open), trả về ngay route ước lượng
+        theo đường chim bay với 'is_estimate': True (không được cache)
     """
+    from .routing_backends import get_routing_backend
+    from .routing_client import RoutingUnavailable
+    
+    profile = get_profile(vehicle_type)
+    
+    def fetch():
+        return fetch_route(profile, start_lat, start_lng, end_lat, end_lng, timeout)
+    
     try:
-        # Map vehicle types to OSRM profiles
-        vehicle_profiles = {
-            'driving': 'driving',      # Ô tô
-            'car': 'driving',          # Ô tô (alias)
-            'motorcycle': 'driving',   # Xe máy (dùng driving profile nhưng sẽ điều chỉnh)
-            'motorbike': 'driving',    # Xe máy (alias)
-            'bicycle': 'bicycle',      # Xe đạp
-            'bike': 'bicycle',         # Xe đạp (alias)
-            'foot': 'foot',           # Đi bộ
-            'walking': 'foot'         # Đi bộ (alias)
-        }
-        
-        profile = vehicle_profiles.get(vehicle_type, 'driving')
-        
-        # OSRM API endpoint (public server)
-        # Format: lon,lat (NOT lat,lon!)
-        url = f"http://router.project-osrm.org/route/v1/{profile}/{start_lng},{start_lat};{end_lng},{end_lat}"
-        
-        params = {
-            'overview': 'full',        # Get full route geometry
-            'geometries': 'geojson'    # Return as GeoJSON
+        if use_cache:
+            from .route_cache import get_route_cache
+            
+            cache = get_route_cache()
+            # Mỗi backend cho kết quả khác nhau nên key gồm cả tên backend
+            key = cache.make_key(f"{get_routing_backend().name}:{profile}", start_lat, start_lng, end_lat, end_lng)
+            route = cache.get_or_fetch(key, fetch)
+        else:
+            route = fetch()
+    except RoutingUnavailable:
+        return straight_line_route(start_lat, start_lng, end_lat, end_lng, vehicle_type)
+    
+    if not route:
+        return None
+    
+    # Luôn trả về dict mới để caller có thể sửa mà không ảnh hưởng cache
+    return {
+        'distance_km': route['distance_km'],
+        'duration_min': adjust_duration(route['duration_min'], route['distance_km'], vehicle_type),
+        'geometry': route['geometry'],
+        'vehicle_type': vehicle_type,
+        'is_estimate': False
+    }
+
+
+def get_road_routes(pairs, vehicle_type='driving', request_timeout=None, total_timeout=None):
+    """
+    Lấy nhiều route song song (xem gis_tools.routing_executor)
+    
+    Args:
+        pairs: List ((start_lat, start_lng), (end_lat, end_lng))
+        vehicle_type: Loại phương tiện
+        request_timeout: Deadline cho mỗi route (seconds)
+        total_timeout: Tổng thời gian chờ cho cả lô (seconds)
+    
+    Returns:
+        List kết quả như get_road_route, cùng thứ tự với pairs.
+        Route lỗi hoặc chưa xong khi hết total_timeout là None
+    """
+    from .routing_executor import get_routing_executor
+    
+    return get_routing_executor().road_routes(
+        pairs, vehicle_type=vehicle_type,
+        request_timeout=request_timeout, total_timeout=total_timeout
+    )
+
+
+def _table_tile_size(source_count, destination_count, max_coordinates):
+    """
+    Kích thước ô (số sources, số destinations) cho mỗi lần gọi table()
+    
+    Destinations được giữ nguyên trong một ô nếu còn chỗ cho sources; nếu không,
+    mỗi bên được tối thiểu một nửa giới hạn để số request ít nhất có thể
+    """
+    max_coordinates = max(max_coordinates, 2)
+    if source_count + destination_count <= max_coordinates:
+        return source_count, destination_count
+    
+    destination_size = min(destination_count, max_coordinates - min(source_count, max_coordinates // 2))
+    return max_coordinates - destination_size, destination_size
+
+
+def get_distance_matrix(sources, destinations, vehicle_type='driving', timeout=10):
+    """
+    Lấy ma trận khoảng cách/thời gian đường bộ (OSRM Table API hoặc router offline)
+    (một request cho tất cả các cặp thay vì một request /route cho mỗi cặp)
+    
+    Args:
+        sources (list): Danh sách (lat, lng) điểm xuất phát
+        destinations (list): Danh sách (lat, lng) điểm đến
+        vehicle_type (str): Loại phương tiện ('driving', 'motorcycle', 'bicycle', 'foot')
+        timeout (int): Timeout cho mỗi API call (seconds)
+    
+    Returns:
+        dict: {
+            'distances_km': [[float | None]],   # [source][destination]
+            'durations_min': [[float | None]],  # [source][destination]
+            'is_estimate': bool,                # True khi backend bị ngắt mạch
         }
+        None nếu không gọi được backend
         
-        response = requests.get(url, params=params, timeout=timeout)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data.get('code') == 'Ok' and data.get('routes'):
-            route = data['routes'][0]
-            
-            distance_km = route['distance'] / 1000  # meters → km
-            duration_min = route['duration'] / 60   # seconds → minutes
-            
-            # Điều chỉnh thời gian cho xe máy (nhanh hơn ô tô trong thành phố)
-            if vehicle_type in ['motorcycle', 'motorbike']:
-                # Xe máy nhanh hơn 20-30% trong thành phố
-                if distance_km <= 20:  # Trong thành phố
-                    duration_min *= 0.75  # Giảm 25% thời gian
-                elif distance_km <= 50:  # Ngoại thành
-                    duration_min *= 0.85  # Giảm 15% thời gian
-                # Đường dài giữ nguyên vì xe máy không nhanh hơn trên cao tốc
+    Nếu số tọa độ vượt quá giới hạn của backend (table_max_coordinates), ma
+    trận được chia thành các ô sources × destinations sao cho mỗi request có
+    tổng số tọa độ không quá giới hạn (số request không phụ thuộc vào số cặp
+    tính theo từng /route).
+    """
+    from .routing_backends import get_routing_backend
+    from .routing_client import RoutingUnavailable
+    
+    if not sources or not destinations:
+        return {'distances_km': [], 'durations_min': [], 'is_estimate': False}
+    
+    sources = list(sources)
+    destinations = list(destinations)
+    profile = get_profile(vehicle_type)
+    backend = get_routing_backend()
+    source_size, destination_size = _table_tile_size(len(sources), len(destinations), backend.table_max_coordinates)
+    
+    distances_km = [[] for _ in sources]
+    durations_min = [[] for _ in sources]
+    
+    for source_offset in range(0, len(sources), source_size):
+        source_batch = sources[source_offset:source_offset + source_size]
+        for destination_offset in range(0, len(destinations), destination_size):
+            destination_batch = destinations[destination_offset:destination_offset + destination_size]
             
-            return {
-                'distance_km': distance_km,
-                'duration_min': duration_min,
-                'geometry': route['geometry'],
-                'vehicle_type': vehicle_type
-            }
-        else:
-            logger.warning(f"OSRM returned non-Ok status: {data.get('code')}")
-            return None
+            try:
+                matrix = backend.table(profile, source_batch, destination_batch, timeout=timeout)
+            except RoutingUnavailable:
+                return straight_line_matrix(sources, destinations, vehicle_type)
+            if matrix is None:
+                return None
             
-    except requests.Timeout:
-        logger.error(f"OSRM API timeout after {timeout}s")
-        return None
-    except requests.RequestException as e:
-        logger.error(f"OSRM API error: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error in get_road_route: {e}")
-        return None
+            for i, (distance_row, duration_row) in enumerate(zip(matrix['distances_km'], matrix['durations_min'])):
+                distances_km[source_offset + i].extend(distance_row)
+                durations_min[source_offset + i].extend(
+                    adjust_duration(t, d, vehicle_type) if t is not None and d is not None else None
+                    for t, d in zip(duration_row, distance_row)
+                )
+    
+    return {
+        'distances_km': distances_km,
+        'durations_min': durations_min,
+        'is_estimate': False,
+    }
+
+
+def straight_line_matrix(sources, destinations, vehicle_type='driving'):
+    """Ma trận ước lượng theo đường chim bay (cùng định dạng get_distance_matrix)"""
+    from .distance import distance_matrix
+    
+    distances = distance_matrix(sources, destinations).tolist()
+    speed = ESTIMATED_SPEED_KMH[get_profile(vehicle_type)]
+    return {
+        'distances_km': distances,
+        'durations_min': [
+            [adjust_duration(d / speed * 60, d, vehicle_type) for d in row]
+            for row in distances
+        ],
+        'is_estimate': True,
+    }
 
 
 def calculate_shipping_fee(distance_km, base_fee=15000, per_km_fee=5000):
@@ -0,0 +1,432 @@
+"""
+Routing Backends
+Tách phần tính đường đi khỏi OSRM public server:
+
+    - 'osrm_public': OSRM public server (router.project-osrm.org) - mặc định
+    - 'osrm': OSRM tự host (ROUTING['OSRM_URL'])
+    - 'offline': Router offline chạy A* trên road graph nạp từ file .npz
+      (tạo bằng `python manage.py build_road_graph <extract.osm>`)
+    - Hoặc dotted path tới class kế thừa BaseRoutingBackend
+
+Mọi backend trả về kết quả theo profile gốc (chưa điều chỉnh cho xe máy):
+    route() -> {'distance_km', 'duration_min', 'geometry'} | None
+    table() -> {'distances_km': [[...]], 'durations_min': [[...]]} | None
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.utils.module_loading import import_string
+
+from .routing import OSRM_PUBLIC_URL, get_routing_settings
+from .routing_client import OSRMClient, RoutingUnavailable
+from .spatial_index import SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+
+class BaseRoutingBackend(ABC):
+    """Interface chung cho routing backend"""
+
+    name = 'base'
+
+    # Số tọa độ tối đa cho một lần gọi table()
+    table_max_coordinates = 100
+
+    @abstractmethod
+    def route(self, profile, start_lat, start_lng, end_lat, end_lng, timeout=5):
+        pass
+
+    @abstractmethod
+    def table(self, profile, sources, destinations, timeout=10):
+        pass
+
+
+class OSRMBackend(BaseRoutingBackend):
+    """OSRM HTTP API (tự host)"""
+
+    name = 'osrm'
+
+    def __init__(self, base_url, pool_size=8, failure_threshold=5, recovery_timeout=30,
+                 table_max_coordinates=None, **options):
+        self.client = OSRMClient(
+            base_url=base_url,
+            pool_size=pool_size,
+            failure_threshold=failure_threshold,
+            recovery_timeout=recovery_timeout,
+        )
+        if table_max_coordinates:
+            self.table_max_coordinates = table_max_coordinates
+
+    def route(self, profile, start_lat, start_lng, end_lat, end_lng, timeout=5):
+        params = {
+            'overview': 'full',        # Get full route geometry
+            'geometries': 'geojson'    # Return as GeoJSON
+        }
+
+        data = self.client.get(
+            'route', profile, [(start_lat, start_lng), (end_lat, end_lng)],
+            params=params, timeout=timeout
+        )
+        if data is None:
+            return None
+
+        if data.get('code') == 'Ok' and data.get('routes'):
+            route = data['routes'][0]
+
+            return {
+                'distance_km': route['distance'] / 1000,  # meters → km
+                'duration_min': route['duration'] / 60,   # seconds → minutes
+                'geometry': route['geometry'],
+            }
+
+        logger.warning(f"OSRM returned non-Ok status: {data.get('code')}")
+        return None
+
+    def table(self, profile, sources, destinations, timeout=10):
+        params = {
+            'sources': ';'.join(str(i) for i in range(len(sources))),
+            'destinations': ';'.join(str(len(sources) + i) for i in range(len(destinations))),
+            'annotations': 'distance,duration'
+        }
+
+        data = self.client.get('table', profile, list(sources) + list(destinations), params=params, timeout=timeout)
+        if data is None:
+            return None
+
+        if data.get('code') != 'Ok' or 'distances' not in data:
+            logger.warning(f"OSRM Table returned non-Ok status: {data.get('code')}")
+            return None
+
+        return {
+            'distances_km': [[d / 1000 if d is not None else None for d in row] for row in data['distances']],
+            'durations_min': [[t / 60 if t is not None else None for t in row] for row in data['durations']],
+        }
+
+
+class PublicOSRMBackend(OSRMBackend):
+    """OSRM public demo server - giới hạn 100 tọa độ cho /table"""
+
+    name = 'osrm_public'
+
+    def __init__(self, base_url=None, **options):
+        options.pop('table_max_coordinates', None)
+        super().__init__(OSRM_PUBLIC_URL, **options)
+
+
+class SearchTimeout(Exception):
+    """Tìm đường trên road graph vượt quá deadline"""
+
+
+class RoadGraph:
+    """
+    Road graph dạng CSR (compressed sparse row) nạp từ file .npz
+
+    Các mảng trong file:
+        node_lat, node_lng: tọa độ node
+        indptr: cạnh đi ra của node i nằm trong [indptr[i], indptr[i + 1])
+        indices: node đích của cạnh
+        distance_m: chiều dài cạnh (mét)
+        duration_s: thời gian đi qua cạnh (giây)
+        max_speed_kmh: tốc độ lớn nhất trong graph (dùng cho heuristic A*)
+
+    astar()/many_to_one() nhận deadline (time.monotonic()) và dừng với
+    SearchTimeout khi tìm quá hạn
+    """
+
+    # Số node được chốt giữa hai lần kiểm tra deadline
+    DEADLINE_CHECK_INTERVAL = 1024
+
+    def __init__(self, node_lat, node_lng, indptr, indices, distance_m, duration_s, max_speed_kmh):
+        self.node_lat = node_lat
+        self.node_lng = node_lng
+        self.indptr = indptr
+        self.indices = indices
+        self.distance_m = distance_m
+        self.duration_s = duration_s
+        self.max_speed_ms = float(max_speed_kmh) / 3.6
+
+        self._reverse = None
+        self._index = SpatialIndex()
+        self._index.build((i, lat, lng) for i, (lat, lng) in enumerate(zip(self.node_lat, self.node_lng)))
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+
+        with np.load(path) as data:
+            # tolist(): truy cập từng phần tử của list Python nhanh hơn numpy scalar
+            return cls(
+                data['node_lat'].tolist(), data['node_lng'].tolist(),
+                data['indptr'].tolist(), data['indices'].tolist(),
+                data['distance_m'].tolist(), data['duration_s'].tolist(),
+                float(data['max_speed_kmh']),
+            )
+
+    def __len__(self):
+        return len(self.node_lat)
+
+    def snap(self, latitude, longitude):
+        """Tìm node gần nhất, trả về (node, khoảng cách km) hoặc (None, None)"""
+        nearest = self._index.nearest(latitude, longitude, k=1)
+        if not nearest:
+            return None, None
+        return nearest[0]
+
+    def _straight_m(self, a, b):
+        lat1, lng1 = math.radians(self.node_lat[a]), math.radians(self.node_lng[a])
+        lat2, lng2 = math.radians(self.node_lat[b]), math.radians(self.node_lng[b])
+        x = (lng2 - lng1) * math.cos((lat1 + lat2) / 2)
+        y = lat2 - lat1
+        # Equirectangular luôn >= great-circle một chút ở khoảng cách ngắn,
+        # nhân 0.99 để heuristic vẫn admissible
+        return 0.99 * 6371000 * math.sqrt(x * x + y * y)
+
+    def reverse(self):
+        """
+        Graph ngược (CSR) dùng cho truy vấn nhiều nguồn → một đích
+
+        Returns:
+            (indptr, origin, edges): cạnh ngược thứ i của node v nằm trong
+            [indptr[v], indptr[v + 1]), đi từ origin[i] và dùng cạnh xuôi edges[i]
+        """
+        if self._reverse is None:
+            count = len(self)
+            incoming = [[] for _ in range(count)]
+            for u in range(count):
+                for e in range(self.indptr[u], self.indptr[u + 1]):
+                    incoming[self.indices[e]].append((u, e))
+
+            indptr = [0]
+            origin = []
+            edges = []
+            for v in range(count):
+                for u, e in incoming[v]:
+                    origin.append(u)
+                    edges.append(e)
+                indptr.append(len(edges))
+            self._reverse = (indptr, origin, edges)
+        return self._reverse
+
+    def _check_deadline(self, deadline, expanded):
+        if deadline is not None and expanded % self.DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+            raise SearchTimeout(f"Road graph search expired after {expanded} nodes")
+
+    def astar(self, source, target, deadline=None):
+        """
+        A* theo thời gian di chuyển
+
+        Returns:
+            (path, distance_m, duration_s) hoặc None nếu không có đường
+        """
+        if source == target:
+            return [source], 0.0, 0.0
+
+        best = {source: 0.0}
+        distance = {source: 0.0}
+        parent = {source: None}
+        heap = [(self._straight_m(source, target) / self.max_speed_ms, source)]
+        closed = set()
+
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == target:
+                break
+            closed.add(u)
+            self._check_deadline(deadline, len(closed))
+            base = best[u]
+            for e in range(self.indptr[u], self.indptr[u + 1]):
+                v = self.indices[e]
+                cost = base + self.duration_s[e]
+                if cost < best.get(v, math.inf):
+                    best[v] = cost
+                    distance[v] = distance[u] + self.distance_m[e]
+                    parent[v] = u
+                    heapq.heappush(heap, (cost + self._straight_m(v, target) / self.max_speed_ms, v))
+        else:
+            return None
+
+        path = []
+        node = target
+        while node is not None:
+            path.append(node)
+            node = parent[node]
+        path.reverse()
+        return path, distance[target], best[target]
+
+    def many_to_one(self, sources, target, deadline=None):
+        """
+        Dijkstra trên graph ngược từ target, dừng khi đã chốt hết sources
+
+        Returns:
+            dict node → (distance_m, duration_s) cho các source tới được
+        """
+        indptr, origin, edges = self.reverse()
+        pending = set(sources)
+        best = {target: 0.0}
+        distance = {target: 0.0}
+        heap = [(0.0, target)]
+        settled = {}
+
+        while heap and pending:
+            cost, v = heapq.heappop(heap)
+            if v in settled:
+                continue
+            settled[v] = (distance[v], cost)
+            pending.discard(v)
+            self._check_deadline(deadline, len(settled))
+            for i in range(indptr[v], indptr[v + 1]):
+                e = edges[i]
+                u = origin[i]
+                new_cost = cost + self.duration_s[e]
+                if new_cost < best.get(u, math.inf):
+                    best[u] = new_cost
+                    distance[u] = distance[v] + self.distance_m[e]
+                    heapq.heappush(heap, (new_cost, u))
+
+        return {node: settled[node] for node in sources if node in settled}
+
+
+class OfflineGraphBackend(BaseRoutingBackend):
+    """
+    Router offline: A* trên road graph nạp vào bộ nhớ, không cần mạng
+
+    Đoạn từ điểm thật tới node gần nhất được tính theo đường chim bay
+    với tốc độ SNAP_SPEED_KMH. Graph chưa cấu hình hoặc không đọc được thì
+    raise RoutingUnavailable (caller dùng ước lượng đường chim bay); tìm
+    đường quá timeout thì trả về None như khi OSRM timeout.
+    """
+
+    name = 'offline'
+    table_max_coordinates = 10000
+
+    SNAP_SPEED_KMH = 15
+
+    def __init__(self, graph_paths=None, graph_path=None, **options):
+        # graph_paths: {'driving': path, 'foot': path, ...}; graph_path dùng cho mọi profile
+        self.graph_paths = dict(graph_paths or {})
+        if graph_path:
+            self.graph_paths.setdefault('driving', graph_path)
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def get_graph(self, profile):
+        path = self.graph_paths.get(profile) or self.graph_paths.get('driving')
+        if not path:
+            raise RoutingUnavailable("ROUTING['GRAPH_PATH'] is not configured for the offline router")
+        with self._lock:
+            if path not in self._graphs:
+                logger.info(f"Loading road graph {path}")
+                try:
+                    self._graphs[path] = RoadGraph.load(path)
+                except Exception as e:
+                    logger.error(f"Could not load road graph {path}: {e}")
+                    raise RoutingUnavailable(f"Road graph {path} could not be loaded") from e
+            return self._graphs[path]
+
+    def _snap_leg(self, snap_km):
+        return snap_km, snap_km / self.SNAP_SPEED_KMH * 60
+
+    def route(self, profile, start_lat, start_lng, end_lat, end_lng, timeout=5):
+        graph = self.get_graph(profile)
+        source, source_km = graph.snap(start_lat, start_lng)
+        target, target_km = graph.snap(end_lat, end_lng)
+        if source is None or target is None:
+            return None
+
+        try:
+            result = graph.astar(source, target, deadline=time.monotonic() + timeout)
+        except SearchTimeout as e:
+            logger.error(f"Offline route timeout after {timeout}s: {e}")
+            return None
+        if result is None:
+            return None
+        path, distance_m, duration_s = result
+
+        snap_km, snap_min = self._snap_leg(source_km + target_km)
+        coordinates = [[start_lng, start_lat]]
+        coordinates += [[graph.node_lng[n], graph.node_lat[n]] for n in path]
+        coordinates.append([end_lng, end_lat])
+
+        return {
+            'distance_km': distance_m / 1000 + snap_km,
+            'duration_min': duration_s / 60 + snap_min,
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+        }
+
+    def table(self, profile, sources, destinations, timeout=10):
+        graph = self.get_graph(profile)
+        snapped_sources = [graph.snap(lat, lng) for lat, lng in sources]
+        distances = [[None] * len(destinations) for _ in sources]
+        durations = [[None] * len(destinations) for _ in sources]
+        deadline = time.monotonic() + timeout
+
+        for j, (lat, lng) in enumerate(destinations):
+            target, target_km = graph.snap(lat, lng)
+            if target is None:
+                continue
+            try:
+                reached = graph.many_to_one(
+                    {node for node, _ in snapped_sources if node is not None}, target, deadline=deadline
+                )
+            except SearchTimeout as e:
+                logger.error(f"Offline table timeout after {timeout}s: {e}")
+                return None
+            for i, (node, source_km) in enumerate(snapped_sources):
+                if node not in reached:
+                    continue
+                distance_m, duration_s = reached[node]
+                snap_km, snap_min = self._snap_leg(source_km + target_km)
+                distances[i][j] = distance_m / 1000 + snap_km
+                durations[i][j] = duration_s / 60 + snap_min
+
+        return {'distances_km': distances, 'durations_min': durations}
+
+
+ROUTING_BACKENDS = {
+    'osrm_public': PublicOSRMBackend,
+    'osrm': OSRMBackend,
+    'offline': OfflineGraphBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def build_routing_backend(config=None):
+    """Tạo routing backend từ settings.ROUTING"""
+    config = config if config is not None else get_routing_settings()
+    backend = config['BACKEND']
+    backend_class = ROUTING_BACKENDS.get(backend) or import_string(backend)
+
+    return backend_class(
+        base_url=config['OSRM_URL'],
+        pool_size=config['MAX_WORKERS'],
+        failure_threshold=config['FAILURE_THRESHOLD'],
+        recovery_timeout=config['RECOVERY_TIMEOUT'],
+        table_max_coordinates=config['TABLE_MAX_COORDINATES'],
+        graph_path=config['GRAPH_PATH'],
+        graph_paths=config['GRAPH_PATHS'],
+    )
+
+
+def get_routing_backend():
+    """Routing backend dùng chung trong process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_routing_backend()
+    return _backend
+
+
+def reset_routing_backend():
+    """Bỏ backend hiện tại (vd: sau khi đổi settings)"""
+    global _backend
+    with _backend_lock:
+        _backend = None
@@ -0,0 +1,156 @@
+"""
+OSRM Routing Client
+Giữ connection pool keep-alive (requests.Session) và circuit breaker:
+khi OSRM lỗi liên tục thì ngắt mạch, trả lỗi ngay (RoutingUnavailable) để
+caller dùng khoảng cách đường chim bay thay vì chờ hết timeout mỗi lần.
+
+Mỗi OSRM backend (gis_tools.routing_backends) giữ một client riêng.
+Cấu hình trong settings.ROUTING:
+    'FAILURE_THRESHOLD': 5,   # Số lỗi liên tiếp để ngắt mạch
+    'RECOVERY_TIMEOUT': 30,   # Sau bao lâu (giây) thì cho 1 request thử lại
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .routing import OSRM_PUBLIC_URL
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingUnavailable(Exception):
+    """Routing server đang bị ngắt mạch (circuit open)"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker 3 trạng thái
+
+    - closed: cho phép mọi request, đếm lỗi liên tiếp
+    - open: từ chối ngay mọi request trong recovery_timeout giây
+    - half_open: cho đúng 1 request thử; thành công → closed, lỗi → open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30, name='osrm'):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """True nếu request được phép gửi đi"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # half_open: chỉ một request thử tại một thời điểm
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed - routing server recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit '{self.name}' opened after {self._failures} failures, "
+                        f"retry in {self.recovery_timeout}s"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+
+class OSRMClient:
+    """
+    HTTP client cho OSRM dùng chung connection pool và circuit breaker
+    """
+
+    def __init__(self, base_url=OSRM_PUBLIC_URL, pool_size=8, failure_threshold=5, recovery_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout, name=self.base_url)
+
+    def get(self, service, profile, coordinates, params=None, timeout=5):
+        """
+        Gọi OSRM service ('route', 'table', ...)
+
+        Args:
+            coordinates: List (lat, lng)
+
+        Returns:
+            dict JSON của OSRM (có thể có code != 'Ok'), None nếu request lỗi
+
+        Raises:
+            RoutingUnavailable: circuit đang mở, không gửi request
+        """
+        if not self.breaker.allow_request():
+            raise RoutingUnavailable(f"Routing server {self.base_url} is unavailable (circuit open)")
+
+        # Format: lon,lat (NOT lat,lon!)
+        coords = ';'.join(f"{lng},{lat}" for lat, lng in coordinates)
+        url = f"{self.base_url}/{service}/v1/{profile}/{coords}"
+
+        try:
+            response = self.session.get(url, params=params, timeout=timeout)
+            if response.status_code >= 500:
+                raise requests.HTTPError(f"{response.status_code} Server Error", response=response)
+            data = response.json()
+        except requests.Timeout:
+            self.breaker.record_failure()
+            logger.error(f"OSRM {service} timeout after {timeout}s")
+            return None
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            logger.error(f"OSRM {service} error: {e}")
+            return None
+        except ValueError as e:
+            self.breaker.record_failure()
+            logger.error(f"OSRM {service} invalid response: {e}")
+            return None
+
+        # Server trả lời được (kể cả NoRoute/4xx) nghĩa là server vẫn sống
+        self.breaker.record_success()
+        return data
+
@@ -0,0 +1,117 @@
+"""
+Routing Executor - gọi nhiều route OSRM song song
+Giới hạn số luồng, có deadline cho từng request và tổng thời gian cho cả lô.
+Route nào quá hạn thì trả về None (kết quả một phần) thay vì chặn cả request.
+
+Cấu hình trong settings.ROUTING:
+    'MAX_WORKERS': 8,       # Số route chạy song song tối đa (toàn process)
+    'REQUEST_TIMEOUT': 5,   # Deadline cho mỗi route (giây)
+    'TOTAL_TIMEOUT': 8,     # Tổng thời gian chờ cho một lô route (giây)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import connections
+
+from .routing import DEFAULT_ROUTING, get_road_route, get_routing_settings
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingExecutor:
+    """
+    Thread pool dùng chung để gọi routing song song
+
+    Số luồng bị giới hạn cho toàn process nên nhiều request đồng thời
+    không làm quá tải OSRM server.
+    """
+
+    def __init__(self, max_workers=DEFAULT_ROUTING['MAX_WORKERS'],
+                 request_timeout=DEFAULT_ROUTING['REQUEST_TIMEOUT'],
+                 total_timeout=DEFAULT_ROUTING['TOTAL_TIMEOUT']):
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.total_timeout = total_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='routing')
+
+    @staticmethod
+    def _run(func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Routing task error: {e}")
+            return None
+        finally:
+            # Route cache 'database' mở connection trong thread worker
+            connections.close_all()
+
+    def map(self, func, calls, total_timeout=None):
+        """
+        Chạy func(*args, **kwargs) cho mỗi phần tử (args, kwargs) trong calls
+
+        Returns:
+            (results, timed_out): results cùng thứ tự với calls, None với
+            các lời gọi lỗi hoặc chưa xong khi hết total_timeout
+        """
+        calls = list(calls)
+        if not calls:
+            return [], 0
+
+        if total_timeout is None:
+            total_timeout = self.total_timeout
+
+        futures = [self._pool.submit(self._run, func, args, kwargs) for args, kwargs in calls]
+        done, not_done = wait(futures, timeout=total_timeout)
+
+        for future in not_done:
+            # Route đang chạy vẫn tiếp tục ở background (và vẫn được ghi vào cache)
+            future.cancel()
+        if not_done:
+            logger.warning(f"Routing budget {total_timeout}s exceeded: {len(not_done)}/{len(calls)} routes timed out")
+
+        results = [future.result() if future in done else None for future in futures]
+        return results, len(not_done)
+
+    def road_routes(self, pairs, vehicle_type='driving', request_timeout=None, total_timeout=None):
+        """
+        Lấy nhiều route song song
+
+        Args:
+            pairs: List ((start_lat, start_lng), (end_lat, end_lng))
+            vehicle_type: Loại phương tiện
+            request_timeout: Deadline mỗi route (mặc định ROUTING['REQUEST_TIMEOUT'])
+            total_timeout: Tổng thời gian chờ (mặc định ROUTING['TOTAL_TIMEOUT'])
+
+        Returns:
+            List kết quả get_road_route (None nếu lỗi/quá hạn), cùng thứ tự với pairs
+        """
+        timeout = request_timeout if request_timeout is not None else self.request_timeout
+        calls = [
+            ((start[0], start[1], end[0], end[1]), {'vehicle_type': vehicle_type, 'timeout': timeout})
+            for start, end in pairs
+        ]
+        results, _ = self.map(get_road_route, calls, total_timeout)
+        return results
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_routing_executor():
+    """Routing executor dùng chung trong process"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                config = get_routing_settings()
+                _executor = RoutingExecutor(
+                    max_workers=config['MAX_WORKERS'],
+                    request_timeout=config['REQUEST_TIMEOUT'],
+                    total_timeout=config['TOTAL_TIMEOUT'],
+                )
+    return _executor
@@ -0,0 +1,52 @@
+"""
+Signal handlers cho GIS Tools
+Giữ các index/cache trong bộ nhớ đồng bộ với database
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from food_store.models import Farm, DeliveryZone, Order
+from .spatial_index import farm_index
+from .zone_index import delivery_zone_index
+from .geojson_cache import invalidate_delivery_zones_geojson
+from .map_cache import bump_data_version
+
+
+@receiver(post_save, sender=Farm)
+def update_farm_index(sender, instance, **kwargs):
+    """Cập nhật spatial index khi cửa hàng được thêm/sửa"""
+    farm_index.update_farm(instance)
+
+
+@receiver(post_delete, sender=Farm)
+def remove_from_farm_index(sender, instance, **kwargs):
+    """Xóa cửa hàng khỏi spatial index"""
+    farm_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def invalidate_delivery_zone_index(sender, instance, **kwargs):
+    """Nạp lại polygon và GeoJSON khu vực giao hàng ở lần truy cập tiếp theo"""
+    delivery_zone_index.invalidate()
+    invalidate_delivery_zones_geojson()
+
+
+@receiver(post_save, sender=Farm)
+@receiver(post_delete, sender=Farm)
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def bump_map_data_version(sender, instance, **kwargs):
+    """Các bản đồ Folium phụ thuộc model này sẽ render lại"""
+    bump_data_version(sender._meta.model_name)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_order_map_version(sender, instance, **kwargs):
+    """
+    Bản đồ nhiệt/vector tile đơn hàng dùng phiên bản chung 'order', bản đồ
+    theo dõi chỉ render lại khi chính đơn hàng đó thay đổi
+    """
+    bump_data_version('order')
+    bump_data_version(f'order:{instance.pk}')
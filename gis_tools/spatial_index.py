@@ -0,0 +1,282 @@
+"""
+Spatial Index cho tọa độ cửa hàng
+KD-tree trên vector đơn vị (x, y, z) của mặt cầu - tìm k cửa hàng gần nhất
+và tìm theo bán kính mà không phải quét toàn bộ bảng Farm
+"""
+import heapq
+import math
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371
+MAX_INSERTS_BEFORE_REBUILD = 256
+
+
+def to_unit_vector(latitude, longitude):
+    """Chuyển (lat, lng) sang vector đơn vị 3D trên mặt cầu"""
+    lat = math.radians(latitude)
+    lng = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat))
+
+
+def km_to_chord(distance_km):
+    """
+    Đổi khoảng cách trên mặt cầu (km) sang độ dài dây cung trên mặt cầu đơn vị.
+    Dây cung đơn điệu theo khoảng cách Haversine nên có thể so sánh trực tiếp.
+    """
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+def chord_to_km(chord):
+    """Đổi độ dài dây cung (mặt cầu đơn vị) về khoảng cách km"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def _squared_chord(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class _KDNode:
+    __slots__ = ('vector', 'key', 'axis', 'left', 'right', 'alive')
+
+    def __init__(self, vector, key, axis):
+        self.vector = vector
+        self.key = key
+        self.axis = axis
+        self.left = None
+        self.right = None
+        self.alive = True
+
+
+class SpatialIndex:
+    """
+    KD-tree 3 chiều hỗ trợ cập nhật tăng dần
+
+    - insert/update: chèn node mới vào lá, node cũ (nếu có) bị đánh dấu đã xóa
+    - remove: đánh dấu đã xóa (tombstone)
+    - Tự build lại cây cân bằng khi số node chết hoặc số lần chèn
+      vượt quá một nửa số điểm còn sống (số lần chèn tối đa 256)
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._root = None
+        self._nodes = {}
+        self._dead = 0
+        self._inserts_since_build = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, key):
+        return key in self._nodes
+
+    def build(self, items):
+        """
+        Build lại toàn bộ cây từ danh sách (key, latitude, longitude)
+        """
+        points = [(to_unit_vector(lat, lng), key) for key, lat, lng in items]
+        with self._lock:
+            self._nodes = {}
+            self._root = self._build(points, 0)
+            self._dead = 0
+            self._inserts_since_build = 0
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        median = len(points) // 2
+        vector, key = points[median]
+        node = _KDNode(vector, key, axis)
+        self._nodes[key] = node
+        node.left = self._build(points[:median], depth + 1)
+        node.right = self._build(points[median + 1:], depth + 1)
+        return node
+
+    def _rebuild(self):
+        items = [(node.vector, key) for key, node in self._nodes.items()]
+        self._nodes = {}
+        self._root = self._build(items, 0)
+        self._dead = 0
+        self._inserts_since_build = 0
+
+    def _maybe_rebuild(self):
+        alive = len(self._nodes)
+        threshold = max(alive, 16) // 2
+        # Giới hạn số lần chèn để độ sâu cây (và đệ quy khi truy vấn) luôn nhỏ
+        if self._dead > threshold or self._inserts_since_build > min(threshold, MAX_INSERTS_BEFORE_REBUILD):
+            self._rebuild()
+
+    def insert(self, key, latitude, longitude):
+        """Thêm hoặc cập nhật một điểm"""
+        vector = to_unit_vector(latitude, longitude)
+        with self._lock:
+            old = self._nodes.pop(key, None)
+            if old is not None:
+                if old.vector == vector:
+                    self._nodes[key] = old
+                    return
+                old.alive = False
+                self._dead += 1
+
+            if self._root is None:
+                node = _KDNode(vector, key, 0)
+                self._root = node
+            else:
+                parent = self._root
+                while True:
+                    branch = 'left' if vector[parent.axis] < parent.vector[parent.axis] else 'right'
+                    child = getattr(parent, branch)
+                    if child is None:
+                        node = _KDNode(vector, key, (parent.axis + 1) % 3)
+                        setattr(parent, branch, node)
+                        break
+                    parent = child
+
+            self._nodes[key] = node
+            self._inserts_since_build += 1
+            self._maybe_rebuild()
+
+    def remove(self, key):
+        """Xóa một điểm khỏi index (không lỗi nếu không tồn tại)"""
+        with self._lock:
+            node = self._nodes.pop(key, None)
+            if node is None:
+                return
+            node.alive = False
+            self._dead += 1
+            self._maybe_rebuild()
+
+    def nearest(self, latitude, longitude, k=1, max_distance_km=None):
+        """
+        Tìm k điểm gần nhất
+
+        Returns:
+            List (key, distance_km) sắp xếp theo khoảng cách tăng dần
+        """
+        if k <= 0:
+            return []
+        target = to_unit_vector(latitude, longitude)
+        bound = km_to_chord(max_distance_km) ** 2 if max_distance_km is not None else float('inf')
+        # Max-heap theo khoảng cách (lưu giá trị âm)
+        best = []
+
+        def search(node):
+            if node is None:
+                return
+            if node.alive:
+                d2 = _squared_chord(target, node.vector)
+                if d2 <= bound:
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, id(node), node.key))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, id(node), node.key))
+
+            diff = target[node.axis] - node.vector[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            search(near)
+            worst = -best[0][0] if len(best) == k else bound
+            if diff * diff <= worst:
+                search(far)
+
+        with self._lock:
+            search(self._root)
+
+        results = sorted((-neg_d2, key) for neg_d2, _, key in best)
+        return [(key, chord_to_km(math.sqrt(d2))) for d2, key in results]
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """
+        Tìm tất cả điểm trong bán kính radius_km
+
+        Returns:
+            List (key, distance_km) sắp xếp theo khoảng cách tăng dần
+        """
+        target = to_unit_vector(latitude, longitude)
+        bound = km_to_chord(radius_km) ** 2
+        found = []
+
+        with self._lock:
+            stack = [self._root]
+            while stack:
+                node = stack.pop()
+                if node is None:
+                    continue
+                if node.alive:
+                    d2 = _squared_chord(target, node.vector)
+                    if d2 <= bound:
+                        found.append((d2, node.key))
+
+                diff = target[node.axis] - node.vector[node.axis]
+                near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+                stack.append(near)
+                if diff * diff <= bound:
+                    stack.append(far)
+
+        found.sort()
+        return [(key, chord_to_km(math.sqrt(d2))) for d2, key in found]
+
+
+class FarmSpatialIndex(SpatialIndex):
+    """
+    Spatial index cho bảng Farm (một instance trên mỗi process)
+
+    Nạp lười (lazy) ở lần truy vấn đầu tiên, cập nhật tăng dần qua signal
+    post_save/post_delete của Farm (xem gis_tools.signals). Với nhiều worker,
+    signal chỉ chạy trong process đã lưu Farm nên index tự nạp lại sau
+    `max_age` giây để các worker khác không bị lệch dữ liệu quá lâu.
+    """
+
+    def __init__(self, max_age=300):
+        super().__init__()
+        self.max_age = max_age
+        self._loaded_at = None
+
+    def load(self):
+        """Nạp lại toàn bộ tọa độ cửa hàng từ database"""
+        from food_store.models import Farm
+
+        items = Farm.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).values_list('id', 'latitude', 'longitude')
+        self.build(list(items))
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Bắt buộc nạp lại ở lần truy vấn tiếp theo"""
+        with self._lock:
+            self._loaded_at = None
+
+    @property
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+                self.load()
+
+    def update_farm(self, farm):
+        """Cập nhật index khi Farm được lưu"""
+        if not self.is_loaded:
+            return
+        if farm.latitude is None or farm.longitude is None:
+            self.remove(farm.pk)
+        else:
+            self.insert(farm.pk, farm.latitude, farm.longitude)
+
+    def nearest(self, latitude, longitude, k=1, max_distance_km=None):
+        self.ensure_loaded()
+        return super().nearest(latitude, longitude, k, max_distance_km)
+
+    def within_radius(self, latitude, longitude, radius_km):
+        self.ensure_loaded()
+        return super().within_radius(latitude, longitude, radius_km)
+
+
+farm_index = FarmSpatialIndex()
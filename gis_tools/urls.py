@@ -23,4 +23,11 @@ urlpatterns = [
     path('api/check-delivery/', views.check_delivery_availability_api, name='check_delivery_api'),
     path('api/geocode/', views.geocode_address_api, name='geocode_api'),
     path('api/delivery-zones-geojson/', views.delivery_zones_geojson_api, name='delivery_zones_geojson'),
+    
+    # Dữ liệu bản đồ cho Leaflet phía client
+    path('api/map/farms/', views.farm_points_api, name='farm_points_api'),
+    path('api/map/heat/', views.heat_points_api, name='heat_points_api'),
+    path('api/map/orders/<int:order_id>/', views.order_tracking_data_api, name='order_tracking_data_api'),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', views.vector_tile_api, name='vector_tile'),
+    path('api/route-cache-stats/', views.route_cache_stats_api, name='route_cache_stats_api'),
 ]
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Vector tile (MVT) cho bản đồ cửa hàng, đơn hàng và khu vực giao hàng
+Mỗi tile chỉ chứa feature nằm trong khung của nó, với mức chi tiết theo zoom:
+ở zoom thấp các điểm được gom thành ô lưới (GROUP BY trong SQL) và polygon
+được làm tròn về lưới tile. Tile đã mã hóa lưu trong Django cache với key
+gồm phiên bản dữ liệu (xem gis_tools.map_cache) nên tự đổi khi dữ liệu đổi.
+"""
+from django.db.models import Avg, Count, F
+from django.db.models.functions import Floor
+from django.urls import reverse
+
+from .map_cache import MAP_CACHE_TIMEOUT, make_data_key
+from .mvt import LayerEncoder, TileProjection, buffered_bounds, encode_tile, project_polygon
+
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+# Số ô lưới trên mỗi cạnh tile khi gom điểm (~8 pixel với tile 256px)
+CLUSTER_GRID_CELLS = 32
+
+# Layer: model phụ thuộc, zoom bắt đầu hiển thị từng điểm, chỉ Admin được xem
+TILE_LAYERS = {
+    'farms': {'dependencies': ('farm',), 'detail_zoom': 10, 'superuser_only': False},
+    'orders': {'dependencies': ('order',), 'detail_zoom': 16, 'superuser_only': True},
+    'zones': {'dependencies': ('deliveryzone',), 'detail_zoom': 0, 'superuser_only': False},
+}
+
+
+def tile_url_template(layer):
+    """URL dạng .../tiles/<layer>/{z}/{x}/{y}.mvt cho Leaflet"""
+    url = reverse('gis_tools:vector_tile', args=[layer, 0, 0, 0])
+    return url[:-len('0/0/0.mvt')] + '{z}/{x}/{y}.mvt'
+
+
+def _filter_bounds(queryset, lat_field, lng_field, bounds):
+    west, south, east, north = bounds
+    return queryset.filter(**{
+        f'{lat_field}__gte': south, f'{lat_field}__lte': north,
+        f'{lng_field}__gte': west, f'{lng_field}__lte': east,
+    })
+
+
+def _add_clusters(layer, queryset, lat_field, lng_field, bounds, project):
+    """
+    Gom điểm thành ô lưới CLUSTER_GRID_CELLS x CLUSTER_GRID_CELLS trong tile,
+    mỗi ô là một điểm đặt tại vị trí trung bình với thuộc tính 'count'
+    """
+    west, south, east, north = bounds
+    cell_lat = (north - south) / CLUSTER_GRID_CELLS
+    cell_lng = (east - west) / CLUSTER_GRID_CELLS
+    cells = (
+        _filter_bounds(queryset, lat_field, lng_field, bounds).order_by()
+        .annotate(
+            cell_y=Floor((F(lat_field) - south) / cell_lat),
+            cell_x=Floor((F(lng_field) - west) / cell_lng),
+        )
+        .values('cell_y', 'cell_x')
+        .annotate(count=Count('pk'), lat=Avg(lat_field), lng=Avg(lng_field))
+    )
+    for cell in cells:
+        layer.add_point(project(cell['lng'], cell['lat']), {'count': cell['count']})
+
+
+def build_farms_layer(z, x, y):
+    from food_store.models import Farm
+
+    layer = LayerEncoder('farms')
+    bounds = buffered_bounds(z, x, y)
+    project = TileProjection(z, x, y)
+    farms = Farm.objects.filter(latitude__isnull=False, longitude__isnull=False)
+
+    if z < TILE_LAYERS['farms']['detail_zoom']:
+        _add_clusters(layer, farms, 'latitude', 'longitude', bounds, project)
+        return layer
+
+    rows = _filter_bounds(farms, 'latitude', 'longitude', bounds).values_list(
+        'id', 'name', 'latitude', 'longitude', 'organic_certified', 'address'
+    )
+    for farm_id, name, lat, lng, organic, address in rows:
+        layer.add_point(
+            project(lng, lat),
+            {'id': farm_id, 'name': name, 'organic': organic, 'address': address},
+            feature_id=farm_id,
+        )
+    return layer
+
+
+def build_orders_layer(z, x, y):
+    from food_store.models import Order
+
+    layer = LayerEncoder('orders')
+    bounds = buffered_bounds(z, x, y)
+    project = TileProjection(z, x, y)
+    orders = Order.objects.filter(delivery_latitude__isnull=False, delivery_longitude__isnull=False)
+
+    if z < TILE_LAYERS['orders']['detail_zoom']:
+        _add_clusters(layer, orders, 'delivery_latitude', 'delivery_longitude', bounds, project)
+        return layer
+
+    rows = _filter_bounds(orders, 'delivery_latitude', 'delivery_longitude', bounds).values_list(
+        'id', 'status', 'delivery_latitude', 'delivery_longitude'
+    )
+    for order_id, status, lat, lng in rows:
+        layer.add_point(project(lng, lat), {'id': order_id, 'status': status}, feature_id=order_id)
+    return layer
+
+
+def _geometry_polygons(geometry):
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def build_zones_layer(z, x, y):
+    from food_store.models import DeliveryZone
+
+    layer = LayerEncoder('zones')
+    west, south, east, north = buffered_bounds(z, x, y)
+    project = TileProjection(z, x, y)
+    zones = DeliveryZone.objects.filter(is_active=True, geometry__isnull=False).values(
+        'id', 'name', 'delivery_fee', 'delivery_time', 'geometry'
+    )
+
+    for zone in zones:
+        properties = {
+            'id': zone['id'],
+            'name': zone['name'],
+            'delivery_fee': float(zone['delivery_fee']),
+            'delivery_time': zone['delivery_time'],
+        }
+        for rings in _geometry_polygons(zone['geometry']):
+            try:
+                outer = rings[0]
+                if (max(p[0] for p in outer) < west or min(p[0] for p in outer) > east
+                        or max(p[1] for p in outer) < south or min(p[1] for p in outer) > north):
+                    continue
+                layer.add_polygon(project_polygon(rings, project), properties, feature_id=zone['id'])
+            except (IndexError, TypeError, ValueError):
+                continue  # Geometry lỗi đã bị chặn ở DeliveryZone.clean(), bỏ qua nếu còn sót
+    return layer
+
+
+LAYER_BUILDERS = {
+    'farms': build_farms_layer,
+    'orders': build_orders_layer,
+    'zones': build_zones_layer,
+}
+
+
+def get_tile_payload(layer, z, x, y):
+    """
+    Payload (xem geojson_cache.build_body_payload) của tile, lấy từ cache nếu
+    dữ liệu của layer chưa thay đổi
+    """
+    from django.core.cache import cache
+    from .geojson_cache import build_body_payload
+
+    key = make_data_key(f'tile:{layer}:{z}:{x}:{y}', TILE_LAYERS[layer]['dependencies'])
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_body_payload(encode_tile([LAYER_BUILDERS[layer](z, x, y)]))
+        cache.set(key, payload, MAP_CACHE_TIMEOUT)
+    return payload
@@ -13,7 +13,6 @@ import folium
 from .gis_functions import (
     FarmLocationAnalyzer, 
     DeliveryZoneManager, 
-    MapGenerator, 
     GeocodingService,
     OrderAnalytics
 )
@@ -37,22 +36,20 @@ def gis_tools_home(request):
 
 def farms_map_view(request):
     """Hiển thị bản đồ cửa hàng"""
-    farms_map = MapGenerator.create_farms_map()
+    from .vector_tiles import tile_url_template
     
     context = {
         'title': 'Bản đồ Cửa hàng',
-        'map_html': farms_map._repr_html_(),
-        'stores_count': Farm.objects.count()
+        'stores_count': Farm.objects.count(),
+        'farms_tile_url': tile_url_template('farms'),
+        'zones_tile_url': tile_url_template('zones'),
     }
     return render(request, 'gis/farms_map.html', context)
 
 def delivery_zones_map_view(request):
     """Hiển thị bản đồ khu vực giao hàng"""
-    zones_map = MapGenerator.create_delivery_zones_map()
-    
     context = {
         'title': 'Bản đồ Khu vực Giao hàng',
-        'map_html': zones_map._repr_html_(),
         'zones_count': DeliveryZone.objects.filter(is_active=True).count()
     }
     return render(request, 'gis/delivery_zones_map.html', context)
@@ -60,9 +57,9 @@ def delivery_zones_map_view(request):
 def order_tracking_view(request, order_id):
     """Theo dõi đơn hàng trên bản đồ"""
     order = get_object_or_404(Order, pk=order_id)
-    tracking_map = MapGenerator.create_order_tracking_map(order_id)
     
-    if not tracking_map:
+    # Bản đồ được vẽ phía client từ order_tracking_data_api
+    if not (order.delivery_latitude and order.delivery_longitude):
         context = {
             'title': 'Theo dõi Đơn hàng',
             'order': order,
@@ -73,7 +70,6 @@ def order_tracking_view(request, order_id):
     context = {
         'title': f'Theo dõi Đơn hàng #{order_id}',
         'order': order,
-        'map_html': tracking_map._repr_html_()
     }
     return render(request, 'gis/order_tracking.html', context)
 
@@ -83,9 +79,6 @@ def analytics_dashboard_view(request):
     orders_by_zone = OrderAnalytics.get_orders_by_zone()
     popular_farms = OrderAnalytics.get_popular_farms()[:10]
     
-    # Tạo bản đồ nhiệt
-    heatmap = MapGenerator.create_heatmap_map()
-    
     context = {
         'title': 'Dashboard Phân tích GIS',
         'orders_by_zone': orders_by_zone,
@@ -93,7 +86,7 @@ def analytics_dashboard_view(request):
         'total_farms': Farm.objects.count(),
         'total_zones': DeliveryZone.objects.filter(is_active=True).count(),
         'total_orders': Order.objects.count(),
-        'map_html': heatmap._repr_html_() if heatmap else None,
+        'farm_options': Farm.objects.order_by('name').values_list('id', 'name'),
     }
     return render(request, 'gis/analytics_dashboard.html', context)
 
@@ -175,8 +168,12 @@ def find_nearest_farms_api(request):
         limit = 50 if max_dist >= 99999 else 20
         
         # Tìm farms gần nhất theo đường bộ thực tế với vehicle type
+        # Chỉ lấy route geometry khi client yêu cầu
+        search_stats = {}
         nearest = FarmLocationAnalyzer.find_nearest_farms_by_road(
-            lat, lng, max_dist, limit, vehicle_type
+            lat, lng, max_dist, limit, vehicle_type,
+            geometry_limit=None if include_route else 0,
+            stats=search_stats
         )
         
         results = []
@@ -192,7 +189,8 @@ def find_nearest_farms_api(request):
                 'longitude': farm.longitude,
                 'organic_certified': farm.organic_certified,
                 'product_count': farm.product_set.count(),
-                'vehicle_type': getattr(farm, 'vehicle_type', vehicle_type)
+                'vehicle_type': getattr(farm, 'vehicle_type', vehicle_type),
+                'is_estimate': getattr(farm, 'is_estimate', False)
             }
             
             # Chỉ thêm route geometry nếu yêu cầu, không tính phí ship
@@ -206,7 +204,8 @@ def find_nearest_farms_api(request):
             'farms': results,
             'total_found': len(results),
             'search_radius_km': max_dist if max_dist < 99999 else 'unlimited',
-            'vehicle_type': vehicle_type
+            'vehicle_type': vehicle_type,
+            'search_stats': search_stats
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
@@ -233,9 +232,85 @@ def geocode_address_api(request):
         'coordinates': {'latitude': 10.762622, 'longitude': 106.660172}
     })
 
+@require_http_methods(["GET"])
+def farm_points_api(request):
+    """Tọa độ các cửa hàng (mảng gọn) cho bản đồ Leaflet"""
+    from .geojson_cache import get_cached_payload, payload_response
+    from .map_cache import MAP_CACHE_TIMEOUT, make_data_key
+    from .map_data import farm_points
+    
+    payload = get_cached_payload(make_data_key('farms', ['farm']), farm_points, MAP_CACHE_TIMEOUT)
+    return payload_response(request, payload)
+
+@user_passes_test(is_superuser)
+@require_http_methods(["GET"])
+def heat_points_api(request):
+    """
+    Ô lưới mật độ đơn hàng cho bản đồ nhiệt - Chỉ dành cho Admin
+    Query: zoom, date_from, date_to, farm, bbox (south,west,north,east)
+    """
+    from .geojson_cache import get_cached_payload, payload_response
+    from .map_cache import MAP_CACHE_TIMEOUT, make_data_key
+    from .map_data import heat_points, parse_heat_params
+    
+    try:
+        params = parse_heat_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    key = make_data_key('heat', ['order'], params)
+    payload = get_cached_payload(key, lambda: heat_points(**params), MAP_CACHE_TIMEOUT)
+    return payload_response(request, payload)
+
+@require_http_methods(["GET"])
+def order_tracking_data_api(request, order_id):
+    """Vị trí giao hàng, cửa hàng và tuyến đường của đơn hàng"""
+    from .map_data import order_tracking_data
+    
+    order = get_object_or_404(Order.objects.select_related('customer', 'assigned_farm'), pk=order_id)
+    user = request.user
+    if not (user.is_authenticated and (user.is_staff or order.customer.user_id == user.id)):
+        return JsonResponse({'success': False, 'error': 'Không có quyền xem đơn hàng này'}, status=403)
+    
+    data = order_tracking_data(order)
+    if data is None:
+        return JsonResponse({'success': False, 'error': 'Không thể tạo bản đồ (thiếu tọa độ)'}, status=404)
+    return JsonResponse({'success': True, **data})
+
+@require_http_methods(["GET"])
+def vector_tile_api(request, layer, z, x, y):
+    """
+    Vector tile (MVT) của layer farms/orders/zones tại z/x/y
+    Layer orders chỉ dành cho Admin
+    """
+    from django.http import Http404, HttpResponseForbidden
+    from .geojson_cache import payload_response
+    from .mvt import is_valid_tile
+    from .vector_tiles import CONTENT_TYPE, TILE_LAYERS, get_tile_payload
+    
+    if layer not in TILE_LAYERS or not is_valid_tile(z, x, y):
+        raise Http404('Tile không tồn tại')
+    if TILE_LAYERS[layer]['superuser_only'] and not is_superuser(request.user):
+        return HttpResponseForbidden()
+    
+    return payload_response(request, get_tile_payload(layer, z, x, y), content_type=CONTENT_TYPE)
+
 def delivery_zones_geojson_api(request):
-    data = DeliveryZoneManager.get_all_delivery_zones_geojson()
-    return JsonResponse(data)
+    from .geojson_cache import get_delivery_zones_payload, payload_response
+    
+    return payload_response(request, get_delivery_zones_payload())
+
+@user_passes_test(is_superuser)
+def route_cache_stats_api(request):
+    """Thống kê hit/miss của route cache - Chỉ dành cho Admin"""
+    from .route_cache import get_route_cache
+    
+    cache = get_route_cache()
+    return JsonResponse({
+        'success': True,
+        'backend': type(cache).__name__,
+        'stats': cache.stats.as_dict()
+    })
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -0,0 +1,256 @@
+"""
+Point-in-polygon index cho khu vực giao hàng
+R-tree (đóng gói STR) trên bounding box của các polygon để lọc nhanh, sau đó
+kiểm tra ray casting trên polygon đã "prepare" (cạnh được chia theo dải vĩ độ)
+nên chỉ phải xét vài cạnh kể cả với polygon tỉnh/huyện hàng nghìn đỉnh.
+
+Geometry lưu theo GeoJSON (Polygon hoặc MultiPolygon, tọa độ [lng, lat]).
+"""
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RTREE_NODE_CAPACITY = 16
+
+
+class PreparedPolygon:
+    """
+    Polygon (vòng ngoài + các lỗ) đã tiền xử lý cho ray casting
+
+    Cạnh của mọi vòng được gom theo dải vĩ độ: một điểm chỉ cần đếm số lần
+    cắt với các cạnh nằm trong dải chứa nó.
+    """
+
+    def __init__(self, rings):
+        rings = [[(float(lng), float(lat)) for lng, lat, *_ in ring] for ring in rings]
+        if not rings or any(len(ring) < 3 for ring in rings):
+            raise ValueError('Polygon ring must have at least 3 points')
+
+        edges = []
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if y1 != y2:
+                    edges.append((x1, y1, x2, y2))
+
+        outer = rings[0]
+        self.min_x = min(x for x, _ in outer)
+        self.max_x = max(x for x, _ in outer)
+        self.min_y = min(y for _, y in outer)
+        self.max_y = max(y for _, y in outer)
+        self.area = abs(_ring_area(outer)) - sum(abs(_ring_area(hole)) for hole in rings[1:])
+
+        self._band_count = max(1, int(math.sqrt(len(edges))))
+        self._band_height = (self.max_y - self.min_y) / self._band_count or 1.0
+        self._bands = [[] for _ in range(self._band_count)]
+        for edge in edges:
+            low, high = sorted((edge[1], edge[3]))
+            for band in range(self._band(low), self._band(high) + 1):
+                self._bands[band].append(edge)
+
+    @property
+    def bbox(self):
+        return (self.min_x, self.min_y, self.max_x, self.max_y)
+
+    def _band(self, y):
+        band = int((y - self.min_y) / self._band_height)
+        return min(max(band, 0), self._band_count - 1)
+
+    def contains(self, latitude, longitude):
+        """Ray casting: đếm số cạnh cắt tia nằm ngang từ điểm sang phải"""
+        x, y = longitude, latitude
+        if not (self.min_x <= x <= self.max_x and self.min_y <= y <= self.max_y):
+            return False
+
+        inside = False
+        for x1, y1, x2, y2 in self._bands[self._band(y)]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+def _ring_area(ring):
+    """Diện tích (độ²) theo công thức shoelace - chỉ dùng để so sánh"""
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+def prepare_geometry(geometry):
+    """
+    Chuyển GeoJSON geometry (Polygon/MultiPolygon) thành list PreparedPolygon
+
+    Raises:
+        ValueError: geometry không hợp lệ
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError('Geometry must be a GeoJSON object')
+
+    geometry_type = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    try:
+        if geometry_type == 'Polygon':
+            return [PreparedPolygon(coordinates)]
+        if geometry_type == 'MultiPolygon':
+            polygons = [PreparedPolygon(rings) for rings in coordinates]
+            if not polygons:
+                raise ValueError('MultiPolygon has no polygons')
+            return polygons
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid {geometry_type} coordinates: {e}')
+    raise ValueError(f'Unsupported geometry type: {geometry_type}')
+
+
+class BBoxRTree:
+    """
+    R-tree tĩnh trên bounding box, đóng gói theo Sort-Tile-Recursive (STR)
+
+    Entries: list (bbox, value) với bbox = (min_x, min_y, max_x, max_y)
+    """
+
+    def __init__(self, entries=(), node_capacity=RTREE_NODE_CAPACITY):
+        self.node_capacity = node_capacity
+        self._root = self._pack([(bbox, value, None) for bbox, value in entries])
+
+    def _pack(self, nodes):
+        if not nodes:
+            return None
+        # Mỗi node: (bbox, value, children) - node lá có children = None
+        while len(nodes) > 1:
+            capacity = self.node_capacity
+            slices = math.ceil(math.sqrt(math.ceil(len(nodes) / capacity)))
+            nodes = sorted(nodes, key=lambda n: (n[0][0] + n[0][2]) / 2)
+            slice_size = slices * capacity
+            parents = []
+            for start in range(0, len(nodes), slice_size):
+                vertical = sorted(nodes[start:start + slice_size], key=lambda n: (n[0][1] + n[0][3]) / 2)
+                for i in range(0, len(vertical), capacity):
+                    children = vertical[i:i + capacity]
+                    bbox = (
+                        min(c[0][0] for c in children), min(c[0][1] for c in children),
+                        max(c[0][2] for c in children), max(c[0][3] for c in children),
+                    )
+                    parents.append((bbox, None, children))
+            nodes = parents
+        return nodes[0]
+
+    def query_point(self, x, y):
+        """Các value có bbox chứa điểm (x, y)"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            (min_x, min_y, max_x, max_y), value, children = stack.pop()
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            if children is None:
+                found.append(value)
+            else:
+                stack.extend(children)
+        return found
+
+
+class ZoneIndex:
+    """
+    Tìm khu vực chứa một điểm
+
+    Khi các khu vực chồng lên nhau (vd: quận nằm trong tỉnh), khu vực có
+    diện tích nhỏ nhất - cụ thể nhất - được chọn.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tree = BBoxRTree()
+        self._zones = {}
+
+    def build(self, items):
+        """
+        Args:
+            items: List (key, geometry, data) - data được trả về khi tìm thấy.
+                Khu vực có geometry không hợp lệ bị bỏ qua (ghi log)
+        """
+        entries = []
+        zones = {}
+        for key, geometry, data in items:
+            try:
+                polygons = prepare_geometry(geometry)
+            except ValueError as e:
+                logger.warning(f"Skipping zone {key}: {e}")
+                continue
+            zones[key] = (sum(polygon.area for polygon in polygons), data)
+            entries.extend((polygon.bbox, (key, polygon)) for polygon in polygons)
+
+        tree = BBoxRTree(entries)
+        with self._lock:
+            self._tree = tree
+            self._zones = zones
+
+    def __len__(self):
+        return len(self._zones)
+
+    def _matches(self, latitude, longitude):
+        with self._lock:
+            tree, zones = self._tree, self._zones
+        keys = {
+            key for key, polygon in tree.query_point(longitude, latitude)
+            if polygon.contains(latitude, longitude)
+        }
+        return sorted((zones[key][0], key, zones[key][1]) for key in keys)
+
+    def locate_all(self, latitude, longitude):
+        """Tất cả key khu vực chứa điểm, khu vực nhỏ nhất trước"""
+        return [key for _, key, _ in self._matches(latitude, longitude)]
+
+    def locate(self, latitude, longitude):
+        """
+        Returns:
+            data của khu vực nhỏ nhất chứa điểm, None nếu không có
+        """
+        matches = self._matches(latitude, longitude)
+        return matches[0][2] if matches else None
+
+
+class DeliveryZoneIndex(ZoneIndex):
+    """
+    Index cho các DeliveryZone đang hoạt động (một instance trên mỗi process)
+
+    Nạp lười ở lần truy vấn đầu tiên, bị vô hiệu qua signal khi DeliveryZone
+    thay đổi (xem gis_tools.signals) và tự nạp lại sau `max_age` giây.
+    """
+
+    def __init__(self, max_age=300):
+        super().__init__()
+        self.max_age = max_age
+        self._loaded_at = None
+
+    def load(self):
+        """Nạp lại polygon các khu vực đang hoạt động từ database"""
+        from food_store.models import DeliveryZone
+
+        zones = DeliveryZone.objects.filter(is_active=True, geometry__isnull=False).values(
+            'id', 'name', 'delivery_fee', 'delivery_time', 'geometry'
+        )
+        self.build([(zone['id'], zone.pop('geometry'), zone) for zone in zones])
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Bắt buộc nạp lại ở lần truy vấn tiếp theo"""
+        with self._lock:
+            self._loaded_at = None
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+                self.load()
+
+    def __len__(self):
+        self.ensure_loaded()
+        return super().__len__()
+
+    def _matches(self, latitude, longitude):
+        self.ensure_loaded()
+        return super()._matches(latitude, longitude)
+
+
+delivery_zone_index = DeliveryZoneIndex()